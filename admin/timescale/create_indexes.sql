@@ -5,6 +5,7 @@ CREATE INDEX created_ndx_listen ON listen (created);
 CREATE UNIQUE INDEX listened_at_user_id_recording_msid_ndx_listen ON listen (listened_at DESC, user_id, recording_msid);
 
 CREATE INDEX recording_msid_ndx_listen on listen (recording_msid);
+CREATE INDEX user_id_listened_at_recording_msid_ndx_listen ON listen (user_id, listened_at DESC, recording_msid);
 
 CREATE UNIQUE INDEX user_id_ndx_listen_user_metadata ON listen_user_metadata (user_id);
 
@@ -79,6 +80,9 @@ CREATE UNIQUE INDEX similar_recordings_reverse_uniq_idx ON similarity.recording
 CREATE UNIQUE INDEX similar_artist_credit_mbids_uniq_idx ON similarity.artist_credit_mbids (mbid0, mbid1);
 CREATE UNIQUE INDEX similar_artist_credit_mbids_reverse_uniq_idx ON similarity.artist_credit_mbids (mbid1, mbid0);
 
+CREATE UNIQUE INDEX recording_embedding_mbid_uniq_idx ON similarity.recording_embedding (mbid);
+CREATE UNIQUE INDEX artist_embedding_mbid_uniq_idx ON similarity.artist_embedding (mbid);
+
 CREATE INDEX similarity_overhyped_artists_artist_mbid_idx ON similarity.overhyped_artists(artist_mbid) INCLUDE (factor);
 
 CREATE INDEX mbid_manual_mapping_top_idx ON mbid_manual_mapping_top (recording_msid) INCLUDE (recording_mbid);
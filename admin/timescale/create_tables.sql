@@ -256,6 +256,16 @@ CREATE TABLE similarity.artist_credit_mbids (
     score INT NOT NULL
 );
 
+CREATE TABLE similarity.recording_embedding (
+    mbid UUID NOT NULL,
+    vector REAL[] NOT NULL
+);
+
+CREATE TABLE similarity.artist_embedding (
+    mbid UUID NOT NULL,
+    vector REAL[] NOT NULL
+);
+
 CREATE TABLE similarity.overhyped_artists (
     id                      INTEGER GENERATED ALWAYS AS IDENTITY NOT NULL,
     artist_mbid             UUID NOT NULL,
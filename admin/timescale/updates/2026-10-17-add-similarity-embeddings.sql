@@ -0,0 +1,16 @@
+BEGIN;
+
+CREATE TABLE similarity.recording_embedding (
+    mbid UUID NOT NULL,
+    vector REAL[] NOT NULL
+);
+
+CREATE TABLE similarity.artist_embedding (
+    mbid UUID NOT NULL,
+    vector REAL[] NOT NULL
+);
+
+CREATE UNIQUE INDEX recording_embedding_mbid_uniq_idx ON similarity.recording_embedding (mbid);
+CREATE UNIQUE INDEX artist_embedding_mbid_uniq_idx ON similarity.artist_embedding (mbid);
+
+COMMIT;
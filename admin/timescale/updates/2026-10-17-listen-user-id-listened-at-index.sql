@@ -0,0 +1,4 @@
+-- Index used by TimescaleListenStore.fetch_listens to find the keys of a user's listens with an index only scan.
+-- Built one chunk at a time so that inserts into the other chunks are not blocked for the whole build.
+CREATE INDEX user_id_listened_at_recording_msid_ndx_listen ON listen (user_id, listened_at DESC, recording_msid)
+  WITH (timescaledb.transaction_per_chunk);
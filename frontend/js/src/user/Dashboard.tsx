@@ -208,6 +208,9 @@ export default class Listens extends React.Component<
     this.socket.on("listen", (data: string) => {
       this.receiveNewListen(data);
     });
+    this.socket.on("listens", (data: string[]) => {
+      data.forEach((listen) => this.receiveNewListen(listen));
+    });
     this.socket.on("playing_now", (data: string) => {
       const playingNow = JSON.parse(data) as Listen;
       this.receiveNewPlayingNow(playingNow);
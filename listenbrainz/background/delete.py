@@ -1,7 +1,7 @@
 from datetime import datetime
 
 from data.model.external_service import ExternalServiceType
-from listenbrainz.webserver import timescale_connection
+from listenbrainz.webserver import timescale_connection, redis_connection, token_cache
 from listenbrainz.db import user as db_user, listens_importer
 
 
@@ -14,7 +14,11 @@ def delete_user(db_conn, user_id: int, created: datetime):
         created: listens created before this timestamp are deleted
     """
     timescale_connection._ts.delete(user_id, created)
+    redis_connection._redis.invalidate_recent_listens_for_users([user_id])
+    user = db_user.get(db_conn, user_id)
     db_user.delete(db_conn, user_id)
+    if user is not None:
+        token_cache.invalidate_token(user["auth_token"])
     db_conn.commit()
 
 
@@ -26,5 +30,6 @@ def delete_listens_history(db_conn, user_id: int, created: datetime):
         created: listens created before this timestamp are deleted
     """
     timescale_connection._ts.delete(user_id, created)
+    redis_connection._redis.invalidate_recent_listens_for_users([user_id])
     listens_importer.update_latest_listened_at(db_conn, user_id, ExternalServiceType.LASTFM, 0)
     db_conn.commit()
@@ -1,12 +1,13 @@
 from typing import Optional
 
 import sqlalchemy
-from sqlalchemy import create_engine, text
-from sqlalchemy.pool import NullPool
+from sqlalchemy import text
 import time
 import psycopg2
 import psycopg2.extras
 
+from listenbrainz.db.pool import create_pooled_engine
+
 # The schema version of the core database. This includes data in the "user" database
 # (tables created from ./admin/sql/create-tables.sql) and includes user data,
 # statistics, feedback, and results of user interaction on the site.
@@ -22,17 +23,20 @@ DUMP_DEFAULT_THREAD_COUNT = 4
 psycopg2.extras.register_uuid()
 
 
-def init_db_connection(connect_str):
+def init_db_connection(connect_str, pool_options=None):
     """Initializes database connection using the specified Flask app.
 
     Configuration file must contain `SQLALCHEMY_DATABASE_URI` key. See
     https://pythonhosted.org/Flask-SQLAlchemy/config.html#configuration-keys
     for more info.
+
+    If pool_options are given, the engine keeps a pool of connections, see
+    :func:`~listenbrainz.db.pool.get_pool_options`. Otherwise, a new connection is opened for every checkout.
     """
     global engine
     while True:
         try:
-            engine = create_engine(connect_str, poolclass=NullPool)
+            engine = create_pooled_engine(connect_str, "db", pool_options)
             break
         except psycopg2.OperationalError as e:
             print("Couldn't establish connection to db: {}".format(str(e)))
@@ -0,0 +1,106 @@
+""" Helpers to encode rows in the PostgreSQL binary COPY format.
+
+See the "Binary Format" section of https://www.postgresql.org/docs/current/sql-copy.html for the format. Only the
+column types used by the bulk load paths are supported.
+"""
+import io
+import struct
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Sequence
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+COPY_HEADER = COPY_SIGNATURE + struct.pack("!ii", 0, 0)
+COPY_TRAILER = struct.pack("!h", -1)
+
+FLOAT4_OID = 700
+
+# postgres timestamps are stored as microseconds since 2000-01-01 00:00:00 UTC
+POSTGRES_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+JSONB_VERSION = b"\x01"
+
+_INT4 = struct.Struct("!i")
+_INT8 = struct.Struct("!q")
+_FLOAT8 = struct.Struct("!d")
+_FIELD_COUNT = struct.Struct("!h")
+_ARRAY_HEADER = struct.Struct("!iiiii")
+_EMPTY_ARRAY_HEADER = struct.Struct("!iii")
+_FLOAT4_ELEMENT = struct.Struct("!if")
+_NULL = _INT4.pack(-1)
+
+
+def encode_int4(value: int) -> bytes:
+    return _INT4.pack(value)
+
+
+def encode_int8(value: int) -> bytes:
+    return _INT8.pack(value)
+
+
+def encode_float8(value: float) -> bytes:
+    return _FLOAT8.pack(value)
+
+
+def encode_float4_array(values: Sequence[float]) -> bytes:
+    """ Encode a list of floats as a one dimensional real[] without NULL elements. """
+    if len(values) == 0:
+        return _EMPTY_ARRAY_HEADER.pack(0, 0, FLOAT4_OID)
+    header = _ARRAY_HEADER.pack(1, 0, FLOAT4_OID, len(values), 1)
+    return header + b"".join(_FLOAT4_ELEMENT.pack(4, value) for value in values)
+
+
+def encode_text(value: str) -> bytes:
+    return value.encode("utf-8")
+
+
+def encode_uuid(value) -> bytes:
+    if isinstance(value, uuid.UUID):
+        return value.bytes
+    return uuid.UUID(value).bytes
+
+
+def encode_timestamptz(value: datetime) -> bytes:
+    """ Encode a datetime as a timestamp with time zone. Naive datetimes are assumed to be in UTC,
+     which is how listen timestamps are created throughout ListenBrainz. """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - POSTGRES_EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return _INT8.pack(microseconds)
+
+
+def encode_jsonb(value) -> bytes:
+    """ Encode an already serialized json document (str or bytes) as jsonb. """
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return JSONB_VERSION + value
+
+
+def encode_rows(rows: Iterable[Sequence], encoders: Sequence[Callable]) -> io.BytesIO:
+    """ Encode the rows into a buffer which can be passed to a COPY ... FROM STDIN WITH (FORMAT binary).
+
+    Args:
+        rows: the rows to encode, each row should have one value per encoder. None values are encoded as NULL.
+        encoders: the encode_* functions to encode the values of each column with
+    Returns:
+        a buffer positioned at its start
+    """
+    field_count = _FIELD_COUNT.pack(len(encoders))
+
+    buffer = io.BytesIO()
+    write = buffer.write
+    write(COPY_HEADER)
+    for row in rows:
+        write(field_count)
+        for encoder, value in zip(encoders, row):
+            if value is None:
+                write(_NULL)
+            else:
+                data = encoder(value)
+                write(_INT4.pack(len(data)))
+                write(data)
+    write(COPY_TRAILER)
+
+    buffer.seek(0)
+    return buffer
@@ -1,6 +1,12 @@
 import json
+import os
 import re
-from typing import BinaryIO
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from time import monotonic
+from typing import BinaryIO, Callable, Iterable, Optional
 
 import requests
 import orjson
@@ -14,11 +20,29 @@ DATABASE_NAME_PATTERN = re.compile(r"([a-zA-Z]+)_(\w+)_(\d{8})")
 
 DATABASE_LOCK_FILE = "LOCK"
 
+# the database lists used to read data are cached for this long, in seconds
+DATABASE_LIST_CACHE_TTL = 60
+# the maximum number of connections to couchdb kept open by each process
+SESSION_POOL_SIZE = 10
+
+# the number of documents requested in each page and the number of key ranges read in parallel by dump_database
+DUMP_PAGE_SIZE = 10000
+DUMP_READER_COUNT = 4
+
 _user = None
 _admin_key = None
 _host = None
 _port = None
 
+_session: Optional[requests.Session] = None
+# prefix -> (expiry time, databases)
+_database_list_cache: dict[str, tuple[float, list[str]]] = {}
+
+
+class _DatabaseDeleted(Exception):
+    """ Raised when a database from the cached database list does not exist anymore """
+    pass
+
 
 def init(user, password, host, port):
     """
@@ -35,6 +59,28 @@ def init(user, password, host, port):
     _admin_key = password
     _host = host
     _port = port
+    _reset_session()
+    invalidate_database_list_cache()
+
+
+def get_session() -> requests.Session:
+    """ Get the session shared by the requests to couchdb in this process, so that connections are reused. """
+    global _session
+    if _session is None:
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=SESSION_POOL_SIZE)
+        _session = requests.Session()
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+def _reset_session():
+    # the connections of the session must not be shared with forked processes
+    global _session
+    _session = None
+
+
+os.register_at_fork(after_in_child=_reset_session)
 
 
 def get_base_url():
@@ -51,11 +97,12 @@ def create_database(database: str):
          database: the database's name
     """
     databases_url = f"{get_base_url()}/{database}"
-    response = requests.put(databases_url)
+    response = get_session().put(databases_url)
     response.raise_for_status()
+    invalidate_database_list_cache()
 
 
-def list_databases(prefix: str) -> list[str]:
+def list_databases(prefix: str, use_cache: bool = False) -> list[str]:
     """ List all couchdb database whose name starts with the given prefix
     sorted in the descending order of creation.
 
@@ -64,17 +111,49 @@ def list_databases(prefix: str) -> list[str]:
     YYYYMMDD is the date. After statistics for the day have been inserted, we want to get rid
     of the older database for that stat. This method looks up all the databases whose name starts
     with the given prefix.
+
+    If use_cache is True, the list may be up to DATABASE_LIST_CACHE_TTL seconds old. Only use the cached
+    list to read data, databases in it may have been deleted since.
     """
+    if use_cache:
+        cached = _database_list_cache.get(prefix)
+        if cached is not None and cached[0] > monotonic():
+            return cached[1]
+
     databases_url = f"{get_base_url()}/_all_dbs"
-    response = requests.get(databases_url)
+    response = get_session().get(databases_url)
     response.raise_for_status()
     all_databases = response.json()
 
     databases = [database for database in all_databases if database.startswith(prefix)]
     databases.sort(reverse=True)
+    _database_list_cache[prefix] = (monotonic() + DATABASE_LIST_CACHE_TTL, databases)
     return databases
 
 
+def invalidate_database_list_cache():
+    """ Drop the cached database lists of this process """
+    _database_list_cache.clear()
+
+
+def _is_database_deleted(response: requests.Response) -> bool:
+    """ CouchDB returns a 404 for both missing documents and missing databases, check which one it is """
+    try:
+        return response.json().get("reason") == "Database does not exist."
+    except ValueError:
+        return False
+
+
+def _read_latest(prefix: str, read: Callable[[list[str]], Optional[dict]]):
+    """ Call read with the cached list of databases for the prefix. If one of them has been deleted in the
+     meantime, refresh the list and try again. """
+    try:
+        return read(list_databases(prefix, use_cache=True))
+    except _DatabaseDeleted:
+        invalidate_database_list_cache()
+        return read(list_databases(prefix))
+
+
 def delete_database(prefix: str):
     """ Delete all but the latest database whose name starts with the given prefix.
 
@@ -98,10 +177,11 @@ def delete_database(prefix: str):
         if check_database_lock(database):
             retained.append(database)
         else:
-            response = requests.delete(f"{get_base_url()}/{database}")
+            response = get_session().delete(f"{get_base_url()}/{database}")
             response.raise_for_status()
             deleted.append(database)
 
+    invalidate_database_list_cache()
     return deleted, retained
 
 
@@ -116,18 +196,86 @@ def fetch_data(prefix: str, user_id: int):
          prefix: the string to match database names with
          user_id: the user to retrieve data for
     """
-    databases = list_databases(prefix)
-    base_url = get_base_url()
+    def read(databases):
+        base_url = get_base_url()
+        session = get_session()
+        for database in databases:
+            response = session.get(f"{base_url}/{database}/{user_id}")
+            if response.status_code == 404:
+                if _is_database_deleted(response):
+                    raise _DatabaseDeleted(database)
+                continue
+            response.raise_for_status()
+            return response.json()
+        return None
 
-    for database in databases:
-        document_url = f"{base_url}/{database}/{user_id}"
-        response = requests.get(document_url)
-        if response.status_code == 404:
-            continue
-        response.raise_for_status()
-        return response.json()
+    return _read_latest(prefix, read)
+
+
+def fetch_data_bulk(keys: Iterable[tuple[str, int | str]]) -> dict[tuple[str, str], dict]:
+    """ Retrieve several documents from couchdb at once, for example the stats of several ranges and entities
+    shown on one page.
+
+    The documents of a prefix are read with one _all_docs request per database and the prefixes are read in
+    parallel, so the page waits for about one round trip instead of one per document. Like fetch_data, documents
+    missing from the latest database of a prefix are looked up in the older databases.
+
+    Args:
+         keys: (prefix, document id) pairs of the documents to retrieve, the document ids are usually user ids
+    Returns:
+        a dict of the (prefix, document id as a string) pairs to the documents found
+    """
+    doc_ids_by_prefix: dict[str, dict[str, None]] = {}
+    for prefix, doc_id in keys:
+        doc_ids_by_prefix.setdefault(prefix, {})[str(doc_id)] = None
+
+    if len(doc_ids_by_prefix) <= 1:
+        results = [_fetch_prefix_bulk(prefix, list(doc_ids)) for prefix, doc_ids in doc_ids_by_prefix.items()]
+    else:
+        workers = min(len(doc_ids_by_prefix), SESSION_POOL_SIZE)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="couchdb_bulk") as executor:
+            futures = [
+                executor.submit(_fetch_prefix_bulk, prefix, list(doc_ids))
+                for prefix, doc_ids in doc_ids_by_prefix.items()
+            ]
+            results = [future.result() for future in futures]
+
+    docs = {}
+    for prefix, found in zip(doc_ids_by_prefix, results):
+        for doc_id, doc in found.items():
+            docs[(prefix, doc_id)] = doc
+    return docs
+
+
+def _fetch_prefix_bulk(prefix: str, keys: list[str]) -> dict[str, dict]:
+    """ Retrieve the documents with the given ids from the databases of the prefix, see fetch_data_bulk. """
+    def read(databases):
+        base_url = get_base_url()
+        session = get_session()
+        found = {}
+        remaining = keys
+        for database in databases:
+            if not remaining:
+                break
+            response = session.post(
+                f"{base_url}/{database}/_all_docs",
+                params={"include_docs": "true"},
+                data=orjson.dumps({"keys": remaining}),
+                headers={"Content-Type": "application/json"}
+            )
+            if response.status_code == 404 and _is_database_deleted(response):
+                raise _DatabaseDeleted(database)
+            response.raise_for_status()
 
-    return None
+            for row in orjson.loads(response.content)["rows"]:
+                # missing documents have an error instead of a doc, deleted documents have a null doc
+                doc = row.get("doc")
+                if doc is not None:
+                    found[row["key"]] = doc
+            remaining = [key for key in remaining if key not in found]
+        return found
+
+    return _read_latest(prefix, read)
 
 
 def insert_data(database: str, data: list[dict]):
@@ -137,7 +285,7 @@ def insert_data(database: str, data: list[dict]):
 
     with start_span(op="http", description="insert docs in couchdb using api"):
         couchdb_url = f"{get_base_url()}/{database}/_bulk_docs"
-        response = requests.post(couchdb_url, data=docs, headers={"Content-Type": "application/json"})
+        response = get_session().post(couchdb_url, data=docs, headers={"Content-Type": "application/json"})
         response.raise_for_status()
 
     with start_span(op="deserializing", description="checking response for conflicts"):
@@ -152,7 +300,7 @@ def insert_data(database: str, data: list[dict]):
         conflict_docs = orjson.dumps({"docs": [{"id": doc_id} for doc_id in conflict_doc_ids]})
 
     with start_span(op="http", description="retrieving conflicts from database"):
-        response = requests.post(
+        response = get_session().post(
             f"{get_base_url()}/{database}/_bulk_get",
             data=conflict_docs,
             headers={"Content-Type": "application/json"}
@@ -175,7 +323,7 @@ def insert_data(database: str, data: list[dict]):
         docs_to_update = orjson.dumps({"docs": docs_to_update})
 
     with start_span(op="http", description="retry updating conflicts in database"):
-        response = requests.post(couchdb_url, data=docs_to_update, headers={"Content-Type": "application/json"})
+        response = get_session().post(couchdb_url, data=docs_to_update, headers={"Content-Type": "application/json"})
         response.raise_for_status()
 
 
@@ -191,11 +339,11 @@ def delete_data(database: str, doc_id: int | str):
          doc_id: the id of the document to delete
     """
     document_url = f"{get_base_url()}/{database}/{doc_id}"
-    response = requests.head(document_url)
+    response = get_session().head(document_url)
     response.raise_for_status()
 
     rev = json.loads(response.headers.get("ETag"))
-    response = requests.delete(document_url, params={"rev": rev})
+    response = get_session().delete(document_url, params={"rev": rev})
     response.raise_for_status()
 
 
@@ -204,7 +352,7 @@ def check_database_lock(database: str):
      DATABASE_LOCK_FILE. A database is usually locked only during dumps.
     """
     url = f"{get_base_url()}/{database}/{DATABASE_LOCK_FILE}"
-    response = requests.get(url)
+    response = get_session().get(url)
     return response.status_code == 200
 
 
@@ -217,7 +365,7 @@ def lock_database(database: str):
     """
     document_url = f"{get_base_url()}/{database}/{DATABASE_LOCK_FILE}"
     # TODO: figure out why PUT works but POST fails with a weird referer header error
-    response = requests.put(document_url, json={})
+    response = get_session().put(document_url, json={})
     response.raise_for_status()
 
 
@@ -245,15 +393,71 @@ def _get_requests_session():
     return http
 
 
-def dump_database(prefix: str, fp: BinaryIO):
+def _get_split_keys(http: requests.Session, database_url: str, total_docs: int, readers: int) -> list[str]:
+    """ Find the keys which split the documents of the database into ranges of about the same size, one per reader.
+
+    Only a handful of documents are looked up here so the cost of using skip is negligible.
+    """
+    keys = []
+    for i in range(1, readers):
+        response = http.get(f"{database_url}/_all_docs", params={"skip": i * total_docs // readers, "limit": 1})
+        rows = orjson.loads(response.content)["rows"]
+        if rows and (not keys or rows[0]["key"] != keys[-1]):
+            keys.append(rows[0]["key"])
+    return keys
+
+
+def _dump_range(database_url: str, start_key: Optional[str], end_key: Optional[str], fp: BinaryIO, page_size: int):
+    """ Dump the documents of the database whose keys are in [start_key, end_key) to fp. A None start_key or end_key
+    leaves the range open on that side.
+
+    The range is paged using startkey instead of skip, so that couchdb doesn't need to walk over all the
+    documents before a page to serve it.
+    """
+    params = {"limit": page_size, "include_docs": "true"}
+    if start_key is not None:
+        params["startkey"] = json.dumps(start_key)
+    if end_key is not None:
+        params["endkey"] = json.dumps(end_key)
+        params["inclusive_end"] = "false"
+
+    with _get_requests_session() as http:
+        while True:
+            response = http.get(f"{database_url}/_all_docs", params=params)
+            rows = orjson.loads(response.content)["rows"]
+            for row in rows:
+                doc = row["doc"]
+                doc.pop("_id", None)
+                doc.pop("key", None)
+                doc.pop("_rev", None)
+                doc.pop("_revisions", None)
+
+                if not doc:
+                    continue
+
+                fp.write(orjson.dumps(doc, option=orjson.OPT_APPEND_NEWLINE))
+
+            if len(rows) < page_size:
+                break
+            # continue after the last key of this page
+            params["startkey"] = json.dumps(rows[-1]["key"])
+            params["skip"] = 1
+
+
+def dump_database(prefix: str, fp: BinaryIO, readers: int = DUMP_READER_COUNT, page_size: int = DUMP_PAGE_SIZE):
     """ Dump the contents of the earliest database of the asked type.
 
         The earliest database of the type is chosen because its most probably the complete one while
         the same may not be true for latest one.
 
+        The key range of the database is split in as many parts as there are readers and each part is
+        dumped in parallel to a temporary file. The files are then copied to fp in key order.
+
         Args:
             prefix: the string to match database names with
-            fp: the text stream to dump the contents to
+            fp: the binary stream to dump the contents to
+            readers: the number of ranges to read in parallel
+            page_size: the number of documents to fetch in each request
     """
     databases = list_databases(prefix)
     if not databases:
@@ -265,29 +469,32 @@ def dump_database(prefix: str, fp: BinaryIO):
     lock_database(database)
 
     try:
+        database_url = f"{get_base_url()}/{database}"
         with _get_requests_session() as http:
-            database_url = f"{get_base_url()}/{database}"
             response = http.get(database_url)
             total_docs = response.json()["doc_count"]
+            if total_docs == 0:
+                return
+            split_keys = _get_split_keys(http, database_url, total_docs, readers)
+
+        if not split_keys:
+            _dump_range(database_url, None, None, fp, page_size)
+            return
 
-            limit = 50
-            for skip in range(0, total_docs, limit):
-                response = http.get(f"{database_url}/_all_docs", params={
-                    "skip": skip,
-                    "limit": limit,
-                    "include_docs": True
-                })
-                rows = orjson.loads(response.content)["rows"]
-                for row in rows:
-                    doc = row["doc"]
-                    doc.pop("_id", None)
-                    doc.pop("key", None)
-                    doc.pop("_rev", None)
-                    doc.pop("_revisions", None)
-
-                    if not doc:
-                        continue
-
-                    fp.write(orjson.dumps(doc, option=orjson.OPT_APPEND_NEWLINE))
+        bounds = [None, *split_keys, None]
+        ranges = list(zip(bounds[:-1], bounds[1:]))
+        with ExitStack() as stack:
+            files = [stack.enter_context(tempfile.TemporaryFile()) for _ in ranges]
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                futures = [
+                    executor.submit(_dump_range, database_url, start_key, end_key, range_fp, page_size)
+                    for (start_key, end_key), range_fp in zip(ranges, files)
+                ]
+                for future in futures:
+                    future.result()
+
+            for range_fp in files:
+                range_fp.seek(0)
+                shutil.copyfileobj(range_fp, fp)
     finally:
         unlock_database(database)
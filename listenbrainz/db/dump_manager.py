@@ -131,8 +131,10 @@ def create_mbcanonical(location, use_lb_conn):
               help="If True, make a public/private timescale dump")
 @click.option('--stats/--no-stats', 'do_stats_dump', type=bool, default=True,
               help="If True, make a couchdb stats dump")
+@click.option('--workers', '-w', type=int, default=1,
+              help="the number of processes to use for writing the spark listens dump")
 def create_full(location: str, location_private: str, threads: int, dump_id: int, do_listen_dump: bool,
-                do_spark_dump: bool, do_db_dump: bool, do_timescale_dump: bool, do_stats_dump: bool):
+                do_spark_dump: bool, do_db_dump: bool, do_timescale_dump: bool, do_stats_dump: bool, workers: int):
     """ Create a ListenBrainz data dump which includes a private dump, a statistics dump
         and a dump of the actual listens from the listenstore.
     """
@@ -181,7 +183,7 @@ def create_full(location: str, location_private: str, threads: int, dump_id: int
             ls.dump_listens(dump_path, dump_id=dump_id, end_time=end_time, threads=threads)
             expected_num_dumps += 1
         if do_spark_dump:
-            ls.dump_listens_for_spark(dump_path, dump_id=dump_id, dump_type="full", end_time=end_time)
+            ls.dump_listens_for_spark(dump_path, dump_id=dump_id, dump_type="full", end_time=end_time, workers=workers)
             expected_num_dumps += 1
         if do_stats_dump:
             db_dump.create_statistics_dump(dump_path, end_time, threads)
@@ -225,7 +227,9 @@ def create_full(location: str, location_private: str, threads: int, dump_id: int
 @click.option('--location', '-l', default=os.path.join(os.getcwd(), 'listenbrainz-export'))
 @click.option('--threads', '-t', type=int, default=DUMP_DEFAULT_THREAD_COUNT)
 @click.option('--dump-id', type=int, default=None)
-def create_incremental(location, threads, dump_id):
+@click.option('--workers', '-w', type=int, default=1,
+              help="the number of processes to use for writing the spark listens dump")
+def create_incremental(location, threads, dump_id, workers):
     app = create_app()
     with app.app_context():
         ls = DumpListenStore(app)
@@ -252,7 +256,7 @@ def create_incremental(location, threads, dump_id):
 
         ls.dump_listens(dump_path, dump_id=dump_id, start_time=start_time, end_time=end_time, threads=threads)
         ls.dump_listens_for_spark(dump_path, dump_id=dump_id, dump_type="incremental",
-                                  start_time=start_time, end_time=end_time)
+                                  start_time=start_time, end_time=end_time, workers=workers)
 
         try:
             write_hashes(dump_path)
@@ -327,8 +331,13 @@ def create_feedback(location, threads):
               help="the path to the ListenBrainz listen dump archive to be imported")
 @click.option('--threads', '-t', type=int, default=DUMP_DEFAULT_THREAD_COUNT,
               help="the number of threads to use during decompression, defaults to 1")
+@click.option('--workers', '-w', type=int, default=1,
+              help="the number of processes to insert listens with, defaults to 1")
+@click.option('--defer-user-metadata', is_flag=True, default=False,
+              help="recalculate listen counts and timestamps of all users once after importing listens "
+                   "instead of updating them with every insert")
 def import_dump(private_archive, private_timescale_archive,
-                public_archive, public_timescale_archive, listen_archive, threads):
+                public_archive, public_timescale_archive, listen_archive, threads, workers, defer_user_metadata):
     """ Import a ListenBrainz dump into the database.
 
     Args:
@@ -338,6 +347,8 @@ def import_dump(private_archive, private_timescale_archive,
         public_timescale_archive (str): the path to the ListenBrainz public timescale dump to be imported
         listen_archive (str): the path to the ListenBrainz listen dump archive to be imported
         threads (int): the number of threads to use during decompression, defaults to 1
+        workers (int): the number of processes to insert listens with, defaults to 1
+        defer_user_metadata (bool): recalculate the listen_user_metadata of all users once after importing listens
 
     .. note::
         This method tries to import the private db dump first, followed by the public db
@@ -352,7 +363,7 @@ def import_dump(private_archive, private_timescale_archive,
                                      threads)
         if listen_archive:
             from listenbrainz.webserver.timescale_connection import _ts as ls
-            ls.import_listens_dump(listen_archive, threads)
+            ls.import_listens_dump(listen_archive, threads, workers, defer_user_metadata)
 
     sys.exit(0)
 
@@ -3,11 +3,50 @@ from random import randint
 import uuid
 
 from psycopg2.extras import DictCursor
-from psycopg2.sql import SQL, Literal
+from psycopg2.sql import SQL, Literal, Composable
 
+from listenbrainz.db.similarity_index import get_similar
 from listenbrainz.webserver import ts_conn
 
 
+SIMILAR_ARTIST_LIMIT = 100
+
+
+def get_similar_artists_query(seed_artist: str, limit: int) -> Composable:
+    """ Return the query selecting the artists similar to the seed artist along with their similarity scores.
+
+        The similar artists come from the artist similarity dataset. If the seed artist has no similar artists
+        there, for instance because it has too few listens to make the dataset's cutoffs, the artists closest
+        to it in the artist embeddings index are used instead.
+    """
+    seed_artist_mbid = Literal(uuid.UUID(seed_artist))
+    with ts_conn.connection.cursor() as curs:
+        curs.execute(SQL("""
+            SELECT EXISTS(
+                SELECT 1
+                  FROM similarity.artist
+                 WHERE mbid0 = {seed_artist_mbid} OR mbid1 = {seed_artist_mbid}
+            )
+        """).format(seed_artist_mbid=seed_artist_mbid))
+        has_similar_artists = curs.fetchone()[0]
+
+    if not has_similar_artists:
+        similar = get_similar("artist", [seed_artist], limit)
+        if similar:
+            values = SQL(", ").join(
+                SQL("({mbid}, {score})").format(mbid=Literal(uuid.UUID(mbid)), score=Literal(score))
+                for mbid, score in similar
+            )
+            return SQL("SELECT * FROM (VALUES {values}) AS t(similar_artist_mbid, score)").format(values=values)
+
+    return SQL("""
+           SELECT CASE WHEN mbid0 = {seed_artist_mbid} THEN mbid1 ELSE mbid0 END AS similar_artist_mbid
+                , sa.score
+             FROM similarity.artist sa
+            WHERE (mbid0 = {seed_artist_mbid} OR mbid1 = {seed_artist_mbid})
+    """).format(seed_artist_mbid=seed_artist_mbid)
+
+
 def lb_radio_artist(mode: str, seed_artist: str, max_similar_artists: int, num_recordings_per_artist: int, pop_begin: float,
                     pop_end: float) -> dict[str, list[dict]]:
     """
@@ -35,10 +74,7 @@ def lb_radio_artist(mode: str, seed_artist: str, max_similar_artists: int, num_r
     """
     query = SQL("""
         WITH similar_artists AS (
-           SELECT CASE WHEN mbid0 = {seed_artist_mbid} THEN mbid1 ELSE mbid0 END AS similar_artist_mbid
-                , sa.score
-             FROM similarity.artist sa
-            WHERE (mbid0 = {seed_artist_mbid} OR mbid1 = {seed_artist_mbid})
+           {similar_artists}
         ), knockdown AS (
            SELECT similar_artist_mbid
                 , CASE WHEN similar_artist_mbid = oa.artist_mbid THEN score * oa.factor ELSE score END AS score
@@ -110,8 +146,9 @@ def lb_radio_artist(mode: str, seed_artist: str, max_similar_artists: int, num_r
                ON artist_mbid = similar_artist_mbid
             WHERE rownum < {num_recordings_per_artist}
     """).format(
+        similar_artists=get_similar_artists_query(seed_artist, SIMILAR_ARTIST_LIMIT),
         seed_artist_mbid=Literal(uuid.UUID(seed_artist)),
-        similar_artist_limit=Literal(100),
+        similar_artist_limit=Literal(SIMILAR_ARTIST_LIMIT),
         pop_begin=Literal(pop_begin),
         pop_end=Literal(pop_end),
         num_recordings_per_artist=Literal(num_recordings_per_artist)
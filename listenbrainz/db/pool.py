@@ -0,0 +1,163 @@
+""" Connection pooling for the SQLAlchemy engines of the ListenBrainz and Timescale databases.
+
+By default, engines use a NullPool which opens a new connection for every checkout. This is the right choice
+when the connection strings point at PgBouncer. With DB_POOL_MODE = "queue", each process keeps up to
+DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW connections open instead, and submits checkout and usage statistics
+of the pool as metrics.
+
+With a pool, a DBAPI connection checked out with engine.raw_connection() only goes back to the pool when it
+is closed. Use the raw_connection context manager below, or close the connection in a finally block,
+otherwise the pool is drained.
+"""
+import logging
+import os
+import weakref
+from contextlib import contextmanager
+from time import monotonic
+from typing import Optional
+
+import sqlalchemy
+from brainzutils import metrics
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+POOL_MODE_NULL = "null"
+POOL_MODE_QUEUE = "queue"
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_POOL_MAX_OVERFLOW = 10
+DEFAULT_POOL_TIMEOUT = 30  # seconds
+DEFAULT_POOL_RECYCLE = 30 * 60  # seconds
+DEFAULT_POOL_PRE_PING = True
+
+POOL_METRICS_INTERVAL = 60  # seconds
+
+# engines with a connection pool, these need to drop the connections inherited from the parent after a fork
+_pooled_engines: weakref.WeakSet = weakref.WeakSet()
+
+
+def get_pool_options(config) -> Optional[dict]:
+    """ Read the pool settings from the given flask config. Returns None if pooling is disabled. """
+    mode = config.get("DB_POOL_MODE", POOL_MODE_NULL)
+    if mode == POOL_MODE_NULL:
+        return None
+    if mode != POOL_MODE_QUEUE:
+        raise ValueError(f"Unknown DB_POOL_MODE: {mode}")
+
+    return {
+        "pool_size": config.get("DB_POOL_SIZE", DEFAULT_POOL_SIZE),
+        "max_overflow": config.get("DB_POOL_MAX_OVERFLOW", DEFAULT_POOL_MAX_OVERFLOW),
+        "pool_timeout": config.get("DB_POOL_TIMEOUT", DEFAULT_POOL_TIMEOUT),
+        "pool_recycle": config.get("DB_POOL_RECYCLE", DEFAULT_POOL_RECYCLE),
+        "pool_pre_ping": config.get("DB_POOL_PRE_PING", DEFAULT_POOL_PRE_PING),
+    }
+
+
+def create_pooled_engine(connect_str: str, name: str, pool_options: Optional[dict] = None) -> sqlalchemy.engine.Engine:
+    """ Create an engine for the connection string, using a NullPool if pool_options is None and an
+    instrumented QueuePool otherwise.
+
+    Args:
+        connect_str: the database connection string
+        name: the name of the pool in the submitted metrics
+        pool_options: the pool_* arguments for create_engine, see get_pool_options
+    """
+    if pool_options is None:
+        return create_engine(connect_str, poolclass=NullPool)
+
+    engine = create_engine(connect_str, poolclass=InstrumentedQueuePool, **pool_options)
+    engine.pool.stats = PoolStats(name)
+    _pooled_engines.add(engine)
+    return engine
+
+
+@contextmanager
+def raw_connection(engine: sqlalchemy.engine.Engine):
+    """ Check out a DBAPI connection from the engine. Like ``with psycopg2.connect(...) as conn``, the
+    transaction is committed on success and rolled back on error, and then the connection is returned
+    to the pool (or closed if the engine doesn't pool connections). """
+    conn = engine.raw_connection()
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+class PoolStats:
+    """ Counts the checkouts from a pool and the time spent waiting for a connection, and submits them
+    along with the current usage of the pool once every POOL_METRICS_INTERVAL seconds. """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.submitted = monotonic()
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def record_checkout(self, pool: QueuePool, wait_time: float, timed_out: bool):
+        self.checkouts += 1
+        self.timeouts += int(timed_out)
+        self.wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+
+        now = monotonic()
+        if now < self.submitted + POOL_METRICS_INTERVAL:
+            return
+        self.submitted = now
+
+        try:
+            metrics.set(
+                "db_pool_" + self.name,
+                checkouts=self.checkouts,
+                timeouts=self.timeouts,
+                wait_time=self.wait_time,
+                max_wait_time=self.max_wait_time,
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        except Exception:
+            logger.error("Cannot submit %s pool metrics:", self.name, exc_info=True)
+        self.reset()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """ A QueuePool which records the time spent waiting for each checkout in its PoolStats """
+
+    stats: Optional[PoolStats] = None
+
+    def _do_get(self):
+        t0 = monotonic()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except sqlalchemy.exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            if self.stats is not None:
+                self.stats.record_checkout(self, monotonic() - t0, timed_out)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def _dispose_pooled_engines_after_fork():
+    # the child must not use the connections of the parent, but also must not close them
+    for engine in list(_pooled_engines):
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_dispose_pooled_engines_after_fork)
@@ -5,6 +5,7 @@ from psycopg2.sql import SQL, Identifier
 from sqlalchemy import text
 
 from listenbrainz.db import color
+from listenbrainz.db.binary_copy import encode_uuid, encode_int4
 from listenbrainz.db.recording import load_recordings_from_mbids_with_redirects
 from listenbrainz.spark.spark_dataset import DatabaseDataset
 from listenbrainz.webserver.views.metadata_api import fetch_release_group_metadata
@@ -40,6 +41,13 @@ class PopularityDataset(DatabaseDataset):
         values = [(r[self.entity_mbid], r["total_listen_count"], r["total_user_count"]) for r in message["data"]]
         return query, None, values
 
+    def get_copy_columns(self):
+        return [
+            (self.entity_mbid, encode_uuid),
+            ("total_listen_count", encode_int4),
+            ("total_user_count", encode_int4)
+        ]
+
     def get_indices(self):
         if self.mlhd:
             prefix = "mlhd_popularity"
@@ -82,6 +90,14 @@ class PopularityTopDataset(DatabaseDataset):
         values = [(r["artist_mbid"], r[self.entity_mbid], r["total_listen_count"], r["total_user_count"]) for r in message["data"]]
         return query, None, values
 
+    def get_copy_columns(self):
+        return [
+            ("artist_mbid", encode_uuid),
+            (self.entity_mbid, encode_uuid),
+            ("total_listen_count", encode_int4),
+            ("total_user_count", encode_int4)
+        ]
+
     def get_indices(self):
         if self.mlhd:
             prefix = "mlhd_popularity_top"
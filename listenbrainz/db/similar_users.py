@@ -25,10 +25,17 @@ def import_user_similarities(data):
         and the user count values will be set accordingly.
     """
 
+    conn = db.engine.raw_connection()
+    try:
+        return _import_user_similarities(conn, data)
+    finally:
+        conn.close()
+
+
+def _import_user_similarities(conn, data):
     user_count = 0
     target_user_count = 0
     # Start by importing the data into an import table
-    conn = db.engine.raw_connection()
     try:
         with conn.cursor() as curs:
             curs.execute(
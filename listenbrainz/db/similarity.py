@@ -2,8 +2,9 @@ from flask import current_app
 from psycopg2.extras import execute_values
 from psycopg2.sql import SQL, Literal, Identifier
 
-from listenbrainz.db import timescale
+from listenbrainz.db import timescale, similarity_index
 from listenbrainz.db.artist import load_artists_from_mbids_with_redirects
+from listenbrainz.db.binary_copy import encode_uuid, encode_int4, encode_float4_array
 from listenbrainz.spark.spark_dataset import DatabaseDataset
 
 
@@ -27,6 +28,9 @@ class SimilarityDataset(DatabaseDataset):
         values = [(x["mbid0"], x["mbid1"], x["score"]) for x in message["data"]]
         return query, None, values
 
+    def get_copy_columns(self):
+        return [("mbid0", encode_uuid), ("mbid1", encode_uuid), ("score", encode_int4)]
+
     def run_post_processing(self, cursor, message):
         query = SQL("COMMENT ON TABLE {table} IS {comment}").format(
             table=self._get_table_name(),
@@ -39,6 +43,48 @@ SimilarRecordingsDataset = SimilarityDataset("recording")
 SimilarArtistsDataset = SimilarityDataset("artist")
 
 
+class EmbeddingsDataset(DatabaseDataset):
+    """ Dense embeddings of recordings or artists, used to build the similarity index of the entity. """
+
+    def __init__(self, entity):
+        super().__init__(f"similarity_{entity}_embeddings", f"{entity}_embedding", "similarity")
+        self.entity = entity
+
+    def get_table(self):
+        return "CREATE TABLE {table} (mbid UUID NOT NULL, vector REAL[] NOT NULL)"
+
+    def get_indices(self):
+        return [f"CREATE UNIQUE INDEX {self.entity}_embedding_mbid_uniq_idx_{{suffix}} ON {{table}} (mbid)"]
+
+    def get_inserts(self, message):
+        query = "INSERT INTO {table} (mbid, vector) VALUES %s"
+        values = [(x["mbid"], x["vector"]) for x in message["data"]]
+        return query, "(%s, %s::REAL[])", values
+
+    def get_copy_columns(self):
+        return [("mbid", encode_uuid), ("vector", encode_float4_array)]
+
+    def run_post_processing(self, cursor, message):
+        query = SQL("COMMENT ON TABLE {table} IS {comment}").format(
+            table=self._get_table_name(),
+            comment=Literal(f"This dataset is created using the algorithm {message['algorithm']}")
+        )
+        cursor.execute(query)
+
+    def handle_end(self, message):
+        super().handle_end(message)
+        # build the index after the tables have been swapped so that the table isn't locked meanwhile
+        conn = timescale.engine.raw_connection()
+        try:
+            similarity_index.build_index_from_table(conn, self.entity, self.schema, self.base_table_name)
+        finally:
+            conn.close()
+
+
+RecordingEmbeddingsDataset = EmbeddingsDataset("recording")
+ArtistEmbeddingsDataset = EmbeddingsDataset("artist")
+
+
 def insert(table, data, algorithm):
     """ Insert similar recordings in database """
     query = SQL("""
@@ -0,0 +1,261 @@
+""" Approximate nearest neighbour index over the recording and artist embeddings generated in spark.
+
+The index is an inverted file (IVF) index: the normalized embeddings are clustered using spherical k-means and
+stored grouped by their cluster. A query only scores the embeddings of the few clusters whose centroids are the
+closest to it. The index is stored as numpy arrays in SIMILARITY_INDEX_DIR and memory-mapped when loaded, so it
+is shared between the processes on a host through the page cache and only the probed clusters are read from disk.
+
+Each build of the index is written to its own directory and the `current` symlink of the entity is then switched
+to it, processes which have already loaded an index notice the change and reload it on the next query.
+"""
+import os
+import shutil
+import tempfile
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+from flask import current_app
+from psycopg2.sql import SQL, Identifier
+
+# the number of clusters is the square root of the number of embeddings, limited to this value
+MAX_LISTS = 4096
+# the k-means centroids are trained on a sample of this many embeddings per cluster
+TRAINING_SAMPLE_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+# the number of clusters scored per query
+DEFAULT_NPROBE = 16
+# the number of embeddings assigned to their clusters at once, limits the size of the score matrix
+ASSIGN_BATCH_SIZE = 16384
+
+CURRENT_LINK = "current"
+
+_loaded_indexes = {}
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """ Return the index of the closest centroid for each of the vectors. """
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BATCH_SIZE):
+        batch = vectors[start:start + ASSIGN_BATCH_SIZE]
+        assignment[start:start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+    return assignment
+
+
+def _train_centroids(vectors: np.ndarray, lists: int, rng: np.random.Generator) -> np.ndarray:
+    """ Cluster a sample of the vectors into the given number of lists using spherical k-means. """
+    sample_size = min(len(vectors), lists * TRAINING_SAMPLE_PER_LIST)
+    sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    centroids = sample[rng.choice(sample_size, lists, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = _assign(sample, centroids)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=lists)
+        non_empty = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[non_empty]
+        # clusters which lost all their vectors keep their previous centroid
+        centroids[non_empty] = _normalize(np.add.reduceat(sample[order], starts, axis=0))
+    return centroids
+
+
+class SimilarityIndex:
+    """ A memory-mapped IVF index of normalized embeddings keyed by mbid. """
+
+    FILES = ("centroids", "offsets", "vectors", "mbids", "sorted_mbids", "sorted_rows")
+
+    def __init__(self, directory: str):
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in self.FILES}
+        self.directory = directory
+        # the centroids and list offsets are read for every query, keep them in memory
+        self.centroids = np.array(arrays["centroids"])
+        self.offsets = np.array(arrays["offsets"])
+        self.vectors = arrays["vectors"]
+        self.mbids = arrays["mbids"]
+        self.sorted_mbids = arrays["sorted_mbids"]
+        self.sorted_rows = arrays["sorted_rows"]
+
+    @staticmethod
+    def build(directory: str, mbids: Iterable[str], vectors: np.ndarray, seed: int = 0):
+        """ Build the index of the given embeddings and save it in the directory.
+
+        Args:
+            directory: the directory to save the index files in, created if it doesn't exist
+            mbids: the mbids of the embeddings, in the same order as the vectors
+            vectors: a 2-D array containing an embedding per row
+            seed: the seed of the random sampling used to train the centroids
+        """
+        mbids = np.array([str(mbid) for mbid in mbids], dtype="S36")
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+
+        lists = max(1, min(MAX_LISTS, int(np.sqrt(len(vectors)))))
+        centroids = _train_centroids(vectors, lists, np.random.default_rng(seed))
+
+        # store the vectors grouped by cluster so that the vectors of a cluster are read sequentially
+        assignment = _assign(vectors, centroids)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=lists)))).astype(np.int64)
+        mbids = mbids[order]
+        sorted_rows = np.argsort(mbids, kind="stable").astype(np.int64)
+
+        os.makedirs(directory, exist_ok=True)
+        arrays = {
+            "centroids": centroids.astype(np.float32),
+            "offsets": offsets,
+            "vectors": vectors[order],
+            "mbids": mbids,
+            "sorted_mbids": mbids[sorted_rows],
+            "sorted_rows": sorted_rows,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+
+    def __len__(self):
+        return len(self.mbids)
+
+    def get_rows(self, mbids: Iterable[str]) -> np.ndarray:
+        """ Return the rows of the embeddings of the given mbids, mbids not in the index are skipped. """
+        keys = np.array([str(mbid) for mbid in mbids], dtype="S36")
+        if len(keys) == 0 or len(self) == 0:
+            return np.array([], dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.sorted_mbids, keys), len(self) - 1)
+        found = self.sorted_mbids[positions] == keys
+        return np.asarray(self.sorted_rows[positions[found]])
+
+    def search(self, query: np.ndarray, count: int, nprobe: int = DEFAULT_NPROBE,
+               exclude_rows: Optional[np.ndarray] = None) -> list[tuple[str, float]]:
+        """ Find the embeddings with the highest cosine similarity to the query vector.
+
+        Returns a list of (mbid, score) tuples ordered by descending score.
+        """
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        nprobe = min(nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+
+        rows, scores = [], []
+        for cluster in lists:
+            start, end = self.offsets[cluster], self.offsets[cluster + 1]
+            if start == end:
+                continue
+            rows.append(np.arange(start, end))
+            scores.append(self.vectors[start:end] @ query)
+        if not rows:
+            return []
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+
+        if exclude_rows is not None and len(exclude_rows) > 0:
+            keep = ~np.isin(rows, exclude_rows)
+            rows, scores = rows[keep], scores[keep]
+
+        count = min(count, len(rows))
+        if count <= 0:
+            return []
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.mbids[rows[i]].decode(), float(scores[i])) for i in top]
+
+    def similar_to(self, seed_mbids: Iterable[str], count: int,
+                   nprobe: int = DEFAULT_NPROBE) -> list[tuple[str, float]]:
+        """ Find the embeddings most similar to the average of the embeddings of the seed mbids, the seeds
+        themselves are excluded from the results. Seeds not in the index are ignored. """
+        seed_rows = self.get_rows(seed_mbids)
+        if len(seed_rows) == 0:
+            return []
+        query = np.asarray(self.vectors[np.sort(seed_rows)]).mean(axis=0)
+        return self.search(query, count, nprobe, seed_rows)
+
+
+def get_index_directory(entity: str) -> str:
+    return os.path.join(current_app.config["SIMILARITY_INDEX_DIR"], entity)
+
+
+def build_index(entity: str, mbids: Iterable[str], vectors: np.ndarray):
+    """ Build a new version of the index of the entity and make it the current index.
+
+    Older versions are deleted, processes which have them loaded can keep using them until they reload.
+    """
+    index_directory = get_index_directory(entity)
+    os.makedirs(index_directory, exist_ok=True)
+    version_directory = tempfile.mkdtemp(prefix=f"{int(time.time())}_", dir=index_directory)
+    os.chmod(version_directory, 0o755)
+    version = os.path.basename(version_directory)
+    SimilarityIndex.build(version_directory, mbids, vectors)
+
+    link = os.path.join(index_directory, CURRENT_LINK)
+    tmp_link = f"{link}.tmp"
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(version, tmp_link)
+    os.replace(tmp_link, link)
+
+    for name in os.listdir(index_directory):
+        path = os.path.join(index_directory, name)
+        if name != version and os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def build_index_from_table(conn, entity: str, schema: str, table: str):
+    """ Build the index of the entity from the embeddings stored in the given table. """
+    with conn.cursor() as curs:
+        curs.execute(SQL("SELECT count(*), max(array_length(vector, 1)) FROM {table}").format(
+            table=Identifier(schema, table)
+        ))
+        count, dimensions = curs.fetchone()
+    if not count:
+        current_app.logger.info("No %s embeddings found, not building the similarity index.", entity)
+        return
+
+    mbids = []
+    vectors = np.zeros((count, dimensions), dtype=np.float32)
+    # use a server side cursor to avoid holding all the rows in memory twice
+    with conn.cursor(name=f"similarity_index_{entity}") as curs:
+        curs.itersize = 10000
+        curs.execute(SQL("SELECT mbid::TEXT, vector FROM {table}").format(table=Identifier(schema, table)))
+        for row, (mbid, vector) in enumerate(curs):
+            mbids.append(mbid)
+            vectors[row, :len(vector)] = vector
+
+    build_index(entity, mbids, vectors)
+    current_app.logger.info("Built the %s similarity index of %d embeddings.", entity, count)
+
+
+def load_index(entity: str) -> Optional[SimilarityIndex]:
+    """ Return the current index of the entity, None if no index has been built yet. The index is loaded once
+    per process and reloaded when a new version is built. """
+    link = os.path.join(get_index_directory(entity), CURRENT_LINK)
+    try:
+        version = os.readlink(link)
+    except OSError:
+        return None
+
+    loaded = _loaded_indexes.get(entity)
+    if loaded is not None and loaded[0] == version:
+        return loaded[1]
+
+    try:
+        index = SimilarityIndex(os.path.join(os.path.dirname(link), version))
+    except OSError:
+        # the version was replaced while it was being loaded
+        current_app.logger.warning("Could not load the %s similarity index.", entity, exc_info=True)
+        return None
+    _loaded_indexes[entity] = version, index
+    return index
+
+
+def get_similar(entity: str, seed_mbids: Iterable[str], count: int,
+                nprobe: int = DEFAULT_NPROBE) -> list[tuple[str, float]]:
+    """ Find the recordings or artists most similar to the given set of seeds using the embeddings index.
+
+    Returns a list of (mbid, score) tuples ordered by descending cosine similarity, an empty list if the index
+    is not available or none of the seeds are in it.
+    """
+    index = load_index(entity)
+    if index is None:
+        return []
+    return index.similar_to(seed_mbids, count, nprobe)
@@ -68,6 +68,21 @@ class CouchdbTestCase(unittest.TestCase):
         mock_lock.assert_called_with(database)
         mock_unlock.assert_called_with(database)
 
+    def test_dump_parallel_readers(self):
+        database = "couchdb_dump_parallel_test_db_20220730"
+        couchdb.create_database(database)
+        docs = [{"_id": f"{i:03d}", "data": i} for i in range(50)]
+        couchdb.insert_data(database, docs)
+
+        dumped = BytesIO()
+        couchdb.dump_database("couchdb_dump_parallel_test_db", dumped, readers=3, page_size=7)
+        dumped.seek(0)
+        received = [json.loads(line) for line in dumped.read().splitlines()]
+
+        # every document exactly once, in key order and without the LOCK document
+        self.assertEqual([{"data": i} for i in range(50)], received)
+        self.assertFalse(couchdb.check_database_lock(database))
+
     def test_insert_new_data_overwrites_conflicts(self):
         database = "couchdb_dump_test_db_20240204"
         couchdb.create_database(database)
@@ -106,3 +121,40 @@ class CouchdbTestCase(unittest.TestCase):
         self.assertEqual(response["data"], "bar")
         response = couchdb.fetch_data(database, 3)
         self.assertEqual(response["data"], "foobar")
+
+    def test_fetch_data_bulk(self):
+        couchdb.create_database("couchdb_bulk_test_db_20240203")
+        couchdb.create_database("couchdb_bulk_test_db_20240204")
+        couchdb.insert_data("couchdb_bulk_test_db_20240203", [{"_id": "1", "data": "old"}, {"_id": "2", "data": "bar"}])
+        couchdb.insert_data("couchdb_bulk_test_db_20240204", [{"_id": "1", "data": "foo"}])
+
+        couchdb.create_database("couchdb_bulktwo_test_db_20240204")
+        couchdb.insert_data("couchdb_bulktwo_test_db_20240204", [{"_id": "1", "data": "baz"}])
+
+        docs = couchdb.fetch_data_bulk([
+            ("couchdb_bulk_test_db", 1),
+            ("couchdb_bulk_test_db", 2),
+            ("couchdb_bulk_test_db", 3),
+            ("couchdb_bulktwo_test_db", 1),
+            ("couchdb_bulktwo_test_db", 2),
+        ])
+        self.assertEqual(docs.keys(), {("couchdb_bulk_test_db", "1"), ("couchdb_bulk_test_db", "2"),
+                                       ("couchdb_bulktwo_test_db", "1")})
+        # documents are read from the latest database which has them
+        self.assertEqual(docs[("couchdb_bulk_test_db", "1")]["data"], "foo")
+        self.assertEqual(docs[("couchdb_bulk_test_db", "2")]["data"], "bar")
+        self.assertEqual(docs[("couchdb_bulktwo_test_db", "1")]["data"], "baz")
+        self.assertEqual(couchdb.fetch_data_bulk([]), {})
+
+    def test_fetch_data_after_database_deleted(self):
+        couchdb.create_database("couchdb_cache_test_db_20240203")
+        couchdb.insert_data("couchdb_cache_test_db_20240203", [{"_id": "1", "data": "foo"}])
+        self.assertEqual(couchdb.fetch_data("couchdb_cache_test_db", 1)["data"], "foo")
+
+        # replace the database behind the back of the cached database list
+        response = requests.put(f"{get_base_url()}/couchdb_cache_test_db_20240204")
+        response.raise_for_status()
+        requests.put(f"{get_base_url()}/couchdb_cache_test_db_20240204/1", json={"data": "bar"}).raise_for_status()
+        requests.delete(f"{get_base_url()}/couchdb_cache_test_db_20240203").raise_for_status()
+
+        self.assertEqual(couchdb.fetch_data("couchdb_cache_test_db", 1)["data"], "bar")
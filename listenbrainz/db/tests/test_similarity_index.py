@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+import uuid
+
+import numpy as np
+from flask import Flask
+
+from listenbrainz.db import similarity_index
+from listenbrainz.db.similarity_index import SimilarityIndex
+
+
+class SimilarityIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(1)
+        self.mbids = [str(uuid.UUID(int=i)) for i in range(500)]
+        self.vectors = rng.normal(size=(500, 16)).astype(np.float32)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+        similarity_index._loaded_indexes.clear()
+
+    def _exact_neighbours(self, query, count, exclude):
+        vectors = self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        scores = vectors @ (query / np.linalg.norm(query))
+        order = [i for i in np.argsort(-scores) if i not in exclude]
+        return [self.mbids[i] for i in order[:count]]
+
+    def test_search_probing_all_lists_is_exact(self):
+        SimilarityIndex.build(self.tempdir.name, self.mbids, self.vectors)
+        index = SimilarityIndex(self.tempdir.name)
+        self.assertEqual(len(index), 500)
+        self.assertIsInstance(index.vectors, np.memmap)
+
+        received = index.similar_to([self.mbids[3], self.mbids[7]], 10, nprobe=len(index.centroids))
+        query = self.vectors[3] / np.linalg.norm(self.vectors[3]) + self.vectors[7] / np.linalg.norm(self.vectors[7])
+        self.assertEqual(self._exact_neighbours(query, 10, {3, 7}), [mbid for mbid, _ in received])
+
+        scores = [score for _, score in received]
+        self.assertEqual(sorted(scores, reverse=True), scores)
+
+    def test_similar_to_unknown_seeds(self):
+        SimilarityIndex.build(self.tempdir.name, self.mbids, self.vectors)
+        index = SimilarityIndex(self.tempdir.name)
+        self.assertEqual(len(index.get_rows([self.mbids[10], str(uuid.UUID(int=10000))])), 1)
+        self.assertEqual(index.similar_to([str(uuid.UUID(int=10000))], 10), [])
+
+    def test_build_and_reload(self):
+        app = Flask(__name__)
+        app.config["SIMILARITY_INDEX_DIR"] = self.tempdir.name
+        with app.app_context():
+            self.assertIsNone(similarity_index.load_index("artist"))
+            self.assertEqual(similarity_index.get_similar("artist", [self.mbids[0]], 5), [])
+
+            similarity_index.build_index("artist", self.mbids[:100], self.vectors[:100])
+            first = similarity_index.load_index("artist")
+            self.assertEqual(len(first), 100)
+            self.assertIs(first, similarity_index.load_index("artist"))
+            self.assertEqual(len(similarity_index.get_similar("artist", [self.mbids[0]], 5)), 5)
+
+            similarity_index.build_index("artist", self.mbids, self.vectors)
+            second = similarity_index.load_index("artist")
+            self.assertEqual(len(second), 500)
+            # only the current version of the index is kept on disk
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(self.tempdir.name, "artist"))),
+                sorted([similarity_index.CURRENT_LINK, os.path.basename(second.directory)])
+            )
@@ -138,6 +138,22 @@ class UserRelationshipTestCase(DatabaseTestCase):
         followers = db_user_relationship.get_followers_of_user(self.db_conn, self.followed_user_1['id'])
         self.assertEqual(2, len(followers))
 
+    def test_get_followers_of_users_and_follower_counts(self):
+        user_ids = [self.followed_user_1['id'], self.followed_user_2['id']]
+        self.assertDictEqual(db_user_relationship.get_followers_of_users(self.db_conn, user_ids), {})
+        self.assertDictEqual(db_user_relationship.get_follower_counts(self.db_conn, user_ids), {})
+
+        db_user_relationship.insert(self.db_conn, self.main_user['id'], self.followed_user_1['id'], 'follow')
+        db_user_relationship.insert(self.db_conn, self.followed_user_2['id'], self.followed_user_1['id'], 'follow')
+        db_user_relationship.insert(self.db_conn, self.main_user['id'], self.followed_user_2['id'], 'follow')
+
+        followers = db_user_relationship.get_followers_of_users(self.db_conn, user_ids)
+        self.assertCountEqual(followers[self.followed_user_1['id']], [self.main_user['id'], self.followed_user_2['id']])
+        self.assertCountEqual(followers[self.followed_user_2['id']], [self.main_user['id']])
+
+        counts = db_user_relationship.get_follower_counts(self.db_conn, user_ids)
+        self.assertDictEqual(counts, {self.followed_user_1['id']: 2, self.followed_user_2['id']: 1})
+
     def test_get_following_for_user_returns_correct_data(self):
 
         # no relationships yet, should return an empty list
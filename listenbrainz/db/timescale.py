@@ -1,11 +1,12 @@
 from typing import Optional
 
 import sqlalchemy
-from sqlalchemy import create_engine, text
-from sqlalchemy.pool import NullPool
+from sqlalchemy import text
 import time
 import psycopg2
 
+from listenbrainz.db.pool import create_pooled_engine
+
 # The schema version of the timescale database (tables created
 # from ./admin/timescale/create-tables.sql). This includes user playlists
 # and mbid mappings.
@@ -19,12 +20,15 @@ engine: Optional[sqlalchemy.engine.Engine] = None
 DUMP_DEFAULT_THREAD_COUNT = 4
 
 
-def init_db_connection(connect_str):
+def init_db_connection(connect_str, pool_options=None):
     """Initializes timescale connection using the specified Flask app.
 
     Configuration file must contain `SQLALCHEMY_DATABASE_URI` key. See
     https://pythonhosted.org/Flask-SQLAlchemy/config.html#configuration-keys
     for more info.
+
+    If pool_options are given, the engine keeps a pool of connections, see
+    :func:`~listenbrainz.db.pool.get_pool_options`. Otherwise, a new connection is opened for every checkout.
     """
     global engine
     if not connect_str:
@@ -32,7 +36,7 @@ def init_db_connection(connect_str):
 
     while True:
         try:
-            engine = create_engine(connect_str, poolclass=NullPool)
+            engine = create_pooled_engine(connect_str, "timescale", pool_options)
             break
         except psycopg2.OperationalError as e:
             print("Couldn't establish connection to timescale: {}".format(str(e)))
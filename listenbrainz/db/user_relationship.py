@@ -17,7 +17,7 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 from datetime import datetime
-from typing import List, Iterable
+from typing import List, Iterable, Dict
 
 import sqlalchemy
 
@@ -114,6 +114,34 @@ def get_followers_of_user(db_conn, user: int) -> List[dict]:
     return result.mappings().all()
 
 
+def get_followers_of_users(db_conn, users: Iterable[int]) -> Dict[int, List[int]]:
+    """ Returns the ids of the followers of each of the specified users, users without followers are omitted.
+    """
+    result = db_conn.execute(sqlalchemy.text("""
+        SELECT user_1 AS followed
+             , array_agg(user_0) AS followers
+          FROM user_relationship
+         WHERE user_1 = ANY(:followed)
+           AND relationship_type = 'follow'
+      GROUP BY user_1
+    """), {"followed": list(users)})
+    return {row.followed: row.followers for row in result}
+
+
+def get_follower_counts(db_conn, users: Iterable[int]) -> Dict[int, int]:
+    """ Returns the number of followers of each of the specified users, users without followers are omitted.
+    """
+    result = db_conn.execute(sqlalchemy.text("""
+        SELECT user_1 AS followed
+             , count(*) AS follower_count
+          FROM user_relationship
+         WHERE user_1 = ANY(:followed)
+           AND relationship_type = 'follow'
+      GROUP BY user_1
+    """), {"followed": list(users)})
+    return {row.followed: row.follower_count for row in result}
+
+
 def get_following_for_user(db_conn, user: int) -> List[dict]:
     """ Returns a list of users who the specified user follows.
     """
@@ -72,6 +72,8 @@ def insert(key, year, data, cast_to_jsonb):
     except psycopg2.errors.OperationalError:
         connection.rollback()
         current_app.logger.error(f"Error while inserting {key}:", exc_info=True)
+    finally:
+        connection.close()
 
 
 def insert_light(key, year, data):
@@ -92,6 +94,8 @@ def insert_light(key, year, data):
     except psycopg2.errors.OperationalError:
         connection.rollback()
         current_app.logger.error(f"Error while inserting {key}:", exc_info=True)
+    finally:
+        connection.close()
 
 
 def insert_heavy(key, year, data):
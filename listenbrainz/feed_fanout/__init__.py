@@ -0,0 +1,3 @@
+# users with more followers than this don't have their listens copied to the feed timelines, unless
+# FEED_FANOUT_MAX_FOLLOWERS is set
+DEFAULT_MAX_FOLLOWERS = 1000
@@ -0,0 +1,122 @@
+import time
+from collections import defaultdict
+from time import monotonic
+
+import orjson
+from brainzutils import metrics
+from kombu import Exchange, Queue, Connection, Consumer, Message
+from kombu.mixins import ConsumerMixin
+
+import listenbrainz.db.user_relationship as db_user_relationship
+from listenbrainz import db
+from listenbrainz.feed_fanout import DEFAULT_MAX_FOLLOWERS
+from listenbrainz.utils import get_fallback_connection_name
+from listenbrainz.webserver import create_app, redis_connection
+
+METRIC_UPDATE_INTERVAL = 60  # seconds
+
+
+class FeedFanoutWriter(ConsumerMixin):
+    """ Copies references to the new unique listens into the redis feed timelines of the followers of their
+        users, see RedisListenStore.add_to_feed_timelines. The listens of users with more than
+        FEED_FANOUT_MAX_FOLLOWERS followers are skipped, the feed fetches them from timescale instead. """
+
+    def __init__(self, app):
+        self.app = app
+        self.connection = None
+        self.unique_exchange = Exchange(self.app.config["UNIQUE_EXCHANGE"], "fanout", durable=False)
+        self.fanout_queue = Queue(self.app.config["FEED_FANOUT_QUEUE"], exchange=self.unique_exchange, durable=True)
+        self.max_followers = self.app.config.get("FEED_FANOUT_MAX_FOLLOWERS", DEFAULT_MAX_FOLLOWERS)
+
+        # these are counts since the last metric update was submitted
+        self.listens = 0
+        self.skipped_listens = 0
+        self.timeline_writes = 0
+        self.metric_submission_time = monotonic() + METRIC_UPDATE_INTERVAL
+
+    def get_consumers(self, _, channel):
+        return [Consumer(channel, queues=[self.fanout_queue], on_message=lambda x: self.callback(x))]
+
+    def callback(self, message: Message):
+        listens = orjson.loads(message.body)
+        self.fanout(listens)
+        message.ack()
+
+    def fanout(self, listens: list[dict]):
+        """ Add the listens to the timelines of the followers of their users """
+        refs_by_user = defaultdict(list)
+        for listen in listens:
+            refs_by_user[listen["user_id"]].append((listen["user_id"], listen["timestamp"], listen["recording_msid"]))
+
+        with db.engine.connect() as connection:
+            followers = db_user_relationship.get_followers_of_users(connection, refs_by_user.keys())
+
+        timelines = defaultdict(list)
+        skipped = {}
+        for user_id, refs in refs_by_user.items():
+            user_followers = followers.get(user_id, [])
+            if len(user_followers) > self.max_followers:
+                # recorded so that the feed keeps fetching the listens of the user from timescale for the
+                # period they are missing from the timelines, if the user drops below the threshold later
+                skipped[user_id] = max(listened_at for _, listened_at, _ in refs)
+                self.skipped_listens += len(refs)
+                continue
+            for follower_id in user_followers:
+                timelines[follower_id].extend(refs)
+            self.timeline_writes += len(refs) * len(user_followers)
+
+        if timelines:
+            redis_connection._redis.add_to_feed_timelines(timelines)
+        if skipped:
+            redis_connection._redis.add_feed_fanout_skipped(skipped)
+
+        self.listens += len(listens)
+        self.submit_metrics()
+
+    def submit_metrics(self):
+        if monotonic() < self.metric_submission_time:
+            return
+        self.metric_submission_time = monotonic() + METRIC_UPDATE_INTERVAL
+
+        try:
+            metrics.set(
+                "feed_fanout",
+                listens=self.listens,
+                skipped_listens=self.skipped_listens,
+                timeline_writes=self.timeline_writes
+            )
+        except Exception:
+            self.app.logger.error("Cannot submit feed fanout metrics:", exc_info=True)
+        self.listens = 0
+        self.skipped_listens = 0
+        self.timeline_writes = 0
+
+    def init_rabbitmq_connection(self):
+        self.connection = Connection(
+            hostname=self.app.config["RABBITMQ_HOST"],
+            userid=self.app.config["RABBITMQ_USERNAME"],
+            port=self.app.config["RABBITMQ_PORT"],
+            password=self.app.config["RABBITMQ_PASSWORD"],
+            virtual_host=self.app.config["RABBITMQ_VHOST"],
+            transport_options={"client_properties": {"connection_name": get_fallback_connection_name()}}
+        )
+
+    def start(self):
+        while True:
+            try:
+                self.app.logger.info("Starting feed fanout writer...")
+                self.init_rabbitmq_connection()
+                self.run()
+            except KeyboardInterrupt:
+                self.app.logger.error("Keyboard interrupt!")
+                break
+            except Exception:
+                self.app.logger.error("Error in Feed Fanout Writer: ", exc_info=True)
+                time.sleep(3)
+
+
+if __name__ == "__main__":
+    app = create_app()
+    with app.app_context():
+        fw = FeedFanoutWriter(app)
+        fw.start()
@@ -1,9 +1,10 @@
-from flask import current_app
 from werkzeug.exceptions import BadRequest
 import psycopg2
 import psycopg2.extras
 
 from datasethoster import Query
+from listenbrainz.db import timescale
+from listenbrainz.db.pool import raw_connection
 
 
 class BulkTagLookup(Query):
@@ -29,7 +30,7 @@ class BulkTagLookup(Query):
         if len(mbids) > 1000:
             raise BadRequest("Cannot lookup more than 1,000 recordings at a time.")
 
-        with psycopg2.connect(current_app.config["SQLALCHEMY_TIMESCALE_URI"]) as conn:
+        with raw_connection(timescale.engine) as conn:
             with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as curs:
                 query = '''SELECT recording_mbid
                                 , tag
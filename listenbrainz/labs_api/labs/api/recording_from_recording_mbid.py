@@ -3,6 +3,8 @@ from datasethoster import Query
 from flask import current_app
 
 from listenbrainz.db.recording import load_recordings_from_mbids_with_redirects
+from listenbrainz.db import timescale
+from listenbrainz.db.pool import raw_connection
 
 
 class RecordingFromRecordingMBIDQuery(Query):
@@ -28,7 +30,7 @@ class RecordingFromRecordingMBIDQuery(Query):
 
         mbids = [p['[recording_mbid]'] for p in params]
         with psycopg2.connect(current_app.config["MB_DATABASE_URI"]) as mb_conn, \
-                psycopg2.connect(current_app.config["SQLALCHEMY_TIMESCALE_URI"]) as ts_conn, \
+                raw_connection(timescale.engine) as ts_conn, \
                 mb_conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as mb_curs, \
                 ts_conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as ts_curs:
             output = load_recordings_from_mbids_with_redirects(mb_curs, ts_curs, mbids)
@@ -7,7 +7,8 @@ import psycopg2
 import psycopg2.extras
 from datasethoster import Query
 from unidecode import unidecode
-from listenbrainz import config
+from listenbrainz.db import timescale
+from listenbrainz.db.pool import raw_connection
 
 
 class RecordingLookupBaseQuery(Query, ABC):
@@ -47,7 +48,7 @@ class RecordingLookupBaseQuery(Query, ABC):
 
         lookup_strings = tuple(lookup_strings)
 
-        with psycopg2.connect(config.SQLALCHEMY_TIMESCALE_URI) as conn:
+        with raw_connection(timescale.engine) as conn:
             with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as curs:
                 curs.execute(f"""
                     SELECT artist_credit_name
@@ -6,6 +6,8 @@ from psycopg2.extras import execute_values
 
 from listenbrainz.db import similarity
 from listenbrainz.db.artist import load_artists_from_mbids_with_redirects
+from listenbrainz.db import timescale
+from listenbrainz.db.pool import raw_connection
 
 
 class SimilarArtistsViewerQuery(Query):
@@ -32,7 +34,7 @@ class SimilarArtistsViewerQuery(Query):
         count = count if count > 0 else 100
 
         with psycopg2.connect(current_app.config["MB_DATABASE_URI"]) as mb_conn, \
-                psycopg2.connect(current_app.config["SQLALCHEMY_TIMESCALE_URI"]) as ts_conn, \
+                raw_connection(timescale.engine) as ts_conn, \
                 mb_conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as mb_curs, \
                 ts_conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as ts_curs:
 
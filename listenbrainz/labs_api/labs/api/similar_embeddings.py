@@ -0,0 +1,41 @@
+from datasethoster import Query
+from werkzeug.exceptions import BadRequest
+
+from listenbrainz.db import similarity_index
+
+MAX_SEEDS = 100
+MAX_COUNT = 1000
+
+
+class SimilarEmbeddingsQuery(Query):
+    """ Find recordings or artists similar to a set of seeds using the embeddings similarity index """
+
+    def __init__(self, entity):
+        super().__init__()
+        self.entity = entity
+
+    def setup(self):
+        pass
+
+    def names(self):
+        return f"similar-{self.entity}s-embeddings", f"Similar {self.entity.title()}s from Embeddings"
+
+    def inputs(self):
+        return [f"[{self.entity}_mbid]"]
+
+    def introduction(self):
+        return f"""Find the {self.entity}s most similar to a set of seed {self.entity}s using the embeddings
+                   generated from the recommendation model. The similarity is approximate and is not limited to
+                   the {self.entity} pairs of the similarity datasets."""
+
+    def outputs(self):
+        return [f"{self.entity}_mbid", "score"]
+
+    def fetch(self, params, offset=-1, count=-1):
+        seeds = [p[f"[{self.entity}_mbid]"].strip() for p in params]
+        if len(seeds) > MAX_SEEDS:
+            raise BadRequest(f"Cannot lookup more than {MAX_SEEDS} seeds at a time.")
+        count = min(count, MAX_COUNT) if count > 0 else 100
+
+        similar = similarity_index.get_similar(self.entity, seeds, count)
+        return [{f"{self.entity}_mbid": mbid, "score": score} for mbid, score in similar]
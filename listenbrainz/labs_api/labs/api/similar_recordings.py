@@ -6,6 +6,8 @@ from markupsafe import Markup
 
 from listenbrainz.db import similarity
 from listenbrainz.db.recording import load_recordings_from_mbids_with_redirects
+from listenbrainz.db import timescale
+from listenbrainz.db.pool import raw_connection
 
 
 class SimilarRecordingsViewerQuery(Query):
@@ -55,7 +57,7 @@ class SimilarRecordingsViewerQuery(Query):
         count = count if count > 0 else 100
 
         with psycopg2.connect(current_app.config["MB_DATABASE_URI"]) as mb_conn, \
-                psycopg2.connect(current_app.config["SQLALCHEMY_TIMESCALE_URI"]) as ts_conn, \
+                raw_connection(timescale.engine) as ts_conn, \
                 mb_conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as mb_curs, \
                 ts_conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as ts_curs:
 
@@ -8,6 +8,8 @@ from werkzeug.exceptions import BadRequest
 
 from listenbrainz.labs_api.labs.api.spotify.utils import lookup_using_metadata
 from listenbrainz.db.recording import resolve_redirect_mbids, resolve_canonical_mbids
+from listenbrainz.db import timescale
+from listenbrainz.db.pool import raw_connection
 
 
 class SpotifyIdFromMBIDQuery(Query):
@@ -63,7 +65,7 @@ class SpotifyIdFromMBIDQuery(Query):
         with psycopg2.connect(current_app.config["MB_DATABASE_URI"]) as conn, conn.cursor() as curs:
             redirected_mbids, redirect_index, _ = resolve_redirect_mbids(curs, "recording", mbids)
 
-        with psycopg2.connect(current_app.config["SQLALCHEMY_TIMESCALE_URI"]) as conn, conn.cursor() as curs:
+        with raw_connection(timescale.engine) as conn, conn.cursor() as curs:
             canonical_mbids, canonical_index, _ = resolve_canonical_mbids(curs, redirected_mbids)
             metadata = self.fetch_metadata_from_mbids(curs, canonical_mbids)
 
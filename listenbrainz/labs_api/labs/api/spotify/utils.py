@@ -3,10 +3,11 @@ from enum import Enum
 
 import psycopg2
 
-from flask import current_app
 from unidecode import unidecode
 from psycopg2.extras import execute_values
 from psycopg2.sql import SQL, Identifier
+from listenbrainz.db import timescale
+from listenbrainz.db.pool import raw_connection
 
 
 class LookupType(Enum):
@@ -34,7 +35,7 @@ def query_combined_lookup(column: LookupType, lookups: list[tuple]):
       GROUP BY {column}, idx      
     """).format(column=Identifier(column.value))
 
-    with psycopg2.connect(current_app.config["SQLALCHEMY_TIMESCALE_URI"]) as conn, conn.cursor() as curs:
+    with raw_connection(timescale.engine) as conn, conn.cursor() as curs:
         execute_values(curs, query, lookups, page_size=len(lookups))
         result = curs.fetchall()
         return {row[0]: row[1] for row in result}
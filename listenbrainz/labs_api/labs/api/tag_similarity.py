@@ -1,12 +1,13 @@
 from operator import itemgetter
 
-from flask import current_app
 import psycopg2
 import psycopg2.extras
 from werkzeug.exceptions import BadRequest
 
 from datasethoster import Query
 from listenbrainz.labs_api.labs.api.popular_tags import POPULAR_TAGS
+from listenbrainz.db import timescale
+from listenbrainz.db.pool import raw_connection
 
 
 class TagSimilarityQuery(Query):
@@ -26,7 +27,7 @@ class TagSimilarityQuery(Query):
     def fetch(self, params, offset=0, count=50):
 
         tag = params[0]['tag']
-        with psycopg2.connect(current_app.config["SQLALCHEMY_TIMESCALE_URI"]) as conn:
+        with raw_connection(timescale.engine) as conn:
             with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as curs:
 
                 curs.execute(
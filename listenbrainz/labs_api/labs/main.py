@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import psycopg2.extras
+from brainzutils import cache, metrics
 from datasethoster.main import create_app, init_sentry, register_query
 from listenbrainz.labs_api.labs.api.artist_country_from_artist_mbid import ArtistCountryFromArtistMBIDQuery
 from listenbrainz.labs_api.labs.api.artist_credit_from_artist_mbid import ArtistCreditIdFromArtistMBIDQuery
@@ -13,6 +14,7 @@ from listenbrainz.labs_api.labs.api.recording_search import RecordingSearchQuery
 from listenbrainz.labs_api.labs.api.artist_credit_recording_lookup import ArtistCreditRecordingLookupQuery
 from listenbrainz.labs_api.labs.api.similar_artists import SimilarArtistsViewerQuery
 from listenbrainz.labs_api.labs.api.similar_recordings import SimilarRecordingsViewerQuery
+from listenbrainz.labs_api.labs.api.similar_embeddings import SimilarEmbeddingsQuery
 from listenbrainz.labs_api.labs.api.spotify.spotify_mbid_lookup import SpotifyIdFromMBIDQuery
 from listenbrainz.labs_api.labs.api.spotify.spotify_metadata_lookup import SpotifyIdFromMetadataQuery
 from listenbrainz.labs_api.labs.api.user_listen_sessions import UserListensSessionQuery
@@ -21,6 +23,7 @@ from listenbrainz.labs_api.labs.api.bulk_tag_lookup import BulkTagLookup
 from listenbrainz.webserver import load_config
 from listenbrainz import db
 from listenbrainz.db import timescale as ts
+from listenbrainz.db.pool import get_pool_options
 
 register_query(ArtistCountryFromArtistMBIDQuery())
 register_query(ArtistCreditIdFromArtistMBIDQuery())
@@ -36,12 +39,18 @@ register_query(SpotifyIdFromMBIDQuery())
 register_query(UserListensSessionQuery())
 register_query(SimilarRecordingsViewerQuery())
 register_query(SimilarArtistsViewerQuery())
+register_query(SimilarEmbeddingsQuery("recording"))
+register_query(SimilarEmbeddingsQuery("artist"))
 register_query(TagSimilarityQuery())
 register_query(BulkTagLookup())
 
 app = create_app()
 load_config(app)
 init_sentry(app, "DATASETS_SENTRY_DSN")
-db.init_db_connection(app.config['SQLALCHEMY_DATABASE_URI'])
-ts.init_db_connection(app.config['SQLALCHEMY_TIMESCALE_URI'])
+# used to submit the connection pool metrics
+cache.init(host=app.config['REDIS_HOST'], port=app.config['REDIS_PORT'], namespace=app.config['REDIS_NAMESPACE'])
+metrics.init("listenbrainz")
+pool_options = get_pool_options(app.config)
+db.init_db_connection(app.config['SQLALCHEMY_DATABASE_URI'], pool_options)
+ts.init_db_connection(app.config['SQLALCHEMY_TIMESCALE_URI'], pool_options)
 psycopg2.extras.register_uuid()
@@ -99,7 +99,7 @@ class MainTestCase(flask_testing.TestCase):
                                        'artist_credit_name', 'release_name', 'recording_name',
                                        'artist_credit_id', 'artist_mbids', 'release_mbid', 'recording_mbid'])
 
-    @patch('psycopg2.connect')
+    @patch('listenbrainz.labs_api.labs.api.recording_lookup_base.raw_connection')
     def test_fetch(self, mock_connect):
         mock_connect().__enter__().cursor().__enter__().fetchone.side_effect = [
             db_response[0], db_response[1], None]
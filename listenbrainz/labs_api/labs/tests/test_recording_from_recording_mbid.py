@@ -238,8 +238,9 @@ class MainTestCase(flask_testing.TestCase):
             'recording_mbid', 'recording_name', 'length', 'artist_credit_id', 'artist_credit_name',
             '[artist_credit_mbids]', 'canonical_recording_mbid', 'original_recording_mbid', 'release_name', 'release_mbid'])
 
+    @patch('listenbrainz.labs_api.labs.api.recording_from_recording_mbid.raw_connection')
     @patch('psycopg2.connect')
-    def test_fetch(self, mock_connect):
+    def test_fetch(self, mock_connect, mock_raw_connection):
         q = RecordingFromRecordingMBIDQuery()
         resp = q.fetch(json_request)
         print(resp)
@@ -249,15 +250,17 @@ class MainTestCase(flask_testing.TestCase):
         self.assertDictEqual(resp[2], json_response[2])
         self.assertDictEqual(resp[3], json_response[3])
 
+    @patch('listenbrainz.labs_api.labs.api.recording_from_recording_mbid.raw_connection')
     @patch('psycopg2.connect')
-    def test_count(self, mock_connect):
+    def test_count(self, mock_connect, mock_raw_connection):
         q = RecordingFromRecordingMBIDQuery()
         resp = q.fetch(json_request, count=1)
         self.assertEqual(len(resp), 1)
         self.assertDictEqual(resp[0], json_response[0])
 
+    @patch('listenbrainz.labs_api.labs.api.recording_from_recording_mbid.raw_connection')
     @patch('psycopg2.connect')
-    def test_offset(self, mock_connect):
+    def test_offset(self, mock_connect, mock_raw_connection):
         q = RecordingFromRecordingMBIDQuery()
         resp = q.fetch(json_request, offset=1)
         self.assertEqual(len(resp), 3)
@@ -265,8 +268,9 @@ class MainTestCase(flask_testing.TestCase):
         self.assertDictEqual(resp[1], json_response[2])
         self.assertDictEqual(resp[2], json_response[3])
 
+    @patch('listenbrainz.labs_api.labs.api.recording_from_recording_mbid.raw_connection')
     @patch('psycopg2.connect')
-    def test_count_and_offset(self, mock_connect):
+    def test_count_and_offset(self, mock_connect, mock_raw_connection):
         q = RecordingFromRecordingMBIDQuery()
         resp = q.fetch(json_request, count=1, offset=1)
         self.assertEqual(len(resp), 1)
@@ -57,7 +57,7 @@ class MainTestCase(flask_testing.TestCase):
         self.assertEqual(q.inputs(), ['tag'])
         self.assertEqual(q.outputs(), ['similar_tag', 'count'])
 
-    @patch('psycopg2.connect')
+    @patch('listenbrainz.labs_api.labs.api.tag_similarity.raw_connection')
     def test_fetch(self, mock_connect):
         mock_connect().__enter__().cursor().__enter__().fetchone.side_effect = [db_response[0], db_response[1], None]
         q = TagSimilarityQuery()
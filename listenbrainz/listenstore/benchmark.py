@@ -0,0 +1,135 @@
+""" Benchmarks for the listenstore, these run against the configured timescale database using synthetic
+listens for a user id which should not be used by a real user. All the data created is deleted afterwards. """
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import text
+
+from listenbrainz.db import timescale
+from listenbrainz.listen import Listen
+from listenbrainz.listenstore.timescale_listenstore import RECENT_LISTENS_USER_CHUNK_SIZE
+
+BENCHMARK_START_TIME = datetime(2010, 1, 1)
+
+# the number of times each fetch is repeated, the median time is reported
+BENCHMARK_FETCH_REPEAT = 5
+
+
+def generate_listens(user_id: int, count: int, start: datetime = BENCHMARK_START_TIME) -> list[Listen]:
+    """ Generate count unique listens, one per second starting at start, for the given user. """
+    return [
+        Listen(
+            user_id=user_id,
+            user_name="benchmark",
+            timestamp=start + timedelta(seconds=i),
+            recording_msid=str(uuid.uuid4()),
+            data={
+                "artist_name": f"Benchmark Artist {i % 1000}",
+                "track_name": f"Benchmark Track {i}",
+                "release_name": f"Benchmark Release {i % 100}",
+                "additional_info": {
+                    "submission_client": "benchmark",
+                    "duration_ms": 180000 + i % 60000,
+                    "tracknumber": i % 20
+                },
+            },
+        )
+        for i in range(count)
+    ]
+
+
+def delete_benchmark_data(user_ids: list[int]):
+    with timescale.engine.begin() as connection:
+        connection.execute(text("DELETE FROM listen WHERE user_id = ANY(:user_ids)"), {"user_ids": user_ids})
+        connection.execute(text("DELETE FROM listen_user_metadata WHERE user_id = ANY(:user_ids)"),
+                           {"user_ids": user_ids})
+
+
+def benchmark_insert(ls, count: int, batch_size: int, user_id: int) -> dict[str, float]:
+    """ Compare the multi-row INSERT and the binary COPY insert paths of the TimescaleListenStore.
+
+    Each path inserts the same number of distinct listens in batches of batch_size for its own user id
+    (user_id and user_id + 1) and then re-inserts the first batch to measure the duplicate handling.
+
+    Returns:
+        a dict of the listens inserted per second by each path
+    """
+    paths = [("values", ls.insert_values, user_id), ("copy", ls.insert_copy, user_id + 1)]
+    delete_benchmark_data([user_id, user_id + 1])
+
+    results = {}
+    try:
+        for name, insert, path_user_id in paths:
+            listens = generate_listens(path_user_id, count)
+            batches = [listens[i:i + batch_size] for i in range(0, count, batch_size)]
+
+            t0 = time.monotonic()
+            inserted = 0
+            for batch in batches:
+                inserted += len(insert(batch))
+            elapsed = time.monotonic() - t0
+
+            t0 = time.monotonic()
+            duplicates_inserted = len(insert(batches[0]))
+            duplicate_elapsed = time.monotonic() - t0
+
+            if inserted != count or duplicates_inserted != 0:
+                raise RuntimeError(f"{name}: inserted {inserted} of {count} listens and {duplicates_inserted} duplicates")
+
+            results[name] = count / elapsed
+            current_app.logger.info("%s: inserted %d listens in %.2fs (%.0f listens/s), duplicate batch of %d in %.2fs",
+                                    name, count, elapsed, count / elapsed, len(batches[0]), duplicate_elapsed)
+    finally:
+        delete_benchmark_data([user_id, user_id + 1])
+
+    return results
+
+
+def benchmark_recent_listens(ls, follow_counts: list[int], listens_per_user: int, user_id: int,
+                             per_user_limit: int = 2, limit: int = 50) -> dict[int, dict[str, float]]:
+    """ Measure fetch_recent_listens_for_users for feeds following different numbers of users.
+
+    max(follow_counts) synthetic users are created with the ids user_id, user_id - 1 and so on. Their listen
+    counts are skewed, the first user has listens_per_user listens and user i has about listens_per_user / i,
+    spread over the 30 days before now. Each follow count is fetched with the users in a single query and
+    with the users split into chunks of the default size.
+
+    Returns:
+        a dict of the median fetch time in seconds of each path for each follow count
+    """
+    user_count = max(follow_counts)
+    users = [{"id": user_id - i, "musicbrainz_id": f"benchmark_{i}"} for i in range(user_count)]
+    user_ids = [user["id"] for user in users]
+    delete_benchmark_data(user_ids)
+
+    results = {}
+    try:
+        window_start = datetime.utcnow() - timedelta(days=30)
+        for i, user in enumerate(users):
+            count = max(1, listens_per_user // (i + 1))
+            start = window_start + timedelta(seconds=(i * 7919) % (29 * 86400))
+            listens = generate_listens(user["id"], count, start)
+            ls.insert_copy(listens)
+
+        paths = [("single", user_count), ("chunked", RECENT_LISTENS_USER_CHUNK_SIZE)]
+        for follow_count in follow_counts:
+            followed = users[:follow_count]
+            results[follow_count] = {}
+            for name, user_chunk_size in paths:
+                timings = []
+                for _ in range(BENCHMARK_FETCH_REPEAT):
+                    t0 = time.monotonic()
+                    listens = ls.fetch_recent_listens_for_users(followed, per_user_limit=per_user_limit, limit=limit,
+                                                                user_chunk_size=user_chunk_size)
+                    timings.append(time.monotonic() - t0)
+                elapsed = statistics.median(timings)
+                results[follow_count][name] = elapsed
+                current_app.logger.info("%s: fetched %d recent listens of %d users in %.3fs",
+                                        name, len(listens), follow_count, elapsed)
+    finally:
+        delete_benchmark_data(user_ids)
+
+    return results
@@ -1,15 +1,17 @@
+import multiprocessing
 import os
 import shutil
 import subprocess
 import tarfile
 import time
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterator, Optional
 
-import pandas as pd
 import psycopg2
 import psycopg2.sql
 import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 import sqlalchemy
 import tempfile
@@ -25,12 +27,12 @@ from listenbrainz.listenstore import LISTENS_DUMP_SCHEMA_VERSION
 from listenbrainz.listenstore.timescale_listenstore import DATA_START_YEAR_IN_SECONDS
 from listenbrainz.utils import create_path
 
-# These values are defined to create spark parquet files that are at most 128MB in size.
-# This compression ration allows us to roughly estimate how full we can make files before starting a new one
-PARQUET_APPROX_COMPRESSION_RATIO = .57
+# Spark parquet files are closed once the bytes written to them reach this size, so files end up
+# at most one row group larger than 128MB.
+PARQUET_TARGET_SIZE = 134217728  # 128MB
 
-# This is the approximate amount of data to write to a parquet file in order to meet the max size
-PARQUET_TARGET_SIZE = 134217728 / PARQUET_APPROX_COMPRESSION_RATIO  # 128MB / compression ratio
+# Number of rows fetched from the server side cursor at a time, each batch of rows is written as one row group.
+PARQUET_FETCH_BATCH_SIZE = 100000
 
 
 SPARK_LISTENS_SCHEMA = pa.schema([
@@ -294,6 +296,36 @@ class DumpListenStore:
         self.log.info('Dump present at %s!', archive_path)
         return archive_path
 
+    @staticmethod
+    def _build_spark_listens_batch(rows: list[tuple]) -> pa.RecordBatch:
+        """ Convert rows returned by the spark listens dump query into a record batch in SPARK_LISTENS_SCHEMA.
+
+        For each listen either all of the original listen metadata or all of the mapping metadata is used,
+        depending on whether the listen has been mapped to an artist credit.
+        """
+        (listened_at, user_id, recording_msid, l_artist_credit_mbids, l_artist_name, l_release_name,
+         l_release_mbid, l_recording_name, l_recording_mbid, m_recording_mbid, artist_credit_id,
+         m_artist_credit_mbids, m_artist_name, m_release_mbid, m_release_name, m_recording_name) = zip(*rows)
+
+        artist_credit_id = pa.array(artist_credit_id, pa.int64())
+        is_mapped = pc.is_valid(artist_credit_id)
+
+        def choose(listen_values, mapping_values, data_type):
+            return pc.if_else(is_mapped, pa.array(mapping_values, data_type), pa.array(listen_values, data_type))
+
+        return pa.RecordBatch.from_arrays([
+            pa.array(listened_at, pa.timestamp("ms")),
+            pa.array(user_id, pa.int64()),
+            pa.array(recording_msid, pa.string()),
+            choose(l_artist_name, m_artist_name, pa.string()),
+            artist_credit_id,
+            choose(l_release_name, m_release_name, pa.string()),
+            choose(l_release_mbid, m_release_mbid, pa.string()),
+            choose(l_recording_name, m_recording_name, pa.string()),
+            choose(l_recording_mbid, m_recording_mbid, pa.string()),
+            choose(l_artist_credit_mbids, m_artist_credit_mbids, pa.list_(pa.string())),
+        ], schema=SPARK_LISTENS_SCHEMA)
+
     def write_parquet_files(self,
                             archive_dir,
                             temp_dir,
@@ -319,6 +351,36 @@ class DumpListenStore:
             the next parquet_file_id to use.
 
         """
+        def add_to_archive(filename):
+            nonlocal parquet_file_id
+            tar_file.add(filename, arcname=os.path.join(archive_dir, "%d.parquet" % parquet_file_id))
+            os.unlink(filename)
+            parquet_file_id += 1
+
+        self.write_parquet_slice(temp_dir, dump_type, start_time, end_time, add_to_archive)
+        return parquet_file_id
+
+    def write_parquet_slice(self,
+                            temp_dir,
+                            dump_type,
+                            start_time: datetime,
+                            end_time: datetime,
+                            on_file_written: Optional[Callable[[str], None]] = None) -> list[str]:
+        """
+            Write the listens in the given time range to parquet files named 0.parquet, 1.parquet, ...
+            in temp_dir.
+
+        Args:
+            temp_dir: the directory where the parquet files should be written
+            dump_type: type of dump, full or incremental
+            start_time: the start of the time range for which listens should be dumped
+            end_time: the end of the time range for which listens should be dumped
+            on_file_written: if specified, called with the path of each parquet file once it is complete.
+                the callback may move or delete the file.
+
+        Returns:
+            the paths of the parquet files written, in order
+        """
         # the spark listens dump is sorted using this column. full dumps are sorted on
         # listened_at because so during loading listens in spark for stats calculation
         # we can load a subset of files. however, sorting on listened_at creates the
@@ -386,86 +448,89 @@ class DumpListenStore:
                 """).format(criteria=psycopg2.sql.Identifier("l", criteria))  # l is the listen table's alias
 
         listen_count = 0
-        current_listened_at = None
         conn = timescale.engine.raw_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as curs:
-            curs.execute(query, args)
-            while True:
+        try:
+            # a named cursor is a server side cursor so rows are streamed in batches instead of loading the
+            # whole result set in memory
+            with conn.cursor(name="spark_listens_dump") as curs:
+                curs.itersize = PARQUET_FETCH_BATCH_SIZE
+                curs.execute(query, args)
+
+                writer, sink, filename = None, None, None
+                files = []
                 t0 = time.monotonic()
                 written = 0
-                approx_size = 0
-                data = {
-                    'listened_at': [],
-                    'user_id': [],
-                    'recording_msid': [],
-                    'artist_name': [],
-                    'artist_credit_id': [],
-                    'release_name': [],
-                    'release_mbid': [],
-                    'recording_name': [],
-                    'recording_mbid': [],
-                    'artist_credit_mbids': []
-                }
                 while True:
-                    result = curs.fetchone()
-                    if not result:
-                        break
-
-                    # Either take the original listen metadata or the mapping metadata
-                    if result["artist_credit_id"] is None:
-                        data["artist_name"].append(result["l_artist_name"])
-                        data["release_name"].append(result["l_release_name"])
-                        data["recording_name"].append(result["l_recording_name"])
-                        data["artist_credit_id"].append(None)
-                        data["artist_credit_mbids"].append(result["l_artist_credit_mbids"])
-                        data["release_mbid"].append(result["l_release_mbid"])
-                        data["recording_mbid"].append(result["l_recording_mbid"])
-                        approx_size += len(result["l_artist_name"]) + len(result["l_recording_name"]) \
-                            + len(result["l_release_name"] or "0") + len(result["l_recording_mbid"] or "0") \
-                            + len(result["l_release_mbid"] or "0") + len(str(result["l_artist_credit_mbids"] or 0))
-                    else:
-                        data["artist_name"].append(result["m_artist_name"])
-                        data["release_name"].append(result["m_release_name"])
-                        data["recording_name"].append(result["m_recording_name"])
-                        data["artist_credit_id"].append(result["artist_credit_id"])
-                        data["artist_credit_mbids"].append(result["m_artist_credit_mbids"])
-                        data["release_mbid"].append(result["m_release_mbid"])
-                        data["recording_mbid"].append(result["m_recording_mbid"])
-                        approx_size += len(result["m_artist_name"]) + len(result["m_recording_name"]) \
-                            + len(result["m_release_name"] or "0") + len(result["m_recording_mbid"] or "0") \
-                            + len(result["m_release_mbid"] or "0") + len(str(result["m_artist_credit_mbids"] or 0)) \
-                            + len(str(result["artist_credit_id"]))
-
-                    current_listened_at = result["listened_at"]
-                    data["listened_at"].append(current_listened_at)
-                    data["user_id"].append(result["user_id"])
-                    data["recording_msid"].append(result["recording_msid"])
-                    approx_size += len(str(result["listened_at"])) + len(str(result["user_id"])) \
-                                   + len(result["recording_msid"])
-
-                    written += 1
-                    listen_count += 1
-                    if approx_size > PARQUET_TARGET_SIZE:
+                    rows = curs.fetchmany(PARQUET_FETCH_BATCH_SIZE)
+                    if rows:
+                        if writer is None:
+                            filename = os.path.join(temp_dir, "%d.parquet" % len(files))
+                            sink = pa.OSFile(filename, "wb")
+                            writer = pq.ParquetWriter(sink, SPARK_LISTENS_SCHEMA, flavor="spark")
+                            t0 = time.monotonic()
+                            written = 0
+
+                        batch = self._build_spark_listens_batch(rows)
+                        writer.write_batch(batch)
+                        written += len(rows)
+                        listen_count += len(rows)
+                        current_listened_at = rows[-1][0]
+
+                    if writer is not None and (not rows or sink.tell() >= PARQUET_TARGET_SIZE):
+                        writer.close()
+                        sink.close()
+                        file_size = os.path.getsize(filename)
+                        files.append(filename)
+                        writer = None
+                        if on_file_written:
+                            on_file_written(filename)
+
+                        self.log.info("%d listens dumped for %s at %.2f listens/s (%sMB)",
+                                      listen_count, current_listened_at.strftime("%Y-%m-%d"),
+                                      written / (time.monotonic() - t0),
+                                      str(round(file_size / (1024 * 1024), 3)))
+
+                    if not rows:
                         break
+        finally:
+            conn.close()
 
-                if written == 0:
-                    break
+        return files
 
-                filename = os.path.join(temp_dir, "%d.parquet" % parquet_file_id)
+    def write_parquet_files_parallel(self, archive_dir, temp_dir, tar_file, dump_type,
+                                     start_time: datetime, end_time: datetime, workers: int):
+        """ Write the listens in the given time range to parquet files using a pool of processes, each
+         process writes the files of one monthly slice of the time range at a time.
 
-                # Create a pandas dataframe, then write that to a parquet files
-                df = pd.DataFrame(data, dtype=object)
-                table = pa.Table.from_pandas(df, schema=SPARK_LISTENS_SCHEMA, preserve_index=False)
-                pq.write_table(table, filename, flavor="spark")
-                file_size = os.path.getsize(filename)
-                tar_file.add(filename, arcname=os.path.join(archive_dir, "%d.parquet" % parquet_file_id))
-                os.unlink(filename)
-                parquet_file_id += 1
+        Args:
+            archive_dir: the directory where the listens dump archive should be created
+            temp_dir: the directory where tmp files should be written
+            tar_file: the tarfile object that the dumps are being written to
+            dump_type: type of dump, full or incremental
+            start_time: the start of the time range for which listens should be dumped
+            end_time: the end of the time range for which listens should be dumped
+            workers: the number of processes to use
 
-                self.log.info("%d listens dumped for %s at %.2f listens/s (%sMB)",
-                              listen_count, current_listened_at.strftime("%Y-%m-%d"),
-                              written / (time.monotonic() - t0),
-                              str(round(file_size / (1024 * 1024), 3)))
+        Returns:
+            the number of parquet files written
+        """
+        tasks = []
+        for idx, (start, end) in enumerate(get_monthly_slices(start_time, end_time)):
+            slice_dir = os.path.join(temp_dir, "slice-%d" % idx)
+            create_path(slice_dir)
+            tasks.append((self, slice_dir, dump_type, start, end))
+
+        parquet_file_id = 0
+        # fork so that the workers inherit the initialized timescale engine. if the engine pools connections,
+        # the children drop the inherited ones after the fork (see listenbrainz.db.pool)
+        with multiprocessing.get_context("fork").Pool(workers) as pool:
+            # imap yields the results in order of the slices, so the files can be numbered and added to the
+            # archive as soon as all earlier slices are done while later slices are still being written
+            for files in pool.imap(_write_parquet_slice, tasks):
+                for filename in files:
+                    tar_file.add(filename, arcname=os.path.join(archive_dir, "%d.parquet" % parquet_file_id))
+                    os.unlink(filename)
+                    parquet_file_id += 1
 
         return parquet_file_id
 
@@ -473,12 +538,17 @@ class DumpListenStore:
                                dump_id: int,
                                dump_type: str,
                                start_time: datetime = datetime.utcfromtimestamp(DATA_START_YEAR_IN_SECONDS),
-                               end_time: datetime = None):
+                               end_time: datetime = None,
+                               workers: int = 1):
         """ Dumps all listens in the ListenStore into spark parquet files in a .tar archive.
 
         Listens are dumped into files ideally no larger than 128MB, sorted from oldest to newest. Files
         are named #####.parguet with monotonically increasing integers starting with 0.
 
+        If more than one worker is requested, the time range is split into monthly slices which are
+        written in parallel by a pool of processes. The files of each slice are added to the archive in
+        order of the slices, so the file numbering and ordering is the same as with a single worker.
+
         This creates an incremental dump if start_time is specified (with range start_time to end_time),
         otherwise it creates a full dump with all listens.
 
@@ -489,6 +559,7 @@ class DumpListenStore:
             start_time: the start of the time range for which listens should be dumped. defaults to
                 utc 0 (meaning a full dump)
             end_time: the end of time range for which listens should be dumped. defaults to the current time
+            workers: the number of processes to use to fetch listens and write parquet files
 
         Returns:
             the path to the dump archive
@@ -515,31 +586,62 @@ class DumpListenStore:
             create_path(temp_dir)
             self.write_dump_metadata(archive_name, start_time, end_time, temp_dir, tar, full_dump)
 
-            for year in range(start_time.year, end_time.year + 1):
-                if year == start_time.year:
-                    start = start_time
-                else:
-                    start = datetime(year=year, day=1, month=1)
-                if year == end_time.year:
-                    end = end_time
-                else:
-                    end = datetime(year=year + 1, day=1, month=1)
-
-                self.log.info(
-                    "dump %s to %s" % (start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S")))
-
-                # This try block is here in an effort to expose bugs that occur during testing
-                # Without it sometimes test pass and sometimes they give totally unrelated errors.
-                # Keeping this block should help with future testing...
-                try:
-                    parquet_index = self.write_parquet_files(archive_name, temp_dir, tar, dump_type,
-                                                             start, end, parquet_index)
-                except Exception as err:
-                    self.log.exception("likely test failure: " + str(err))
-                    raise
+            if workers > 1:
+                parquet_index = self.write_parquet_files_parallel(archive_name, temp_dir, tar, dump_type,
+                                                                  start_time, end_time, workers)
+            else:
+                for year in range(start_time.year, end_time.year + 1):
+                    if year == start_time.year:
+                        start = start_time
+                    else:
+                        start = datetime(year=year, day=1, month=1)
+                    if year == end_time.year:
+                        end = end_time
+                    else:
+                        end = datetime(year=year + 1, day=1, month=1)
+
+                    self.log.info(
+                        "dump %s to %s" % (start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S")))
+
+                    # This try block is here in an effort to expose bugs that occur during testing
+                    # Without it sometimes test pass and sometimes they give totally unrelated errors.
+                    # Keeping this block should help with future testing...
+                    try:
+                        parquet_index = self.write_parquet_files(archive_name, temp_dir, tar, dump_type,
+                                                                 start, end, parquet_index)
+                    except Exception as err:
+                        self.log.exception("likely test failure: " + str(err))
+                        raise
 
             shutil.rmtree(temp_dir)
 
         self.log.info('ListenBrainz spark listen dump done!')
         self.log.info('Dump present at %s!', archive_path)
         return archive_path
+
+
+def get_monthly_slices(start_time: datetime, end_time: datetime) -> Iterator[tuple[datetime, datetime]]:
+    """ Split the time range into consecutive slices which end at the start of each month. The slices
+     are disjoint when used with an exclusive start and an inclusive end, like the spark dump query does.
+     Timezone aware datetimes are converted to naive UTC datetimes so that they can be compared. """
+    if start_time.tzinfo is not None:
+        start_time = start_time.astimezone(timezone.utc).replace(tzinfo=None)
+    if end_time.tzinfo is not None:
+        end_time = end_time.astimezone(timezone.utc).replace(tzinfo=None)
+
+    slice_start = start_time
+    while slice_start < end_time:
+        if slice_start.month == 12:
+            next_month = datetime(slice_start.year + 1, 1, 1)
+        else:
+            next_month = datetime(slice_start.year, slice_start.month + 1, 1)
+        slice_end = min(next_month, end_time)
+        yield slice_start, slice_end
+        slice_start = slice_end
+
+
+def _write_parquet_slice(task) -> list[str]:
+    """ Entry point for the workers of DumpListenStore.write_parquet_files_parallel """
+    ls, slice_dir, dump_type, start, end = task
+    ls.log.info("dump %s to %s" % (start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S")))
+    return ls.write_parquet_slice(slice_dir, dump_type, start, end)
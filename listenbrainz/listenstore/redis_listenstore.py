@@ -1,5 +1,7 @@
+import time
+import uuid
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Iterable
 
 import redis
 import orjson
@@ -12,6 +14,16 @@ class RedisListenStore:
 
     RECENT_LISTENS_KEY = "rl-"
     RECENT_LISTENS_MAX = 100
+    USER_RECENT_LISTENS_KEY = "rl-user-"
+    USER_RECENT_LISTENS_TIMESTAMPS_KEY = "rl-user-ts-"
+    USER_RECENT_LISTENS_VERSION_KEY = "rl-user-version-"
+    USER_RECENT_LISTENS_MAX = 100
+    USER_RECENT_LISTENS_EXPIRY = 300  # 5 minutes in seconds
+    FEED_TIMELINE_KEY = "feed-tl-"
+    FEED_TIMELINE_SINCE_KEY = "feed-tl-since-"
+    FEED_TIMELINE_MAX = 1000
+    FEED_TIMELINE_EXPIRY = 7 * 24 * 60 * 60  # 7 days in seconds
+    FEED_FANOUT_SKIPPED_KEY = "feed-fanout-skipped"
     PLAYING_NOW_KEY = "pn."
     LISTEN_COUNT_PER_DAY_EXPIRY_TIME = 3 * 24 * 60 * 60  # 3 days in seconds
     LISTEN_COUNT_PER_DAY_KEY = "lc-day-"
@@ -82,6 +94,193 @@ class RedisListenStore:
 
         return recent
 
+    def get_recent_listens_for_user(self, user_id: int, count: int) -> Optional[tuple[list[dict], int, int]]:
+        """ Get the count latest listens of the user from the per-user recent listens cache.
+
+            Args:
+                user_id: the row id of the user
+                count: the number of listens to return, at most USER_RECENT_LISTENS_MAX
+
+            Returns:
+                a tuple of (listens in the api format, oldest listen ts, latest listen ts) or None if the
+                listens of the user are not cached
+        """
+        if count <= 0 or count > self.USER_RECENT_LISTENS_MAX:
+            return None
+
+        pipe = cache._r.pipeline(transaction=False)
+        pipe.get(cache._prep_key(self.USER_RECENT_LISTENS_TIMESTAMPS_KEY + str(user_id)))
+        pipe.zrevrange(cache._prep_key(self.USER_RECENT_LISTENS_KEY + str(user_id)), 0, count - 1)
+        timestamps, listens = pipe.execute()
+        if timestamps is None:
+            return None
+
+        min_ts, max_ts = orjson.loads(timestamps)
+        # the keys expire together but not atomically, a user with listens should always have cached listens
+        if not listens and max_ts != 0:
+            return None
+
+        return [orjson.loads(listen) for listen in listens], min_ts, max_ts
+
+    def get_recent_listens_version(self, user_id: int) -> Optional[bytes]:
+        """ Get the version of the recent listens of the user, it changes whenever they are invalidated. Read
+         it before reading the listens from the listenstore and pass it to put_recent_listens_for_user. """
+        return cache._r.get(cache._prep_key(self.USER_RECENT_LISTENS_VERSION_KEY + str(user_id)))
+
+    def put_recent_listens_for_user(self, user_id: int, listens: list[dict], min_ts: int, max_ts: int,
+                                    version: Optional[bytes]) -> bool:
+        """ Replace the cached recent listens of the user, unless they have been invalidated since the listens
+         were read from the listenstore. Otherwise listens inserted while reading would be missing from the
+         cache until it expires.
+
+            Args:
+                user_id: the row id of the user
+                listens: the latest USER_RECENT_LISTENS_MAX listens of the user (or all of them if the user has
+                    fewer listens) in the api format
+                min_ts: the oldest listen ts of the user
+                max_ts: the latest listen ts of the user
+                version: the value of get_recent_listens_version from before the listens were read
+
+            Returns:
+                whether the listens were cached
+        """
+        key = cache._prep_key(self.USER_RECENT_LISTENS_KEY + str(user_id))
+        version_key = cache._prep_key(self.USER_RECENT_LISTENS_VERSION_KEY + str(user_id))
+        with cache._r.pipeline() as pipe:
+            try:
+                pipe.watch(version_key)
+                if pipe.get(version_key) != version:
+                    return False
+                pipe.multi()
+                pipe.delete(key)
+                if listens:
+                    pipe.zadd(key, {orjson.dumps(listen): listen["listened_at"] for listen in listens})
+                    pipe.expire(key, self.USER_RECENT_LISTENS_EXPIRY)
+                pipe.set(
+                    cache._prep_key(self.USER_RECENT_LISTENS_TIMESTAMPS_KEY + str(user_id)),
+                    orjson.dumps([min_ts, max_ts]),
+                    ex=self.USER_RECENT_LISTENS_EXPIRY
+                )
+                pipe.execute()
+            except redis.WatchError:
+                # invalidated between the version check and the write
+                return False
+        return True
+
+    def invalidate_recent_listens_for_users(self, user_ids: Iterable[int]):
+        """ Drop the cached recent listens of the given users, should be called whenever their listens
+         or the mappings of their listens change.
+
+         The version of the cached listens of each user is set to a new random value so that listens read
+         before the invalidation are not cached. The version outlives the cached listens, so it can't
+         expire while a reader is still holding the old value.
+        """
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+        pipe = cache._r.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.delete(
+                cache._prep_key(self.USER_RECENT_LISTENS_KEY + str(user_id)),
+                cache._prep_key(self.USER_RECENT_LISTENS_TIMESTAMPS_KEY + str(user_id))
+            )
+            pipe.set(
+                cache._prep_key(self.USER_RECENT_LISTENS_VERSION_KEY + str(user_id)),
+                uuid.uuid4().hex,
+                ex=2 * self.USER_RECENT_LISTENS_EXPIRY
+            )
+        pipe.execute()
+
+    def add_to_feed_timelines(self, timelines: dict[int, list[tuple[int, int, str]]]):
+        """ Append listen references to the feed timelines of users, keeping the latest FEED_TIMELINE_MAX
+         of each timeline.
+
+            Args:
+                timelines: a dict of the row id of the follower to the (user id, listened_at, recording_msid)
+                    of the new listens of the users they follow
+        """
+        now = int(time.time())
+        pipe = cache._r.pipeline(transaction=False)
+        for follower_id, refs in timelines.items():
+            key = cache._prep_key(self.FEED_TIMELINE_KEY + str(follower_id))
+            since_key = cache._prep_key(self.FEED_TIMELINE_SINCE_KEY + str(follower_id))
+            # the time from which on the timeline contains all the new listens, only set when the timeline is created
+            pipe.set(since_key, now, nx=True)
+            pipe.zadd(key, {f"{user_id}:{listened_at}:{recording_msid}": listened_at
+                            for user_id, listened_at, recording_msid in refs})
+            pipe.zremrangebyrank(key, 0, -self.FEED_TIMELINE_MAX - 1)
+            pipe.expire(key, self.FEED_TIMELINE_EXPIRY)
+            pipe.expire(since_key, self.FEED_TIMELINE_EXPIRY)
+        pipe.execute()
+
+    def get_feed_timeline(self, user_id: int, min_ts: int, max_ts: int) -> Optional[tuple[list[tuple[int, int, str]], int]]:
+        """ Get the listen references in the feed timeline of the user with min_ts < listened_at < max_ts.
+
+            Returns:
+                a tuple of (the (user id, listened_at, recording_msid) of the listens ordered by listened_at
+                descending, the listened_at from which on the timeline is complete) or None if the user
+                doesn't have a timeline
+        """
+        key = cache._prep_key(self.FEED_TIMELINE_KEY + str(user_id))
+        pipe = cache._r.pipeline(transaction=False)
+        pipe.get(cache._prep_key(self.FEED_TIMELINE_SINCE_KEY + str(user_id)))
+        pipe.zcard(key)
+        pipe.zrange(key, 0, 0, withscores=True)
+        pipe.zrevrangebyscore(key, f"({max_ts}", f"({min_ts}")
+        since, size, oldest, refs = pipe.execute()
+        if since is None:
+            return None
+
+        # listens can't be submitted with a timestamp in the future, so a listen newer than since was
+        # inserted after the timeline was created. once the timeline is full, older listens have been trimmed.
+        complete_from = int(since) + 1
+        if size >= self.FEED_TIMELINE_MAX and oldest:
+            complete_from = max(complete_from, int(oldest[0][1]))
+
+        timeline = []
+        for ref in refs:
+            user_id, listened_at, recording_msid = ref.decode("utf-8").split(":")
+            timeline.append((int(user_id), int(listened_at), recording_msid))
+        return timeline, complete_from
+
+    def add_feed_fanout_skipped(self, skipped: dict[int, int]):
+        """ Record the latest listened_at of the listens of users which were not added to the feed timelines
+         because the users had too many followers.
+
+            Args:
+                skipped: a dict of the row id of the user to the latest listened_at of their skipped listens
+        """
+        if skipped:
+            # GT keeps the latest listened_at if an older listen is skipped later
+            cache._r.zadd(
+                cache._prep_key(self.FEED_FANOUT_SKIPPED_KEY),
+                {str(user_id): listened_at for user_id, listened_at in skipped.items()},
+                gt=True
+            )
+
+    def get_feed_fanout_skipped(self, user_ids: Iterable[int]) -> dict[int, int]:
+        """ Get the latest listened_at of the listens of the given users which were not added to the feed
+         timelines, users whose listens have never been skipped are omitted. """
+        user_ids = list(user_ids)
+        key = cache._prep_key(self.FEED_FANOUT_SKIPPED_KEY)
+        pipe = cache._r.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.zscore(key, str(user_id))
+        return {
+            user_id: int(listened_at)
+            for user_id, listened_at in zip(user_ids, pipe.execute())
+            if listened_at is not None
+        }
+
+    def invalidate_feed_timelines(self, user_ids: Iterable[int]):
+        """ Drop the feed timelines of the given users, should be called whenever the users they follow change. """
+        keys = []
+        for user_id in set(user_ids):
+            keys.append(cache._prep_key(self.FEED_TIMELINE_KEY + str(user_id)))
+            keys.append(cache._prep_key(self.FEED_TIMELINE_SINCE_KEY + str(user_id)))
+        if keys:
+            cache._r.delete(*keys)
+
     def increment_listen_count_for_day(self, day: datetime, count: int):
         """ Increment the number of listens submitted on the day `day`
         by `count`.
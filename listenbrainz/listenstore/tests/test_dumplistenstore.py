@@ -4,13 +4,14 @@ import tarfile
 import tempfile
 from datetime import datetime
 
+import pyarrow.parquet as pq
 from psycopg2.extras import execute_values
 
 import listenbrainz.db.user as db_user
 from listenbrainz.db import timescale
 from listenbrainz.db.dump import SchemaMismatchException
 from listenbrainz.listenstore import LISTENS_DUMP_SCHEMA_VERSION
-from listenbrainz.listenstore.dump_listenstore import DumpListenStore
+from listenbrainz.listenstore.dump_listenstore import DumpListenStore, get_monthly_slices
 from listenbrainz.listenstore.tests.util import create_test_data_for_timescalelistenstore, generate_data
 from listenbrainz.listenstore.timescale_utils import recalculate_all_user_data
 from listenbrainz.tests.integration import NonAPIIntegrationTestCase
@@ -127,6 +128,31 @@ class TestDumpListenStore(NonAPIIntegrationTestCase):
         self.assertEqual(listens[3].ts_since_epoch, base + 2)
         self.assertEqual(listens[4].ts_since_epoch, base + 1)
 
+    def test_import_listens_dump_parallel(self):
+        base = 1500000000
+        listens = generate_data(self.testuser_id, self.testuser_name, base + 1, 10)
+        self.ls.insert(listens)
+        temp_dir = tempfile.mkdtemp()
+        dump_location = self.dumpstore.dump_listens(
+            location=temp_dir,
+            dump_id=1,
+            end_time=datetime.utcfromtimestamp(base + 11)
+        )
+
+        self.reset_timescale_db()
+        imported = self.ls.import_listens_dump(dump_location, workers=2, defer_user_metadata=True)
+        self.assertEqual(imported, 10)
+
+        # listen_user_metadata is recalculated at the end of the import, so no explicit recalculate here
+        listens, min_ts, max_ts = self.ls.fetch_listens(user=self.testuser, to_ts=datetime.utcfromtimestamp(base + 11))
+        self.assertEqual(len(listens), 10)
+        self.assertEqual(listens[0].ts_since_epoch, base + 10)
+        self.assertEqual(listens[9].ts_since_epoch, base + 1)
+        self.assertEqual(min_ts, datetime.utcfromtimestamp(base + 1))
+        self.assertEqual(max_ts, datetime.utcfromtimestamp(base + 10))
+
+        shutil.rmtree(temp_dir)
+
     # tests test_full_dump_listen_with_no_created
     # and test_incremental_dumps_listen_with_no_created have been removed because
     # with timescale all the missing inserted timestamps will have been
@@ -240,3 +266,74 @@ class TestDumpListenStore(NonAPIIntegrationTestCase):
 
         with self.assertRaises(SchemaMismatchException):
             self.ls.import_listens_dump(archive_path)
+
+    def test_dump_listens_for_spark(self):
+        base = 1500000000
+        listens = generate_data(self.testuser_id, self.testuser_name, base + 1, 5)
+        self.ls.insert(listens)
+
+        temp_dir = tempfile.mkdtemp()
+        archive_path = self.dumpstore.dump_listens_for_spark(
+            location=temp_dir,
+            dump_id=1,
+            dump_type="full",
+            start_time=datetime.utcfromtimestamp(base),
+            end_time=datetime.utcfromtimestamp(base + 10)
+        )
+
+        with tarfile.open(archive_path, "r") as tar:
+            parquet_files = [member for member in tar.getmembers() if member.name.endswith(".parquet")]
+            self.assertEqual(len(parquet_files), 1)
+            self.assertTrue(parquet_files[0].name.endswith("/0.parquet"))
+            table = pq.read_table(tar.extractfile(parquet_files[0]))
+
+        self.assertEqual(table.num_rows, 5)
+        rows = sorted(table.to_pylist(), key=lambda r: r["listened_at"])
+        for listen, row in zip(listens, rows):
+            self.assertEqual(row["listened_at"], listen.timestamp)
+            self.assertEqual(row["user_id"], self.testuser_id)
+            self.assertEqual(row["recording_msid"], listen.recording_msid)
+            self.assertEqual(row["artist_name"], "Frank Ocean")
+            self.assertEqual(row["recording_name"], "Crack Rock")
+            self.assertIsNone(row["artist_credit_id"])
+
+        shutil.rmtree(temp_dir)
+
+    def test_dump_listens_for_spark_parallel(self):
+        # 5 listens each in March and April 2017
+        march = int(datetime(2017, 3, 10).timestamp())
+        april = int(datetime(2017, 4, 10).timestamp())
+        self.ls.insert(generate_data(self.testuser_id, self.testuser_name, march, 5))
+        self.ls.insert(generate_data(self.testuser_id, self.testuser_name, april, 5))
+
+        temp_dir = tempfile.mkdtemp()
+        archive_path = self.dumpstore.dump_listens_for_spark(
+            location=temp_dir,
+            dump_id=1,
+            dump_type="full",
+            start_time=datetime(2017, 2, 15),
+            end_time=datetime(2017, 5, 15),
+            workers=2
+        )
+
+        with tarfile.open(archive_path, "r") as tar:
+            parquet_files = [member for member in tar.getmembers() if member.name.endswith(".parquet")]
+            # february and may have no listens and don't produce any files
+            self.assertEqual([os.path.basename(member.name) for member in parquet_files], ["0.parquet", "1.parquet"])
+            first = pq.read_table(tar.extractfile(parquet_files[0])).to_pylist()
+            second = pq.read_table(tar.extractfile(parquet_files[1])).to_pylist()
+
+        self.assertEqual(len(first), 5)
+        self.assertEqual(len(second), 5)
+        self.assertTrue(all(row["listened_at"].month == 3 for row in first))
+        self.assertTrue(all(row["listened_at"].month == 4 for row in second))
+
+        shutil.rmtree(temp_dir)
+
+    def test_get_monthly_slices(self):
+        slices = list(get_monthly_slices(datetime(2020, 11, 15), datetime(2021, 1, 10)))
+        self.assertEqual(slices, [
+            (datetime(2020, 11, 15), datetime(2020, 12, 1)),
+            (datetime(2020, 12, 1), datetime(2021, 1, 1)),
+            (datetime(2021, 1, 1), datetime(2021, 1, 10)),
+        ])
@@ -84,6 +84,75 @@ class RedisListenStoreTestCase(DatabaseTestCase):
         for i, r in enumerate(recent):
             self.assertEqual(r.timestamp, listens[i].timestamp)
 
+    def test_put_get_and_invalidate_recent_listens_for_user(self):
+        user_id = self.testuser['id']
+        self.assertIsNone(self._redis.get_recent_listens_for_user(user_id, 10))
+
+        t = int(time.time())
+        listens = []
+        for i in range(RedisListenStore.USER_RECENT_LISTENS_MAX):
+            listen = Listen(user_id=user_id,
+                            user_name=self.testuser['musicbrainz_id'],
+                            timestamp=t - i,
+                            recording_msid=str(uuid.uuid4()),
+                            data={
+                                'artist_name': str(uuid.uuid4()),
+                                'track_name': str(uuid.uuid4()),
+                                'additional_info': {},
+                            })
+            listens.append(listen.to_api())
+        version = self._redis.get_recent_listens_version(user_id)
+        self.assertTrue(self._redis.put_recent_listens_for_user(user_id, listens, t - 1000, t, version))
+
+        recent, min_ts, max_ts = self._redis.get_recent_listens_for_user(user_id, 10)
+        self.assertEqual(recent, listens[:10])
+        self.assertEqual(min_ts, t - 1000)
+        self.assertEqual(max_ts, t)
+
+        # more listens than the cache holds can't be served from it, neither can zero listens
+        self.assertIsNone(self._redis.get_recent_listens_for_user(user_id, RedisListenStore.USER_RECENT_LISTENS_MAX + 1))
+        self.assertIsNone(self._redis.get_recent_listens_for_user(user_id, 0))
+
+        self._redis.invalidate_recent_listens_for_users([user_id])
+        self.assertIsNone(self._redis.get_recent_listens_for_user(user_id, 10))
+
+        # listens read before an invalidation are not cached
+        self.assertFalse(self._redis.put_recent_listens_for_user(user_id, listens, t - 1000, t, version))
+        self.assertIsNone(self._redis.get_recent_listens_for_user(user_id, 10))
+
+        # users without listens are cached too
+        version = self._redis.get_recent_listens_version(user_id)
+        self.assertTrue(self._redis.put_recent_listens_for_user(user_id, [], 0, 0, version))
+        self.assertEqual(self._redis.get_recent_listens_for_user(user_id, 10), ([], 0, 0))
+
+    def test_add_get_and_invalidate_feed_timeline(self):
+        user_id = self.testuser['id']
+        self.assertIsNone(self._redis.get_feed_timeline(user_id, 0, int(time.time()) + 10))
+
+        t = int(time.time())
+        msids = [str(uuid.uuid4()) for _ in range(3)]
+        self._redis.add_to_feed_timelines({user_id: [(2, t - 2, msids[0]), (3, t - 1, msids[1])]})
+        self._redis.add_to_feed_timelines({user_id: [(2, t, msids[2])]})
+
+        refs, complete_from = self._redis.get_feed_timeline(user_id, 0, t + 10)
+        self.assertEqual(refs, [(2, t, msids[2]), (3, t - 1, msids[1]), (2, t - 2, msids[0])])
+        self.assertGreater(complete_from, t - 2)
+
+        # the range is exclusive
+        refs, _ = self._redis.get_feed_timeline(user_id, t - 2, t)
+        self.assertEqual(refs, [(3, t - 1, msids[1])])
+
+        self._redis.invalidate_feed_timelines([user_id])
+        self.assertIsNone(self._redis.get_feed_timeline(user_id, 0, t + 10))
+
+    def test_add_and_get_feed_fanout_skipped(self):
+        self.assertEqual(self._redis.get_feed_fanout_skipped([1, 2]), {})
+
+        self._redis.add_feed_fanout_skipped({1: 100, 2: 200})
+        # an older skipped listen doesn't move back the latest one
+        self._redis.add_feed_fanout_skipped({1: 50, 2: 250})
+        self.assertEqual(self._redis.get_feed_fanout_skipped([1, 2, 3]), {1: 100, 2: 250})
+
     def test_incr_listen_count_for_day(self):
         today = datetime.datetime.utcnow()
         # get without setting any value, should return None
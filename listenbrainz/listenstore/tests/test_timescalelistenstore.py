@@ -1,5 +1,6 @@
 import logging
 import random
+import uuid
 from datetime import datetime, timedelta
 from time import time
 
@@ -10,7 +11,7 @@ from sqlalchemy import text
 import listenbrainz.db.user as db_user
 from listenbrainz.db import timescale as ts, timescale
 from listenbrainz.db.testing import DatabaseTestCase, TimescaleTestCase
-from listenbrainz.listenstore.tests.util import create_test_data_for_timescalelistenstore
+from listenbrainz.listenstore.tests.util import create_test_data_for_timescalelistenstore, generate_data
 from listenbrainz.listenstore.timescale_listenstore import REDIS_USER_LISTEN_COUNT, \
     TimescaleListenStore, REDIS_TOTAL_LISTEN_COUNT
 from listenbrainz.listenstore.timescale_utils import delete_listens_and_update_user_listen_data,\
@@ -87,6 +88,41 @@ class TestTimescaleListenStore(DatabaseTestCase, TimescaleTestCase):
         listens, min_ts, max_ts = self.logstore.fetch_listens(user=self.testuser, from_ts=from_ts)
         self.assertEqual(len(listens), count)
 
+    def test_insert_copy(self):
+        test_data = create_test_data_for_timescalelistenstore(self.testuser_name, self.testuser_id)
+        inserted = self.logstore.insert_copy(test_data)
+        self.assertEqual(len(inserted), len(test_data))
+        self.assertCountEqual(
+            [(row[0].timestamp(), row[1], str(row[2])) for row in inserted],
+            [(listen.ts_since_epoch, listen.user_id, listen.recording_msid) for listen in test_data]
+        )
+
+        # duplicates are not inserted again and are not returned
+        self.assertEqual(self.logstore.insert_copy(test_data), [])
+
+        from_ts = datetime.utcfromtimestamp(1399999999)
+        listens, min_ts, max_ts = self.logstore.fetch_listens(user=self.testuser, from_ts=from_ts)
+        self.assertEqual(len(listens), len(test_data))
+        self.assertEqual(listens[0].data["track_name"], test_data[-1].data["track_name"])
+
+        with ts.engine.connect() as connection:
+            count = connection.execute(
+                text("SELECT count FROM listen_user_metadata WHERE user_id = :user_id"),
+                {"user_id": self.testuser_id}
+            ).scalar()
+        self.assertEqual(count, len(test_data))
+
+    def test_insert_values_multiple_pages(self):
+        # execute_values sends 100 rows per statement, all the inserted rows should be returned
+        test_data = generate_data(self.testuser_id, self.testuser_name, 1400000000, 250)
+        inserted = self.logstore.insert_values(test_data)
+        self.assertEqual(len(inserted), 250)
+        self.assertCountEqual(
+            [str(row[2]) for row in inserted],
+            [listen.recording_msid for listen in test_data]
+        )
+        self.assertEqual(self.logstore.insert_values(test_data), [])
+
     def test_fetch_listens_0(self):
         self._create_test_data(self.testuser_name, self.testuser_id)
         from_ts = datetime.utcfromtimestamp(1400000000)
@@ -170,6 +206,27 @@ class TestTimescaleListenStore(DatabaseTestCase, TimescaleTestCase):
         self.assertEqual(listens[2].ts_since_epoch, 1400000050)
         self.assertEqual(listens[3].ts_since_epoch, 1400000000)
 
+    def test_fetch_listens_keyset_matches_windowed(self):
+        """ Test that both fetch modes return the same listens, the keyset mode in a single pass """
+        self._create_test_data(self.testuser_name, self.testuser_id,
+                               test_data_file_name='timescale_listenstore_test_listens_over_greater_time_range.json')
+        windowed_store = TimescaleListenStore(self.log, keyset_fetch=False)
+
+        for kwargs in [
+            {"from_ts": datetime.utcfromtimestamp(1399999999)},
+            {"from_ts": datetime.utcfromtimestamp(1399999999), "limit": 3},
+            {"to_ts": datetime.utcfromtimestamp(1420000051), "limit": 3},
+            {"from_ts": datetime.utcfromtimestamp(1400000049), "to_ts": datetime.utcfromtimestamp(1420000001)},
+            {},
+        ]:
+            keyset_listens, _, _ = self.logstore.fetch_listens(user=self.testuser, **kwargs)
+            windowed_listens, _, _ = windowed_store.fetch_listens(user=self.testuser, **kwargs)
+            self.assertEqual([l.to_api() for l in keyset_listens], [l.to_api() for l in windowed_listens])
+
+        self.assertEqual(self.logstore.fetch_stats["fetch_listens_count"], 5)
+        self.assertEqual(self.logstore.fetch_stats["fetch_listens_max_passes"], 1)
+        self.assertGreater(windowed_store.fetch_stats["fetch_listens_max_passes"], 1)
+
     def test_fetch_listens_with_mapping(self):
         """ Test that the recording mbid submitted by the user is preferred over the mapping created by LB """
         self._create_test_data(self.testuser_name, self.testuser_id)
@@ -210,6 +267,38 @@ class TestTimescaleListenStore(DatabaseTestCase, TimescaleTestCase):
         self.assertEqual(len(recent), 1)
         self.assertEqual(recent[0].ts_since_epoch, 1400000200)
 
+    def test_fetch_recent_listens_chunked(self):
+        users = []
+        for musicbrainz_row_id, name in [(2, "someuser"), (3, "otheruser"), (4, "thirduser")]:
+            user = db_user.get_or_create(self.db_conn, musicbrainz_row_id, name)
+            self._create_test_data(user["musicbrainz_id"], user["id"])
+            users.append(user)
+
+        min_ts = datetime(1960, 1, 1)
+        expected = self.logstore.fetch_recent_listens_for_users(users, min_ts=min_ts, limit=5)
+        received = self.logstore.fetch_recent_listens_for_users(users, min_ts=min_ts, limit=5, user_chunk_size=1)
+        self.assertEqual(len(received), 5)
+        self.assertEqual(
+            [(listen.ts_since_epoch, listen.user_name) for listen in received],
+            [(listen.ts_since_epoch, listen.user_name) for listen in expected]
+        )
+        self.assertEqual(received, sorted(received, key=lambda listen: listen.timestamp, reverse=True))
+
+    def test_fetch_listens_by_keys(self):
+        user = db_user.get_or_create(self.db_conn, 2, 'someuser')
+        test_data = generate_data(user["id"], user["musicbrainz_id"], 1400000000, 5)
+        self.logstore.insert(test_data)
+
+        keys = [(listen.user_id, listen.ts_since_epoch, listen.recording_msid) for listen in test_data[1:4]]
+        # a deleted listen cannot be loaded and is skipped
+        keys.append((user["id"], 1400000010, str(uuid.uuid4())))
+        listens = self.logstore.fetch_listens_by_keys({user["id"]: user["musicbrainz_id"]}, keys)
+        self.assertEqual(
+            [(listen.ts_since_epoch, listen.recording_msid, listen.user_name) for listen in listens],
+            [(listen.ts_since_epoch, listen.recording_msid, user["musicbrainz_id"]) for listen in reversed(test_data[1:4])]
+        )
+        self.assertEqual(self.logstore.fetch_listens_by_keys({}, []), [])
+
     def test_listen_counts_in_cache(self):
         uid = random.randint(2000, 1 << 31)
         testuser = db_user.get_or_create(self.db_conn, uid, "user_%d" % uid)
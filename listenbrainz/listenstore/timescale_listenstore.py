@@ -1,6 +1,11 @@
+import heapq
+import itertools
+import multiprocessing
+import queue
 import subprocess
 import tarfile
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Dict, Tuple, Optional
 
@@ -8,12 +13,13 @@ import psycopg2
 import psycopg2.sql
 import sqlalchemy
 import orjson
-from brainzutils import cache
+from brainzutils import cache, metrics
 from psycopg2.errors import UntranslatableCharacter
 from psycopg2.extras import execute_values
 from sqlalchemy import text
 
 from listenbrainz.db import timescale, DUMP_DEFAULT_THREAD_COUNT
+from listenbrainz.db.binary_copy import encode_rows, encode_timestamptz, encode_int4, encode_uuid, encode_jsonb
 from listenbrainz.db.dump import SchemaMismatchException
 from listenbrainz.listen import Listen
 from listenbrainz.listenstore import LISTENS_DUMP_SCHEMA_VERSION, LISTEN_MINIMUM_DATE
@@ -28,6 +34,11 @@ REDIS_TOTAL_LISTEN_COUNT = "lc-total"
 REDIS_USER_LISTEN_COUNT_EXPIRY = 300
 
 DUMP_CHUNK_SIZE = 100000
+
+# Batches of at least this many listens are inserted using a binary COPY into a staging table
+# instead of a multi-row INSERT, see TimescaleListenStore.insert_copy
+COPY_INSERT_THRESHOLD = 1000
+LISTEN_COPY_ENCODERS = (encode_timestamptz, encode_int4, encode_uuid, encode_jsonb)
 DATA_START_YEAR_IN_SECONDS = 1104537600
 
 # How many listens to fetch on the first attempt. If we don't fetch enough, increase it by WINDOW_SIZE_MULTIPLIER
@@ -41,14 +52,115 @@ LISTEN_COUNT_BUCKET_WIDTH = 2592000
 MAX_FUTURE_SECONDS = timedelta(seconds=1)  # 10 mins in future - max fwd clock skew
 EPOCH = datetime.utcfromtimestamp(0)
 
+# fetch_recent_listens_for_users splits larger lists of users into chunks of this size which are queried in
+# parallel using up to RECENT_LISTENS_MAX_THREADS connections
+RECENT_LISTENS_USER_CHUNK_SIZE = 250
+RECENT_LISTENS_MAX_THREADS = 4
+
+# Submit the accumulated fetch_listens statistics at most this often, in seconds
+FETCH_LISTENS_METRICS_INTERVAL = 60
+
+# Joins the metadata of the listens selected by the selected_listens subquery, see TimescaleListenStore.fetch_listens
+FETCH_LISTENS_QUERY = """
+           WITH selected_listens AS (
+                {selected_listens}
+           )
+           SELECT listened_at
+                , user_id
+                , created
+                , sl.recording_msid::TEXT
+                , data
+                , sl.recording_mbid
+                , mbc.recording_data->>'name' AS recording_name
+                , mbc.release_mbid
+                , mbc.artist_mbids::TEXT[]
+                , (mbc.release_data->>'caa_id')::bigint AS caa_id
+                , mbc.release_data->>'caa_release_mbid' AS caa_release_mbid
+                , array_agg(artist->>'name' ORDER BY position) AS ac_names
+                , array_agg(artist->>'join_phrase' ORDER BY position) AS ac_join_phrases
+             FROM selected_listens sl
+        LEFT JOIN mapping.mb_metadata_cache mbc
+               ON sl.recording_mbid = mbc.recording_mbid
+LEFT JOIN LATERAL jsonb_array_elements(artist_data->'artists') WITH ORDINALITY artists(artist, position)
+               ON TRUE
+         GROUP BY listened_at
+                , sl.recording_msid
+                , user_id
+                , created
+                , data
+                , sl.recording_mbid
+                , recording_data->>'name'
+                , release_mbid
+                , artist_mbids
+                , artist_data->>'name'
+                , recording_data->>'name'
+                , release_data->>'name'
+                , release_data->>'caa_id'
+                , release_data->>'caa_release_mbid'
+         ORDER BY listened_at {order}
+            LIMIT :limit
+"""
+
+# Selects the listens of the source, which has to be aliased as l, along with the mbid of their recording. The
+# result is used as the selected_listens subquery of FETCH_LISTENS_QUERY.
+SELECT_LISTENS_WITH_MBID_QUERY = """
+            SELECT l.listened_at
+                 , l.created
+                 , l.user_id
+                 , l.recording_msid
+                 , l.data
+                 -- prefer to use user submitted mbid, then user specified mapping, then mbid mapper's mapping, finally other user's specified mappings
+                 , COALESCE((data->'additional_info'->>'recording_mbid')::uuid, user_mm.recording_mbid, mm.recording_mbid, other_mm.recording_mbid) AS recording_mbid
+              FROM {source}
+         LEFT JOIN mbid_mapping mm
+                ON l.recording_msid = mm.recording_msid
+         LEFT JOIN mbid_manual_mapping user_mm
+                ON l.recording_msid = user_mm.recording_msid
+               AND user_mm.user_id = l.user_id
+         LEFT JOIN mbid_manual_mapping_top other_mm
+                ON l.recording_msid = other_mm.recording_msid
+             {filters}
+"""
+
+
+def _select_listens_by_keys(keys: str, user_condition: str) -> str:
+    """ Returns the query selecting the listens with the given keys along with the mbid of their recording.
+
+    Args:
+        keys: an expression for the keys of the listens, aliased as k with listened_at and recording_msid columns
+        user_condition: the condition on l.user_id to join the listens on
+    """
+    # the bounds on listened_at let timescale exclude the chunks which don't contain any of the keys, the
+    # caller passes the smallest and largest listened_at of the keys as min_ts and max_ts
+    return SELECT_LISTENS_WITH_MBID_QUERY.format(
+        source=f"""{keys}
+              JOIN listen l
+                ON l.listened_at = k.listened_at
+               AND l.recording_msid = k.recording_msid
+               AND {user_condition}""",
+        filters="""WHERE l.listened_at >= :min_ts
+               AND l.listened_at <= :max_ts"""
+    )
+
 
 class TimescaleListenStore:
     '''
         The listenstore implementation for the timescale DB.
     '''
 
-    def __init__(self, logger):
+    def __init__(self, logger, keyset_fetch=True):
+        """
+            Args:
+                logger: the logger to use
+                keyset_fetch: if True, fetch_listens finds the keys of the listens to return with an index only
+                    scan and then fetches their metadata. Otherwise, a time window around the requested
+                    timestamps is searched and widened until enough listens are found.
+        """
         self.log = logger
+        self.keyset_fetch = keyset_fetch
+
+        self.fetch_stats = self._empty_fetch_stats()
+        self.fetch_stats_submitted = time.monotonic()
 
     def set_empty_values_for_user(self, user_id: int):
         """When a user is created, set the timestamp keys and insert an entry in the listen count
@@ -126,52 +238,123 @@ class TimescaleListenStore:
         cache.set(REDIS_TOTAL_LISTEN_COUNT, count, expirein=REDIS_USER_LISTEN_COUNT_EXPIRY)
         return count
 
+    # inserts listens and updates listen_user_metadata for the newly inserted listens, the source of
+    # the listens (VALUES list or staging table) is filled in by the caller.
+    INSERT_LISTENS_QUERY = """
+        WITH inserted_listens AS (
+            INSERT INTO listen (listened_at, user_id, recording_msid, data)
+                 {source}
+            ON CONFLICT (listened_at, user_id, recording_msid)
+             DO NOTHING
+              RETURNING listened_at, user_id, recording_msid
+        ), metadata AS (
+            INSERT INTO listen_user_metadata AS lum (user_id, count, min_listened_at, max_listened_at, created)
+                 SELECT user_id, count(*), min(listened_at), max(listened_at), NOW()
+                   FROM inserted_listens
+               GROUP BY user_id
+            ON CONFLICT (user_id)
+              DO UPDATE
+                    SET count = lum.count + excluded.count
+                      , min_listened_at = least(lum.min_listened_at, excluded.min_listened_at)
+                      , max_listened_at = greatest(lum.max_listened_at, excluded.max_listened_at)
+                      , created = excluded.created
+        ) SELECT * FROM inserted_listens
+    """
+
+    # same as INSERT_LISTENS_QUERY but leaves listen_user_metadata alone, used when it is recalculated afterwards
+    INSERT_LISTENS_ONLY_QUERY = """
+        INSERT INTO listen (listened_at, user_id, recording_msid, data)
+             {source}
+        ON CONFLICT (listened_at, user_id, recording_msid)
+         DO NOTHING
+          RETURNING listened_at, user_id, recording_msid
+    """
+
     def insert(self, listens):
         """
             Insert a batch of listens. Returns a list of (listened_at, track_name, user_name, user_id) that indicates
             which rows were inserted into the DB. If the row is not listed in the return values, it was a duplicate.
+
+            Batches of COPY_INSERT_THRESHOLD or more listens are inserted using insert_copy.
         """
+        if len(listens) >= COPY_INSERT_THRESHOLD:
+            return self.insert_copy(listens)
+        return self.insert_values(listens)
 
+    def insert_values(self, listens):
+        """
+            Insert a batch of listens using a multi-row INSERT, the return value is the same as that of insert.
+        """
         submit = []
         for listen in listens:
             submit.append(listen.to_timescale())
 
-        query = """
-            WITH inserted_listens AS (
-                INSERT INTO listen (listened_at, user_id, recording_msid, data)
-                     VALUES %s
-                ON CONFLICT (listened_at, user_id, recording_msid)
-                 DO NOTHING
-                  RETURNING listened_at, user_id, recording_msid
-            ), metadata AS (
-                INSERT INTO listen_user_metadata AS lum (user_id, count, min_listened_at, max_listened_at, created)
-                     SELECT user_id, count(*), min(listened_at), max(listened_at), NOW()
-                       FROM inserted_listens
-                   GROUP BY user_id
-                ON CONFLICT (user_id)
-                  DO UPDATE
-                        SET count = lum.count + excluded.count
-                          , min_listened_at = least(lum.min_listened_at, excluded.min_listened_at)
-                          , max_listened_at = greatest(lum.max_listened_at, excluded.max_listened_at)
-                          , created = excluded.created
-            ) SELECT * FROM inserted_listens
-        """
+        query = self.INSERT_LISTENS_QUERY.format(source="VALUES %s")
 
         inserted_rows = []
         conn = timescale.engine.raw_connection()
-        with conn.cursor() as curs:
-            try:
-                execute_values(curs, query, submit, template=None)
-                while True:
-                    result = curs.fetchone()
-                    if not result:
-                        break
-                    inserted_rows.append((result[0], result[1], result[2]))
-            except UntranslatableCharacter:
-                conn.rollback()
-                return
+        try:
+            with conn.cursor() as curs:
+                try:
+                    # execute_values splits the rows into pages of page_size, fetch the RETURNING rows of
+                    # all the pages and not just the last one
+                    results = execute_values(curs, query, submit, template=None, fetch=True)
+                    for result in results:
+                        inserted_rows.append((result[0], result[1], result[2]))
+                except UntranslatableCharacter:
+                    conn.rollback()
+                    return
+
+            conn.commit()
+        finally:
+            conn.close()
+
+        return inserted_rows
+
+    def insert_copy(self, listens, update_user_metadata=True):
+        """
+            Insert a batch of listens using a binary COPY into a temporary staging table, followed by a single
+            INSERT ... SELECT from the staging table into the listen table. Meant for large batches like dump
+            imports, the return value is the same as that of insert.
 
-        conn.commit()
+            If update_user_metadata is False, listen_user_metadata is not updated and the caller is responsible
+            for running recalculate_all_user_data afterwards.
+        """
+        buffer = encode_rows((listen.to_timescale() for listen in listens), LISTEN_COPY_ENCODERS)
+
+        inserted_rows = []
+        conn = timescale.engine.raw_connection()
+        try:
+            with conn.cursor() as curs:
+                try:
+                    # temporary tables are not WAL-logged and are private to the session so concurrent
+                    # writers don't interfere with each other
+                    curs.execute("""
+                        CREATE TEMPORARY TABLE listen_staging (
+                            listened_at     TIMESTAMP WITH TIME ZONE NOT NULL,
+                            user_id         INTEGER                  NOT NULL,
+                            recording_msid  UUID                     NOT NULL,
+                            data            JSONB                    NOT NULL
+                        ) ON COMMIT DROP
+                    """)
+                    curs.copy_expert(
+                        "COPY listen_staging (listened_at, user_id, recording_msid, data) FROM STDIN WITH (FORMAT binary)",
+                        buffer
+                    )
+                    query = self.INSERT_LISTENS_QUERY if update_user_metadata else self.INSERT_LISTENS_ONLY_QUERY
+                    query = query.format(
+                        source="SELECT listened_at, user_id, recording_msid, data FROM listen_staging"
+                    )
+                    curs.execute(query)
+                    for result in curs.fetchall():
+                        inserted_rows.append((result[0], result[1], result[2]))
+                except UntranslatableCharacter:
+                    conn.rollback()
+                    return
+
+            conn.commit()
+        finally:
+            conn.close()
 
         return inserted_rows
 
@@ -203,61 +386,89 @@ class TimescaleListenStore:
         if to_ts is None and from_ts is None:
             to_ts = max_user_ts + timedelta(seconds=1)
 
+        t0 = time.monotonic()
+        if self.keyset_fetch:
+            listens, passes, keys_time = self._fetch_listens_keyset(user, from_ts, to_ts, limit, order)
+        else:
+            listens, passes = self._fetch_listens_windowed(user, from_ts, to_ts, limit, order, min_user_ts)
+            keys_time = 0.0
+        fetch_listens_time = time.monotonic() - t0
+
+        if order == ORDER_ASC:
+            listens.reverse()
+
+        self.log.info("fetch listens %s %.2fs (%d passes, %.3fs key scan)"
+                      % (user["musicbrainz_id"], fetch_listens_time, passes, keys_time))
+        self._update_fetch_metrics(passes, keys_time, fetch_listens_time - keys_time)
+
+        return listens, min_user_ts, max_user_ts
+
+    def _fetch_listens_keyset(self, user: Dict, from_ts: Optional[datetime], to_ts: Optional[datetime],
+                              limit: int, order: int):
+        """ Fetch the listens in two phases. First the keys of the next limit listens of the user are
+        fetched using an index only scan on (user_id, listened_at DESC, recording_msid), then the mapping
+        and metadata joins are done for those keys only. This always needs a single pass regardless of
+        how sparse the listens of the user are.
+
+        Returns a tuple of (listens, passes, time spent fetching the keys)
+        """
+        t0 = time.monotonic()
+        filters = ["user_id = :user_id"]
+        if from_ts is not None:
+            filters.append("listened_at > :from_ts")
+        if to_ts is not None:
+            filters.append("listened_at < :to_ts")
+        keys_query = f"""
+            SELECT listened_at
+                 , recording_msid::TEXT
+              FROM listen
+             WHERE {" AND ".join(filters)}
+          ORDER BY listened_at {ORDER_TEXT[order]}
+             LIMIT :limit
+        """
+        keys = ts_conn.execute(
+            sqlalchemy.text(keys_query),
+            {"user_id": user["id"], "from_ts": from_ts, "to_ts": to_ts, "limit": limit}
+        ).fetchall()
+        keys_time = time.monotonic() - t0
+
+        if not keys:
+            return [], 1, keys_time
+
+        selected_listens = _select_listens_by_keys(
+            "unnest(CAST(:listened_ats AS TIMESTAMPTZ[]), CAST(:recording_msids AS UUID[])) AS k(listened_at, recording_msid)",
+            "l.user_id = :user_id"
+        )
+        listened_ats = [key.listened_at for key in keys]
+        curs = ts_conn.execute(
+            sqlalchemy.text(FETCH_LISTENS_QUERY.format(selected_listens=selected_listens, order=ORDER_TEXT[order])),
+            {
+                "user_id": user["id"],
+                "listened_ats": listened_ats,
+                "recording_msids": [key.recording_msid for key in keys],
+                "min_ts": min(listened_ats),
+                "max_ts": max(listened_ats),
+                "limit": limit
+            }
+        )
+        listens = [self._listen_from_row(user["musicbrainz_id"], row) for row in curs.fetchall()]
+        return listens, 1, keys_time
+
+    def _fetch_listens_windowed(self, user: Dict, from_ts: Optional[datetime], to_ts: Optional[datetime],
+                                limit: int, order: int, min_user_ts: datetime):
+        """ Fetch the listens by guessing a time window and widening it by WINDOW_SIZE_MULTIPLIER until
+        enough listens have been found or the window extends beyond the user's listens.
+
+        Returns a tuple of (listens, passes)
+        """
         window_size = DEFAULT_FETCH_WINDOW
-        query = """
-                   WITH selected_listens AS (
-                        SELECT l.listened_at
-                             , l.created
-                             , l.user_id
-                             , l.recording_msid
-                             , l.data
-                             -- prefer to use user submitted mbid, then user specified mapping, then mbid mapper's mapping, finally other user's specified mappings
-                             , COALESCE((data->'additional_info'->>'recording_mbid')::uuid, user_mm.recording_mbid, mm.recording_mbid, other_mm.recording_mbid) AS recording_mbid
-                          FROM listen l
-                     LEFT JOIN mbid_mapping mm
-                            ON l.recording_msid = mm.recording_msid
-                     LEFT JOIN mbid_manual_mapping user_mm
-                            ON l.recording_msid = user_mm.recording_msid
-                           AND user_mm.user_id = l.user_id 
-                     LEFT JOIN mbid_manual_mapping_top other_mm
-                            ON l.recording_msid = other_mm.recording_msid
-                         WHERE l.user_id = :user_id
-                           AND listened_at > :from_ts
-                           AND listened_at < :to_ts
-                   )
-                   SELECT listened_at
-                        , user_id
-                        , created
-                        , sl.recording_msid::TEXT
-                        , data
-                        , sl.recording_mbid
-                        , mbc.recording_data->>'name' AS recording_name
-                        , mbc.release_mbid
-                        , mbc.artist_mbids::TEXT[]
-                        , (mbc.release_data->>'caa_id')::bigint AS caa_id
-                        , mbc.release_data->>'caa_release_mbid' AS caa_release_mbid
-                        , array_agg(artist->>'name' ORDER BY position) AS ac_names
-                        , array_agg(artist->>'join_phrase' ORDER BY position) AS ac_join_phrases
-                     FROM selected_listens sl
-                LEFT JOIN mapping.mb_metadata_cache mbc
-                       ON sl.recording_mbid = mbc.recording_mbid
-        LEFT JOIN LATERAL jsonb_array_elements(artist_data->'artists') WITH ORDINALITY artists(artist, position)
-                       ON TRUE
-                 GROUP BY listened_at
-                        , sl.recording_msid
-                        , user_id
-                        , created
-                        , data
-                        , sl.recording_mbid
-                        , recording_data->>'name'
-                        , release_mbid
-                        , artist_mbids
-                        , artist_data->>'name'
-                        , recording_data->>'name'
-                        , release_data->>'name'
-                        , release_data->>'caa_id'
-                        , release_data->>'caa_release_mbid'
-                 ORDER BY listened_at """ + ORDER_TEXT[order] + " LIMIT :limit"
+        selected_listens = SELECT_LISTENS_WITH_MBID_QUERY.format(
+            source="listen l",
+            filters="""WHERE l.user_id = :user_id
+               AND listened_at > :from_ts
+               AND listened_at < :to_ts"""
+        )
+        query = FETCH_LISTENS_QUERY.format(selected_listens=selected_listens, order=ORDER_TEXT[order])
 
         if from_ts and to_ts:
             to_dynamic = False
@@ -274,8 +485,6 @@ class TimescaleListenStore:
         listens = []
         done = False
 
-        t0 = time.monotonic()
-
         passes = 0
         while True:
             passes += 1
@@ -316,22 +525,7 @@ class TimescaleListenStore:
 
                     break
 
-                listens.append(Listen.from_timescale(
-                    listened_at=result.listened_at,
-                    user_id=result.user_id,
-                    created=result.created,
-                    recording_msid=result.recording_msid,
-                    track_metadata=result.data,
-                    recording_mbid=result.recording_mbid,
-                    recording_name=result.recording_name,
-                    release_mbid=result.release_mbid,
-                    artist_mbids=result.artist_mbids,
-                    ac_names=result.ac_names,
-                    ac_join_phrases=result.ac_join_phrases,
-                    user_name=user["musicbrainz_id"],
-                    caa_id=result.caa_id,
-                    caa_release_mbid=result.caa_release_mbid
-                ))
+                listens.append(self._listen_from_row(user["musicbrainz_id"], result))
 
                 if len(listens) == limit:
                     done = True
@@ -340,118 +534,161 @@ class TimescaleListenStore:
             if done:
                 break
 
-        fetch_listens_time = time.monotonic() - t0
-
-        if order == ORDER_ASC:
-            listens.reverse()
+        return listens, passes
+
+    @staticmethod
+    def _listen_from_row(user_name: str, result) -> Listen:
+        return Listen.from_timescale(
+            listened_at=result.listened_at,
+            user_id=result.user_id,
+            created=result.created,
+            recording_msid=result.recording_msid,
+            track_metadata=result.data,
+            recording_mbid=result.recording_mbid,
+            recording_name=result.recording_name,
+            release_mbid=result.release_mbid,
+            artist_mbids=result.artist_mbids,
+            ac_names=result.ac_names,
+            ac_join_phrases=result.ac_join_phrases,
+            user_name=user_name,
+            caa_id=result.caa_id,
+            caa_release_mbid=result.caa_release_mbid
+        )
+
+    def _update_fetch_metrics(self, passes: int, keys_time: float, listens_time: float):
+        """ Accumulate the fetch_listens statistics and submit them once every FETCH_LISTENS_METRICS_INTERVAL
+         seconds, to avoid a metrics write for every request. """
+        stats = self.fetch_stats
+        stats["fetch_listens_count"] += 1
+        stats["fetch_listens_passes"] += passes
+        stats["fetch_listens_max_passes"] = max(stats["fetch_listens_max_passes"], passes)
+        stats["fetch_listens_keys_time"] += keys_time
+        stats["fetch_listens_listens_time"] += listens_time
+
+        now = time.monotonic()
+        if now < self.fetch_stats_submitted + FETCH_LISTENS_METRICS_INTERVAL:
+            return
 
-        self.log.info("fetch listens %s %.2fs (%d passes)" % (user["musicbrainz_id"], fetch_listens_time, passes))
-
-        return listens, min_user_ts, max_user_ts
-
-    def fetch_recent_listens_for_users(self, users, min_ts: datetime = None, max_ts: datetime = None, per_user_limit=2, limit=10):
+        try:
+            metrics.set("listenstore", fetch_listens_keyset=int(self.keyset_fetch), **stats)
+        except Exception:
+            self.log.error("Cannot submit fetch_listens metrics:", exc_info=True)
+        self.fetch_stats = self._empty_fetch_stats()
+        self.fetch_stats_submitted = now
+
+    @staticmethod
+    def _empty_fetch_stats() -> dict:
+        return {
+            "fetch_listens_count": 0,
+            "fetch_listens_passes": 0,
+            "fetch_listens_max_passes": 0,
+            "fetch_listens_keys_time": 0.0,
+            "fetch_listens_listens_time": 0.0,
+        }
+
+    def fetch_recent_listens_for_users(self, users, min_ts: datetime = None, max_ts: datetime = None, per_user_limit=2,
+                                       limit=10, user_chunk_size: int = RECENT_LISTENS_USER_CHUNK_SIZE):
         """ Fetch recent listens for a list of users, given a limit which applies per user. If you
             have a limit of 3 and 3 users you should get 9 listens if they are available.
 
+            The latest listens of each user are found with a separate index scan which stops after
+            per_user_limit listens. Lists of more than user_chunk_size users are split into chunks which
+            are queried in parallel on separate connections and the results are merged.
+
             user_ids: A list containing the users for which you'd like to retrieve recent listens.
             min_ts: Only return listens with listened_at after this timestamp
             max_ts: Only return listens with listened_at before this timestamp
             per_user_limit: the maximum number of listens for each user to fetch
             limit: the maximum number of listens overall to fetch
+            user_chunk_size: the maximum number of users to query in a single query
         """
         user_id_map = {user["id"]: user["musicbrainz_id"] for user in users}
+        if not user_id_map:
+            return []
+
+        user_ids = list(user_id_map.keys())
+        if len(user_ids) <= user_chunk_size:
+            rows = self._fetch_recent_listen_rows(ts_conn, user_ids, min_ts, max_ts, per_user_limit, limit)
+        else:
+            chunks = [user_ids[i:i + user_chunk_size] for i in range(0, len(user_ids), user_chunk_size)]
+
+            def fetch_chunk(chunk):
+                with timescale.engine.connect() as connection:
+                    return self._fetch_recent_listen_rows(connection, chunk, min_ts, max_ts, per_user_limit, limit)
+
+            with ThreadPoolExecutor(max_workers=min(RECENT_LISTENS_MAX_THREADS, len(chunks))) as executor:
+                results = list(executor.map(fetch_chunk, chunks))
+
+            # each chunk is already sorted by listened_at descending
+            merged = heapq.merge(*results, key=lambda row: row.listened_at, reverse=True)
+            rows = list(itertools.islice(merged, limit))
+
+        return [self._listen_from_row(user_id_map[row.user_id], row) for row in rows]
 
-        filters_list = ["user_id IN :user_ids"]
-        args = {"user_ids": tuple(user_id_map.keys()), "per_user_limit": per_user_limit, "limit": limit}
+    @staticmethod
+    def _fetch_recent_listen_rows(connection, user_ids: list[int], min_ts: Optional[datetime],
+                                  max_ts: Optional[datetime], per_user_limit: int, limit: int):
+        """ Fetch the latest per_user_limit listens of each of the users, and return the latest limit
+         of those along with their metadata. """
+        filters_list = []
+        args = {"user_ids": user_ids, "per_user_limit": per_user_limit, "limit": limit}
         if min_ts:
-            filters_list.append("listened_at > :min_ts")
+            filters_list.append("AND listened_at > :min_ts")
             args["min_ts"] = min_ts
         if max_ts:
-            filters_list.append("listened_at < :max_ts")
+            filters_list.append("AND listened_at < :max_ts")
             args["max_ts"] = max_ts
-        filters = " AND ".join(filters_list)
-
-        query = f"""
-              WITH intermediate AS (
-                    SELECT listened_at
-                         , created
-                         , user_id
-                         , recording_msid
-                         , data
-                         , row_number() OVER (PARTITION BY user_id ORDER BY listened_at DESC) AS rownum
-                      FROM listen l
-                     WHERE {filters} 
-              ), selected_listens AS (
-                    SELECT l.*
-                        -- prefer to use user submitted mbid, then user specified mapping, then mbid mapper's mapping, finally other user's specified mappings
-                         , COALESCE((data->'additional_info'->>'recording_mbid')::uuid, user_mm.recording_mbid, mm.recording_mbid, other_mm.recording_mbid) AS recording_mbid
-                      FROM intermediate l
-                 LEFT JOIN mbid_mapping mm
-                        ON l.recording_msid = mm.recording_msid
-                 LEFT JOIN mbid_manual_mapping user_mm
-                        ON l.recording_msid = user_mm.recording_msid
-                       AND user_mm.user_id = l.user_id 
-                 LEFT JOIN mbid_manual_mapping_top other_mm
-                        ON l.recording_msid = other_mm.recording_msid
-                     WHERE rownum <= :per_user_limit
-              )     SELECT user_id
-                         , listened_at
-                         , created
-                         , l.recording_msid::TEXT
-                         , data
-                         , l.recording_mbid
-                         , mbc.recording_data->>'name' AS recording_name
-                         , mbc.release_mbid
-                         , mbc.artist_mbids::TEXT[]
-                         , (mbc.release_data->>'caa_id')::bigint AS caa_id
-                         , mbc.release_data->>'caa_release_mbid' AS caa_release_mbid
-                         , array_agg(artist->>'name' ORDER BY position) AS ac_names
-                         , array_agg(artist->>'join_phrase' ORDER BY position) AS ac_join_phrases            
-                      FROM selected_listens l
-                 LEFT JOIN mapping.mb_metadata_cache mbc
-                        ON l.recording_mbid = mbc.recording_mbid
-         LEFT JOIN LATERAL jsonb_array_elements(artist_data->'artists') WITH ORDINALITY artists(artist, position)
-                        ON TRUE            
-                  GROUP BY user_id
-                         , listened_at
-                         , l.recording_msid
-                         , created
-                         , data
-                         , l.recording_mbid
-                         , mbc.recording_data->>'name'
-                         , mbc.release_mbid
-                         , mbc.artist_mbids
-                         , mbc.release_data->>'caa_id'
-                         , mbc.release_data->>'caa_release_mbid'
-                  ORDER BY listened_at DESC
+        filters = " ".join(filters_list)
+
+        source = f"""(
+                    SELECT ul.*
+                      FROM unnest(CAST(:user_ids AS INTEGER[])) AS u(user_id)
+                      JOIN LATERAL (
+                            SELECT listened_at
+                                 , created
+                                 , user_id
+                                 , recording_msid
+                                 , data
+                              FROM listen
+                             WHERE user_id = u.user_id
+                                   {filters}
+                          ORDER BY listened_at DESC
+                             LIMIT :per_user_limit
+                           ) ul
+                        ON TRUE
+                  ORDER BY ul.listened_at DESC
                      LIMIT :limit
-        """
+                   ) l"""
+        selected_listens = SELECT_LISTENS_WITH_MBID_QUERY.format(source=source, filters="")
+        query = FETCH_LISTENS_QUERY.format(selected_listens=selected_listens, order=ORDER_TEXT[ORDER_DESC])
+        return connection.execute(sqlalchemy.text(query), args).fetchall()
 
-        listens = []
+    def fetch_listens_by_keys(self, user_names: Dict[int, str], keys: list[tuple[int, int, str]]) -> list[Listen]:
+        """ Fetch the listens with the given keys along with their metadata.
 
-        curs = ts_conn.execute(sqlalchemy.text(query), args)
-        while True:
-            result = curs.fetchone()
-            if not result:
-                break
-            user_name = user_id_map[result.user_id]
-            listens.append(Listen.from_timescale(
-                listened_at=result.listened_at,
-                user_id=result.user_id,
-                created=result.created,
-                recording_msid=result.recording_msid,
-                track_metadata=result.data,
-                recording_mbid=result.recording_mbid,
-                recording_name=result.recording_name,
-                release_mbid=result.release_mbid,
-                artist_mbids=result.artist_mbids,
-                ac_names=result.ac_names,
-                ac_join_phrases=result.ac_join_phrases,
-                user_name=user_name,
-                caa_id=result.caa_id,
-                caa_release_mbid=result.caa_release_mbid
-            ))
-        return listens
+            user_names: a dict of the user ids of the listens to their MusicBrainz usernames
+            keys: the (user_id, listened_at, recording_msid) of the listens to fetch
+            Returns a list of the listens ordered by listened_at descending, listens which don't exist are skipped.
+        """
+        if not keys:
+            return []
+
+        listened_ats = [datetime.fromtimestamp(listened_at, timezone.utc) for _, listened_at, _ in keys]
+        selected_listens = _select_listens_by_keys(
+            """unnest(CAST(:user_ids AS INTEGER[]), CAST(:listened_ats AS TIMESTAMPTZ[]), CAST(:recording_msids AS UUID[]))
+                AS k(user_id, listened_at, recording_msid)""",
+            "l.user_id = k.user_id"
+        )
+        query = FETCH_LISTENS_QUERY.format(selected_listens=selected_listens, order=ORDER_TEXT[ORDER_DESC])
+        curs = ts_conn.execute(sqlalchemy.text(query), {
+            "user_ids": [user_id for user_id, _, _ in keys],
+            "listened_ats": listened_ats,
+            "recording_msids": [recording_msid for _, _, recording_msid in keys],
+            "min_ts": min(listened_ats),
+            "max_ts": max(listened_ats),
+            "limit": len(keys)
+        })
+        return [self._listen_from_row(user_names[row.user_id], row) for row in curs.fetchall()]
 
     def fetch_all_recent_listens_for_users(self, users, min_ts: datetime, max_ts: datetime, limit=25):
         """ Fetch recent listens for a list of users.
@@ -553,21 +790,39 @@ class TimescaleListenStore:
 
         return listens
 
-    def import_listens_dump(self, archive_path: str, threads: int = DUMP_DEFAULT_THREAD_COUNT):
+    def import_listens_dump(self, archive_path: str, threads: int = DUMP_DEFAULT_THREAD_COUNT,
+                            workers: int = 1, defer_user_metadata: bool = False):
         """ Imports listens into TimescaleDB from a ListenBrainz listens dump .tar.xz archive.
 
+        If more than one worker is requested, this process only decompresses the archive and hands chunks
+        of raw listen lines over a bounded queue to the worker processes, which parse and insert them using
+        their own timescale connections.
+
         Args:
             archive_path: the path to the listens dump .tar.xz archive to be imported
             threads: the number of threads to be used for decompression
                         (defaults to DUMP_DEFAULT_THREAD_COUNT)
+            workers: the number of processes to insert listens with (defaults to 1, i.e. insert serially)
+            defer_user_metadata: if True, do not update listen_user_metadata during the import and recalculate
+                it for all users once the import is done instead
 
         Returns:
-            int: the number of users for whom listens have been imported
+            int: the number of listens imported
         """
 
         self.log.info(
             'Beginning import of listens from dump %s...', archive_path)
 
+        if workers > 1:
+            importer = ParallelListensImporter(self, workers, not defer_user_metadata)
+            process_lines = importer.submit
+        else:
+            importer = None
+
+            def process_lines(lines):
+                listens = [Listen.from_json(orjson.loads(line)) for line in lines]
+                self.insert_copy(listens, update_user_metadata=not defer_user_metadata)
+
         # construct the xz command to decompress the archive
         xz_command = ['xz', '--decompress', '--stdout',
                        archive_path, '-T{threads}'.format(threads=threads)]
@@ -575,49 +830,63 @@ class TimescaleListenStore:
 
         schema_checked = False
         total_imported = 0
-        with tarfile.open(fileobj=xz.stdout, mode='r|') as tar:
-            listens = []
-            for member in tar:
-                if member.name.endswith('SCHEMA_SEQUENCE'):
-                    self.log.info(
-                        'Checking if schema version of dump matches...')
-                    schema_seq = int(tar.extractfile(
-                        member).read().strip() or '-1')
-                    if schema_seq != LISTENS_DUMP_SCHEMA_VERSION:
-                        raise SchemaMismatchException('Incorrect schema version! Expected: %d, got: %d.'
-                                                      'Please ensure that the data dump version matches the code version'
-                                                      'in order to import the data.'
-                                                      % (LISTENS_DUMP_SCHEMA_VERSION, schema_seq))
-                    schema_checked = True
-
-                if member.name.endswith(".listens"):
-                    if not schema_checked:
-                        raise SchemaMismatchException("SCHEMA_SEQUENCE file missing FROM listen dump.")
-
-                    # tarf, really? That's the name you're going with? Yep.
-                    with tar.extractfile(member) as tarf:
-                        while True:
-                            line = tarf.readline()
-                            if not line:
-                                break
-
-                            listen = Listen.from_json(orjson.loads(line))
-                            listens.append(listen)
-
-                            if len(listens) > DUMP_CHUNK_SIZE:
-                                total_imported += len(listens)
-                                self.insert(listens)
-                                listens = []
-
-            if len(listens) > 0:
-                total_imported += len(listens)
-                self.insert(listens)
-
-        if not schema_checked:
-            raise SchemaMismatchException("SCHEMA_SEQUENCE file missing FROM listen dump.")
+        try:
+            with tarfile.open(fileobj=xz.stdout, mode='r|') as tar:
+                lines = []
+                for member in tar:
+                    if member.name.endswith('SCHEMA_SEQUENCE'):
+                        self.log.info(
+                            'Checking if schema version of dump matches...')
+                        schema_seq = int(tar.extractfile(
+                            member).read().strip() or '-1')
+                        if schema_seq != LISTENS_DUMP_SCHEMA_VERSION:
+                            raise SchemaMismatchException('Incorrect schema version! Expected: %d, got: %d.'
+                                                          'Please ensure that the data dump version matches the code version'
+                                                          'in order to import the data.'
+                                                          % (LISTENS_DUMP_SCHEMA_VERSION, schema_seq))
+                        schema_checked = True
+
+                    if member.name.endswith(".listens"):
+                        if not schema_checked:
+                            raise SchemaMismatchException("SCHEMA_SEQUENCE file missing FROM listen dump.")
+
+                        # tarf, really? That's the name you're going with? Yep.
+                        with tar.extractfile(member) as tarf:
+                            while True:
+                                line = tarf.readline()
+                                if not line:
+                                    break
+
+                                lines.append(line)
+
+                                if len(lines) > DUMP_CHUNK_SIZE:
+                                    total_imported += len(lines)
+                                    process_lines(lines)
+                                    lines = []
+
+                if len(lines) > 0:
+                    total_imported += len(lines)
+                    process_lines(lines)
+
+            if not schema_checked:
+                raise SchemaMismatchException("SCHEMA_SEQUENCE file missing FROM listen dump.")
+
+            if importer:
+                importer.finish()
+        except Exception:
+            if importer:
+                importer.terminate()
+            raise
+        finally:
+            xz.stdout.close()
+
+        if defer_user_metadata:
+            self.log.info('Recalculating listen counts and timestamps for all users...')
+            # imported here to avoid a circular import
+            from listenbrainz.listenstore.timescale_utils import recalculate_all_user_data
+            recalculate_all_user_data()
 
         self.log.info('Import of listens from dump %s done!', archive_path)
-        xz.stdout.close()
 
         return total_imported
 
@@ -683,3 +952,108 @@ class TimescaleListenStore:
 
 class TimescaleListenStoreException(Exception):
     pass
+
+
+def _import_listens_worker(ls: TimescaleListenStore, chunks: multiprocessing.Queue,
+                           results: multiprocessing.Queue, update_user_metadata: bool):
+    """ Parse and insert chunks of listen dump lines until a None chunk is received. Each worker process
+     opens its own connections to timescale. """
+    while True:
+        lines = chunks.get()
+        if lines is None:
+            break
+        listens = [Listen.from_json(orjson.loads(line)) for line in lines]
+        ls.insert_copy(listens, update_user_metadata=update_user_metadata)
+        results.put(len(listens))
+
+
+class ParallelListensImporter:
+    """ Distributes chunks of listen dump lines to a pool of worker processes which insert them
+    into timescale, and logs the import progress and throughput.
+
+    Args:
+        ls: the listenstore to insert listens with
+        workers: the number of worker processes to start
+        update_user_metadata: whether to update listen_user_metadata while inserting listens
+    """
+
+    # seconds to wait for space in the queue before checking whether all workers are still alive
+    QUEUE_PUT_TIMEOUT = 10
+    PROGRESS_LOG_INTERVAL = 60  # seconds
+
+    def __init__(self, ls: TimescaleListenStore, workers: int, update_user_metadata: bool):
+        self.log = ls.log
+        # fork so that the workers inherit the initialized timescale engine. if the engine pools connections,
+        # the children drop the inherited ones after the fork (see listenbrainz.db.pool) so no connection
+        # is shared between processes.
+        context = multiprocessing.get_context("fork")
+        # bounded so that decompression doesn't run ahead of the inserts and fill up memory
+        self.chunks = context.Queue(maxsize=workers * 2)
+        self.results = context.Queue()
+        self.processes = [
+            context.Process(target=_import_listens_worker, args=(ls, self.chunks, self.results, update_user_metadata))
+            for _ in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+
+        self.submitted = 0
+        self.imported = 0
+        self.started = time.monotonic()
+        self.next_progress_log = self.started + self.PROGRESS_LOG_INTERVAL
+
+    def _check_workers(self):
+        for process in self.processes:
+            if process.exitcode is not None and process.exitcode != 0:
+                raise TimescaleListenStoreException(
+                    "Listen import worker %d exited with code %d" % (process.pid, process.exitcode)
+                )
+
+    def _collect_results(self):
+        while True:
+            try:
+                self.imported += self.results.get_nowait()
+            except queue.Empty:
+                break
+
+    def log_progress(self):
+        self._collect_results()
+        elapsed = time.monotonic() - self.started
+        self.log.info("Imported %d listens in %.0fs (%.0f listens/s), %d listens read from dump",
+                      self.imported, elapsed, self.imported / elapsed if elapsed else 0, self.submitted)
+
+    def _put(self, item):
+        """ Put an item in the chunks queue, blocking while the queue is full. Raises an exception if a worker
+        has died, otherwise the queue might never have space again. """
+        while True:
+            try:
+                self.chunks.put(item, timeout=self.QUEUE_PUT_TIMEOUT)
+                return
+            except queue.Full:
+                self._check_workers()
+
+    def submit(self, lines: list[bytes]):
+        """ Queue a chunk of listen lines for import, blocking while the queue is full. """
+        self._put(lines)
+        self.submitted += len(lines)
+        if time.monotonic() > self.next_progress_log:
+            self.next_progress_log += self.PROGRESS_LOG_INTERVAL
+            self.log_progress()
+
+    def finish(self):
+        """ Wait for the workers to insert all the queued listens. """
+        for _ in self.processes:
+            self._put(None)
+        for process in self.processes:
+            # drain results while waiting so that the workers don't block on a full pipe when exiting
+            while process.is_alive():
+                self._collect_results()
+                process.join(timeout=1)
+        self._check_workers()
+        self.log_progress()
+
+    def terminate(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
@@ -9,6 +9,7 @@ from sqlalchemy import text
 
 from listenbrainz import db
 from listenbrainz.db import timescale
+from listenbrainz.webserver import redis_connection
 
 logger = logging.getLogger(__name__)
 
@@ -188,6 +189,7 @@ def delete_listens():
               FROM calculate_new_ts mt
              WHERE lm.user_id = mt.user_id
     """
+    select_user_ids = "SELECT DISTINCT user_id FROM listen_delete_metadata WHERE id <= :max_id"
     delete_user_metadata = "DELETE FROM listen_delete_metadata WHERE id <= :max_id"
 
     with timescale.engine.begin() as connection:
@@ -201,6 +203,9 @@ def delete_listens():
         max_id = row.max_id
         logger.info("Found max id in listen_delete_metadata table: %s", max_id)
 
+        result = connection.execute(text(select_user_ids), {"max_id": max_id})
+        user_ids = [r.user_id for r in result]
+
         logger.info("Deleting Listens and updating affected listens counts")
         connection.execute(text(delete_listens_and_update_listen_counts), {"max_id": max_id})
 
@@ -215,6 +220,8 @@ def delete_listens():
 
         logger.info("Completed deleting listens and updating affected metadata")
 
+    redis_connection._redis.invalidate_recent_listens_for_users(user_ids)
+
 
 def update_user_listen_data():
     """ Scan listens created since last run and update metadata in listen_user_metadata accordingly """
@@ -238,6 +245,7 @@ def update_user_listen_data():
              , created = :until
           FROM new
          WHERE old.user_id = new.user_id
+     RETURNING old.user_id
     """
     # There is something weird going on here, I do not completely understand why but using engine.connect instead
     # of engine.begin causes the changes to not be persisted. Reading up on sqlalchemy transaction handling etc.
@@ -245,9 +253,14 @@ def update_user_listen_data():
     # in remaining LB is beyond me then.
     with timescale.engine.begin() as connection:
         logger.info("Starting to update listen counts")
-        connection.execute(text(query), {"until": datetime.now()})
+        result = connection.execute(text(query), {"until": datetime.now()})
+        user_ids = [r.user_id for r in result]
         logger.info("Completed updating listen counts")
 
+    # the latest listens returned by fetch_listens are bounded by max_listened_at, so the recent listens
+    # of users with new listens may only change now
+    redis_connection._redis.invalidate_recent_listens_for_users(user_ids)
+
 
 def delete_listens_and_update_user_listen_data():
     """ Delete listens and update user metadata to reflect deleted listens and listens created since last run """
@@ -290,6 +303,8 @@ def add_missing_to_listen_users_metadata():
         connection.rollback()
         logger.error("Error while resetting created timestamps:", exc_info=True)
         raise
+    finally:
+        connection.close()
 
 
 def recalculate_all_user_data():
@@ -326,6 +341,8 @@ def recalculate_all_user_data():
         connection.rollback()
         logger.error("Error while resetting created timestamps:", exc_info=True)
         raise
+    finally:
+        connection.close()
 
     try:
         update_user_listen_data()
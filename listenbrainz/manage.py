@@ -280,6 +280,43 @@ def add_missing_to_listen_users_metadata():
         ts_add_missing_to_listen_users_metadata()
 
 
+@cli.command(name="benchmark_listen_insert")
+@click.option("--count", "-c", type=int, default=100000, show_default=True, help="Number of listens to insert per path.")
+@click.option("--batch-size", "-b", type=int, default=2000, show_default=True, help="Number of listens per insert.")
+@click.option("--user-id", type=int, default=-1000, show_default=True,
+              help="User id to insert listens for, user_id + 1 is also used. Must not belong to a real user.")
+def benchmark_listen_insert(count, batch_size, user_id):
+    """ Compare the INSERT and binary COPY listen insert paths. Inserts synthetic listens into the
+    configured timescale database and deletes them afterwards. """
+    application = webserver.create_app()
+    with application.app_context():
+        from listenbrainz.listenstore.benchmark import benchmark_insert
+        from listenbrainz.webserver import timescale_connection
+        results = benchmark_insert(timescale_connection._ts, count, batch_size, user_id)
+        for name, rate in results.items():
+            print(f"{name}: {rate:.0f} listens/s")
+
+
+@cli.command(name="benchmark_recent_listens")
+@click.option("--follow-count", "-f", "follow_counts", type=int, multiple=True, default=[10, 100, 500, 1000],
+              show_default=True, help="Number of followed users to fetch recent listens for, can be repeated.")
+@click.option("--listens-per-user", "-l", type=int, default=5000, show_default=True,
+              help="Number of listens of the most active synthetic user.")
+@click.option("--user-id", type=int, default=-1000, show_default=True,
+              help="Highest user id of the synthetic users, the ids below it are also used. Must not belong to real users.")
+def benchmark_recent_listens(follow_counts, listens_per_user, user_id):
+    """ Measure fetching the recent listens of followed users for the feed. Inserts synthetic listens into
+    the configured timescale database and deletes them afterwards. """
+    application = webserver.create_app()
+    with application.app_context():
+        from listenbrainz.listenstore.benchmark import benchmark_recent_listens as benchmark
+        from listenbrainz.webserver import timescale_connection
+        results = benchmark(timescale_connection._ts, list(follow_counts), listens_per_user, user_id)
+        for follow_count, timings in results.items():
+            for name, elapsed in timings.items():
+                print(f"{follow_count} users, {name}: {elapsed * 1000:.1f} ms")
+
+
 @cli.command()
 @click.option("-u", "--user", type=str)
 @click.option("-t", "--token", type=str)
@@ -339,6 +376,31 @@ def update_msid_tables():
         update_msids_from_mapping.run_all_updates()
 
 
+@cli.command()
+def invalidate_msid_caches():
+    """ Make all running timescale writers drop their cached msids. Run this after changing msids in
+    messybrainz.submissions or messybrainz.submissions_redirect. """
+    with create_app().app_context():
+        from listenbrainz.timescale_writer.msid_cache import invalidate_all_msid_caches
+        invalidate_all_msid_caches()
+
+
+@cli.command()
+@click.option("--entity", type=click.Choice(["recording", "artist"]), multiple=True, default=["recording", "artist"],
+              help="The entities to build the similarity index of.")
+def build_similarity_index(entity):
+    """ Build the similarity indexes from the embeddings stored in the database. The spark reader builds them
+    when new embeddings are imported, use this to build them on other hosts sharing the database. """
+    with create_app().app_context():
+        from listenbrainz.db import similarity_index
+        conn = ts.engine.raw_connection()
+        try:
+            for name in entity:
+                similarity_index.build_index_from_table(conn, name, "similarity", f"{name}_embedding")
+        finally:
+            conn.close()
+
+
 @cli.command()
 def clear_expired_do_not_recommends():
     """ Delete expired do not recommend entries from database """
@@ -90,102 +90,105 @@ def process_listens(app, listens, priority):
         return stats
 
     conn = timescale.engine.raw_connection()
-    with conn.cursor() as curs:
-        try:
-            # Try an exact lookup (in postgres) first.
-            matches, remaining_listens, stats = lookup_listens(
-                app, listens_to_check, stats, True, debug)
-
-            # For all remaining listens, do a fuzzy lookup.
-            if remaining_listens:
-                new_matches, remaining_listens, stats = lookup_listens(
-                    app, remaining_listens, stats, False, debug)
-                matches.extend(new_matches)
-
-            if priority == NEW_LISTEN:
-                stats["listens_matched"] += len(matches)
-
-            # For all listens that are not matched, enter a no match entry, so we don't
-            # keep attempting to look up more listens.
-            for listen in remaining_listens:
-                matches.append((listen['recording_msid'], None, None, None, None, None, None, None, MATCH_TYPES[0]))
-                stats['no_match'] += 1
-
-            stats["processed"] += len(matches)
-
-            metadata_query = """
-                INSERT INTO mbid_mapping_metadata AS mbid
-                          ( recording_mbid
-                          , release_mbid
-                          , release_name
-                          , artist_mbids
-                          , artist_credit_id
-                          , artist_credit_name
-                          , recording_name
-                          , last_updated
-                          )
-                     VALUES
-                          ( %s::UUID
-                          , %s::UUID
-                          , %s
-                          , %s::UUID[]
-                          , %s
-                          , %s
-                          , %s
-                          , now()
-                          )
-                ON CONFLICT (recording_mbid) DO UPDATE
-                        SET release_mbid = EXCLUDED.release_mbid
-                          , release_name = EXCLUDED.release_name
-                          , artist_mbids = EXCLUDED.artist_mbids
-                          , artist_credit_id = EXCLUDED.artist_credit_id
-                          , artist_credit_name = EXCLUDED.artist_credit_name
-                          , recording_name = EXCLUDED.recording_name
-                          , last_updated = now()
-            """
-
-            mapping_query = """
-                INSERT INTO mbid_mapping AS m(recording_msid, recording_mbid, match_type, last_updated, check_again)
-                     VALUES (
-                            %(recording_msid)s::UUID
-                          , %(recording_mbid)s::UUID
-                          , %(match_type)s
-                          , now()
-                          -- inserting msid for first time, check again with gap of 1 day
-                          , CASE %(match_type)s WHEN 'no_match' THEN now() + INTERVAL '1 day' ELSE NULL END
-                            )
-                ON CONFLICT (recording_msid) DO UPDATE
-                        SET recording_msid = EXCLUDED.recording_msid
-                          , recording_mbid = EXCLUDED.recording_mbid
-                          , match_type = EXCLUDED.match_type
-                          , last_updated = now()
-                          -- rechecked msid already, if still no match found then check again after twice the previous interval time
-                          , check_again = CASE EXCLUDED.match_type WHEN 'no_match' THEN now() + least((m.check_again - m.last_updated) * 2, INTERVAL '32 days') ELSE NULL END
-            """
-
-            # Finally insert matches to PG
-            for match in matches:
-                # Insert/update the metadata row
-                if match[1] is not None:
-                    curs.execute(metadata_query, match[1:8])
-
-                # Insert the mapping row
-                curs.execute(
-                    mapping_query,
-                    {"recording_msid": match[0], "recording_mbid": match[1], "match_type": match[8]}
-                )
-
-        except psycopg2.errors.CardinalityViolation:
-            app.logger.error("CardinalityViolation on insert to mbid mapping\n", exc_info=True)
-            conn.rollback()
-            return
-
-        except (psycopg2.OperationalError, psycopg2.errors.DatatypeMismatch) as err:
-            app.logger.info("Cannot insert MBID mapping rows. (%s)" % str(err))
-            conn.rollback()
-            return
-
-    conn.commit()
+    try:
+        with conn.cursor() as curs:
+            try:
+                # Try an exact lookup (in postgres) first.
+                matches, remaining_listens, stats = lookup_listens(
+                    app, listens_to_check, stats, True, debug)
+
+                # For all remaining listens, do a fuzzy lookup.
+                if remaining_listens:
+                    new_matches, remaining_listens, stats = lookup_listens(
+                        app, remaining_listens, stats, False, debug)
+                    matches.extend(new_matches)
+
+                if priority == NEW_LISTEN:
+                    stats["listens_matched"] += len(matches)
+
+                # For all listens that are not matched, enter a no match entry, so we don't
+                # keep attempting to look up more listens.
+                for listen in remaining_listens:
+                    matches.append((listen['recording_msid'], None, None, None, None, None, None, None, MATCH_TYPES[0]))
+                    stats['no_match'] += 1
+
+                stats["processed"] += len(matches)
+
+                metadata_query = """
+                    INSERT INTO mbid_mapping_metadata AS mbid
+                              ( recording_mbid
+                              , release_mbid
+                              , release_name
+                              , artist_mbids
+                              , artist_credit_id
+                              , artist_credit_name
+                              , recording_name
+                              , last_updated
+                              )
+                         VALUES
+                              ( %s::UUID
+                              , %s::UUID
+                              , %s
+                              , %s::UUID[]
+                              , %s
+                              , %s
+                              , %s
+                              , now()
+                              )
+                    ON CONFLICT (recording_mbid) DO UPDATE
+                            SET release_mbid = EXCLUDED.release_mbid
+                              , release_name = EXCLUDED.release_name
+                              , artist_mbids = EXCLUDED.artist_mbids
+                              , artist_credit_id = EXCLUDED.artist_credit_id
+                              , artist_credit_name = EXCLUDED.artist_credit_name
+                              , recording_name = EXCLUDED.recording_name
+                              , last_updated = now()
+                """
+
+                mapping_query = """
+                    INSERT INTO mbid_mapping AS m(recording_msid, recording_mbid, match_type, last_updated, check_again)
+                         VALUES (
+                                %(recording_msid)s::UUID
+                              , %(recording_mbid)s::UUID
+                              , %(match_type)s
+                              , now()
+                              -- inserting msid for first time, check again with gap of 1 day
+                              , CASE %(match_type)s WHEN 'no_match' THEN now() + INTERVAL '1 day' ELSE NULL END
+                                )
+                    ON CONFLICT (recording_msid) DO UPDATE
+                            SET recording_msid = EXCLUDED.recording_msid
+                              , recording_mbid = EXCLUDED.recording_mbid
+                              , match_type = EXCLUDED.match_type
+                              , last_updated = now()
+                              -- rechecked msid already, if still no match found then check again after twice the previous interval time
+                              , check_again = CASE EXCLUDED.match_type WHEN 'no_match' THEN now() + least((m.check_again - m.last_updated) * 2, INTERVAL '32 days') ELSE NULL END
+                """
+
+                # Finally insert matches to PG
+                for match in matches:
+                    # Insert/update the metadata row
+                    if match[1] is not None:
+                        curs.execute(metadata_query, match[1:8])
+
+                    # Insert the mapping row
+                    curs.execute(
+                        mapping_query,
+                        {"recording_msid": match[0], "recording_mbid": match[1], "match_type": match[8]}
+                    )
+
+            except psycopg2.errors.CardinalityViolation:
+                app.logger.error("CardinalityViolation on insert to mbid mapping\n", exc_info=True)
+                conn.rollback()
+                return
+
+            except (psycopg2.OperationalError, psycopg2.errors.DatatypeMismatch) as err:
+                app.logger.info("Cannot insert MBID mapping rows. (%s)" % str(err))
+                conn.rollback()
+                return
+
+        conn.commit()
+    finally:
+        conn.close()
 
     return stats
 
@@ -1,8 +1,7 @@
 import uuid
 from typing import Iterable
 
-import sqlalchemy
-import sqlalchemy.exc
+from psycopg2.errors import UniqueViolation
 from psycopg2.extras import execute_values
 from sqlalchemy import text
 
@@ -16,8 +15,7 @@ def submit_listens_and_sing_me_a_sweet_song(recordings):
     Args:
         recordings: a list of recordings to be inserted
     Returns:
-        A dict with key 'payload' and value set to a list of dicts containing the
-        recording data for each inserted recording.
+        a list of msids, in the same order as the recordings
     """
     for r in recordings:
         if "artist" not in r or "title" not in r:
@@ -30,9 +28,10 @@ def submit_listens_and_sing_me_a_sweet_song(recordings):
             with timescale.engine.connect() as connection:
                 data = insert_all_in_transaction(connection, recordings)
                 success = True
-        except sqlalchemy.exc.IntegrityError:
-            # If we get an IntegrityError then our transaction failed.
-            # We should try again
+        except UniqueViolation:
+            # the queries run on the raw psycopg2 cursor, so a collision of a newly generated msid with an
+            # existing one surfaces as a psycopg2 error. the transaction is rolled back when the connection
+            # is closed, try again with new msids.
             pass
 
         attempts += 1
@@ -46,25 +45,100 @@ def submit_listens_and_sing_me_a_sweet_song(recordings):
 def insert_all_in_transaction(ts_conn, submissions: list[dict]):
     """ Inserts a list of recordings into MessyBrainz.
 
+    All submissions are resolved to msids in a single lookup query and all the missing ones are
+    inserted using a single multi-row INSERT, see get_or_create_msids for details.
+
     Args:
         ts_conn: timescale database connection
         submissions: a list of recordings to be inserted
     Returns:
-        A list of dicts containing the recording data for each inserted recording
+        a list of msids, in the same order as the submissions
+    """
+    ret = get_or_create_msids(ts_conn, submissions)
+    # the queries are run on the raw cursor so commit on the dbapi connection, sqlalchemy's
+    # transaction isn't begun in this case and ts_conn.commit() would be a no-op.
+    ts_conn.connection.commit()
+    return ret
+
+
+def get_or_create_msids(ts_conn, submissions: list[dict]) -> list[str]:
+    """ Resolve msids for a batch of submissions, creating new msids for the ones not present in the db.
+
+    The lookup uses the same matching rules as get_msid: text fields are compared case-insensitively,
+    NULLs match NULLs and in case of duplicates the earliest submitted MSID is returned. Submissions
+    missing from the db that only differ in case from each other within the batch are assigned the same
+    new msid, same as if they had been submitted one after the other.
+
+    Args:
+        ts_conn: timescale database connection
+        submissions: a list of recordings to lookup
+    Returns:
+        a list of msids, in the same order as the submissions
+    """
+    if not submissions:
+        return []
+
+    lookup_query = """
+        WITH data (idx, recording, artist_credit, release, track_number, duration) AS (VALUES %s)
+            SELECT DISTINCT ON (idx)
+                   idx
+                 , lower(d.recording) AS recording
+                 , lower(d.artist_credit) AS artist_credit
+                 , lower(d.release) AS release
+                 , lower(d.track_number) AS track_number
+                 , d.duration
+                 , s.gid::TEXT AS gid
+              FROM data d
+         LEFT JOIN messybrainz.submissions s
+                ON lower(s.recording) = lower(d.recording)
+               AND lower(s.artist_credit) = lower(d.artist_credit)
+               -- NULL = NULL is NULL and not true so we need to handle NULLABLE fields separately
+               AND ((lower(s.release) = lower(d.release)) OR (s.release IS NULL AND d.release IS NULL))
+               AND ((lower(s.track_number) = lower(d.track_number)) OR (s.track_number IS NULL AND d.track_number IS NULL))
+               AND ((s.duration = d.duration) OR (s.duration IS NULL AND d.duration IS NULL))
+          -- return the earliest submitted MSID of all matching ones, see get_msid for why duplicates exist
+          ORDER BY idx, s.submitted
     """
-    ret = []
-    for submission in submissions:
-        result = submit_recording(
-            ts_conn,
+    values = [
+        (
+            idx,
             submission["title"],
             submission["artist"],
             submission.get("release"),
             submission.get("track_number"),
             submission.get("duration")
         )
-        ret.append(result)
-    ts_conn.commit()
-    return ret
+        for idx, submission in enumerate(submissions)
+    ]
+    template = "(%s, %s, %s, %s, %s, %s::INTEGER)"
+
+    msids = [None] * len(submissions)
+    # new msids keyed by the lowercased submission as computed by postgres, to keep the batch consistent
+    # with the case-insensitive matching done by the lookup
+    new_msids = {}
+    to_insert = []
+    with ts_conn.connection.cursor() as curs:
+        results = execute_values(curs, lookup_query, values, template, page_size=len(values), fetch=True)
+        for idx, recording, artist_credit, release, track_number, duration, gid in results:
+            if gid is not None:
+                msids[idx] = gid
+                continue
+
+            key = (recording, artist_credit, release, track_number, duration)
+            if key not in new_msids:
+                new_msids[key] = str(uuid.uuid4())
+                to_insert.append((new_msids[key], *values[idx][1:]))
+            msids[idx] = new_msids[key]
+
+        if to_insert:
+            insert_query = """
+                INSERT INTO messybrainz.submissions (gid, recording, artist_credit, release, track_number, duration)
+                     VALUES %s
+            """
+            execute_values(curs, insert_query, to_insert, "(%s::UUID, %s, %s, %s, %s, %s::INTEGER)",
+                           page_size=len(to_insert))
+
+    return msids
 
 
 def get_msid(connection, recording, artist, release=None, track_number=None, duration=None):
@@ -15,7 +15,9 @@
 # You should have received a copy of the GNU General Public License along
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA)
+import uuid
 from datetime import datetime, timedelta
+from unittest.mock import patch
 
 from psycopg2.extras import DictCursor
 from sqlalchemy import text
@@ -150,3 +152,45 @@ class DataTestCase(TimescaleTestCase):
         }
 
         self.assertDictEqual(expected, received)
+
+    def test_insert_all_in_transaction_bulk(self):
+        """ Test that existing msids are reused, case variants in the same batch get the same new msid
+         and the returned msids are in submission order """
+        with timescale.engine.begin() as connection:
+            existing_msid = messybrainz.submit_recording(connection, "Pretty Sweet", "Frank Ocean", "Blond")
+
+        submissions: list[dict] = [
+            {'artist': 'Frank Ocean', 'title': 'Nikes', 'release': 'Blond', 'duration': 314000},
+            {'artist': 'FRANK OCEAN', 'title': 'pretty sweet', 'release': 'BLOND'},
+            {'artist': 'frank ocean', 'title': 'NIKES', 'release': 'blond', 'duration': 314000},
+            {'artist': 'Frank Ocean', 'title': 'Nikes', 'release': 'Blond'},
+        ]
+        msids = messybrainz.insert_all_in_transaction(self.ts_conn, submissions)
+
+        self.assertEqual(len(msids), 4)
+        self.assertEqual(msids[1], existing_msid)
+        self.assertEqual(msids[0], msids[2])
+        self.assertNotEqual(msids[0], msids[3])
+        self.assertNotEqual(msids[0], existing_msid)
+
+        with timescale.engine.connect() as connection:
+            self.assertEqual(
+                messybrainz.get_msid(connection, "Nikes", "Frank Ocean", "Blond", duration=314000),
+                msids[0]
+            )
+            self.assertEqual(messybrainz.get_msid(connection, "Nikes", "Frank Ocean", "Blond"), msids[3])
+            count = connection.execute(text("SELECT count(*) FROM messybrainz.submissions")).scalar()
+            self.assertEqual(count, 3)
+
+    def test_submit_retries_on_msid_collision(self):
+        with timescale.engine.begin() as connection:
+            existing_msid = messybrainz.submit_recording(connection, "Pretty Sweet", "Frank Ocean", "Blond")
+
+        new_msid = uuid.uuid4()
+        # the first generated msid collides with the existing one, the second attempt uses a new msid
+        with patch("listenbrainz.messybrainz.uuid.uuid4", side_effect=[uuid.UUID(existing_msid), new_msid]):
+            msids = messybrainz.submit_listens_and_sing_me_a_sweet_song([{"artist": "Frank Ocean", "title": "Nikes"}])
+
+        self.assertEqual(msids, [str(new_msid)])
+        with timescale.engine.connect() as connection:
+            self.assertEqual(messybrainz.get_msid(connection, "Nikes", "Frank Ocean"), str(new_msid))
@@ -0,0 +1,190 @@
+""" Dispatch the messages received by the spark reader to a pool of worker threads.
+
+Messages of bulk datasets have to be processed in the order they were sent: the start message sets up the tables or
+databases that the data messages are inserted into and the end message finalizes them. Related messages share an
+ordering key and messages with the same key are processed one at a time, in the order they were received. Messages
+with different keys are processed concurrently, within the per message type concurrency limits so that a flood of
+messages of one type cannot occupy all the workers.
+"""
+import threading
+import time
+from collections import defaultdict, deque, Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Any
+
+from listenbrainz.webserver import close_connections
+
+# maximum number of messages of a type processed at the same time, types not listed here are only limited by the
+# number of workers. the stats of different ranges and entities are written to different couchdb databases and
+# can be processed concurrently, limit those so that the other messages always find a free worker.
+CONCURRENCY_LIMITS = {
+    "user_entity": 2,
+    "entity_listener": 1,
+    "user_listening_activity": 1,
+    "user_daily_activity": 1,
+    "sitewide_entity": 1,
+    "sitewide_listening_activity": 1,
+}
+
+# message types that finish the run of a dataset of another type, and so have to be processed after all the messages
+# of that dataset. the handler of the mail creates the troi playlists from the stored recommendations.
+FINAL_MESSAGE_TYPES = {
+    "cf_recommendations_recording_mail": "cf_recommendations_recording_recommendations",
+}
+
+
+def get_ordering_key(response):
+    """ Get the key of the messages which need to be processed in order with this message.
+
+    The messages of couchdb datasets are ordered by the database they are written to, the start and end messages of
+    other datasets share the key of their data messages.
+    """
+    database = response.get("database")
+    if database:
+        return f"database:{database}"
+    message_type = response["type"]
+    if message_type in FINAL_MESSAGE_TYPES:
+        return FINAL_MESSAGE_TYPES[message_type]
+    for suffix in ("_start", "_end"):
+        if message_type.endswith(suffix):
+            return message_type.removesuffix(suffix)
+    return message_type
+
+
+class PendingMessage(NamedTuple):
+    message: Any
+    response: dict
+    received_at: float
+
+
+class MessageDispatcher:
+    """ Process messages on a pool of threads, keeping the order of the messages which share an ordering key.
+
+    The handler is called with the decoded message in an app context of its own, whose database connections are
+    closed afterwards. Processed messages are collected and returned by get_processed so that the consumer thread,
+    which owns the channel, can acknowledge them.
+    """
+
+    def __init__(self, app, handler, workers, concurrency_limits=None):
+        self.app = app
+        self.handler = handler
+        self.workers = workers
+        self.concurrency_limits = CONCURRENCY_LIMITS if concurrency_limits is None else concurrency_limits
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="spark_reader")
+
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.lanes = defaultdict(deque)  # ordering key -> messages waiting to be processed, head is processed first
+        self.active = set()  # ordering keys of the lanes whose head message is being processed
+        self.running = Counter()  # message type -> number of messages being processed
+        self.processed = []  # messages processed since the last call to get_processed
+
+        self.processed_count = Counter()
+        self.processing_time = Counter()
+        self.max_queue_lag = 0.0
+        self.metrics_since = time.monotonic()
+
+    def submit(self, message, response):
+        """ Queue a decoded message for processing. """
+        key = get_ordering_key(response)
+        with self.lock:
+            self.lanes[key].append(PendingMessage(message, response, time.monotonic()))
+            self._schedule()
+
+    def _schedule(self):
+        """ Start processing the head message of the idle lanes, as far as the concurrency limits allow.
+        Must be called with the lock held. """
+        for key, lane in self.lanes.items():
+            if key in self.active or not lane:
+                continue
+            message_type = lane[0].response["type"]
+            if self.running[message_type] >= self.concurrency_limits.get(message_type, self.workers):
+                continue
+            self.active.add(key)
+            self.running[message_type] += 1
+            self.executor.submit(self._process, key, lane[0])
+
+    def _process(self, key, pending: PendingMessage):
+        started_at = time.monotonic()
+        try:
+            with self.app.app_context():
+                try:
+                    self.handler(pending.response)
+                finally:
+                    # the connections of the app context are not closed when it is popped
+                    close_connections()
+        except Exception:
+            self.app.logger.error("Error in the spark reader worker:", exc_info=True)
+        finally:
+            finished_at = time.monotonic()
+            message_type = pending.response["type"]
+            with self.lock:
+                lane = self.lanes[key]
+                lane.popleft()
+                if not lane:
+                    del self.lanes[key]
+                self.active.discard(key)
+                self.running[message_type] -= 1
+                self.processed.append(pending.message)
+
+                self.processed_count[message_type] += 1
+                self.processing_time[message_type] += finished_at - started_at
+                self.max_queue_lag = max(self.max_queue_lag, started_at - pending.received_at)
+
+                self._schedule()
+                if not self.active:
+                    self.idle.notify_all()
+
+    def get_processed(self):
+        """ Return the messages processed since the last call, in the order they were finished. """
+        with self.lock:
+            processed, self.processed = self.processed, []
+        return processed
+
+    def get_metrics(self):
+        """ Return the queue lag and per message type throughput since the last call. """
+        now = time.monotonic()
+        with self.lock:
+            elapsed = max(now - self.metrics_since, 1e-6)
+            oldest = min((lane[0].received_at for lane in self.lanes.values() if lane), default=now)
+            metrics = {
+                "pending_count": sum(len(lane) for lane in self.lanes.values()),
+                "running_count": len(self.active),
+                "max_queue_lag": max(self.max_queue_lag, now - oldest),
+            }
+            for message_type, count in self.processed_count.items():
+                metrics[f"{message_type}_processed_count"] = count
+                metrics[f"{message_type}_messages_per_second"] = count / elapsed
+                metrics[f"{message_type}_avg_processing_time"] = self.processing_time[message_type] / count
+
+            self.processed_count.clear()
+            self.processing_time.clear()
+            self.max_queue_lag = 0.0
+            self.metrics_since = now
+        return metrics
+
+    def reset(self, timeout=None):
+        """ Drop the messages that have not been started and wait for the running ones to finish.
+
+        Used when the connection to the queue is lost, the messages which were not acknowledged are redelivered
+        on the new connection so the dropped messages will be received again.
+        """
+        with self.lock:
+            for key in list(self.lanes):
+                lane = self.lanes[key]
+                head = lane[0] if key in self.active else None
+                lane.clear()
+                if head is None:
+                    del self.lanes[key]
+                else:
+                    lane.append(head)
+            self.idle.wait_for(lambda: not self.active, timeout=timeout)
+            self.processed = []
+
+    def wait(self, timeout=None):
+        """ Wait until all the submitted messages have been processed. """
+        with self.lock:
+            return self.idle.wait_for(lambda: not self.lanes, timeout=timeout)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -298,10 +298,12 @@ def cf_recording_recommendations_complete(data):
 
     active_user_count = data['active_user_count']
     total_time = data['total_time']
+    stage_times = data.get('stage_times', {})
     send_mail(
         subject='Recommendations have been generated and pushed to the queue.',
         text=render_template('emails/cf_recording_recommendation_notification.txt',
-                             active_user_count=active_user_count, total_time=total_time),
+                             active_user_count=active_user_count, total_time=total_time,
+                             stage_times=stage_times),
         recipients=['listenbrainz-observability@metabrainz.org'],
         from_name='ListenBrainz',
         from_addr='noreply@'+current_app.config['MAIL_FROM_DOMAIN'],
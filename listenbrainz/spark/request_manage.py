@@ -118,6 +118,17 @@ def request_user_stats(type_, range_, entity, database):
     send_request_to_spark_cluster(f"stats.user.{type_}", **params)
 
 
+@cli.command(name="request_all_user_stats")
+@click.option("--range", 'range_', type=click.Choice(ALLOWED_STATISTICS_RANGE),
+              help="Time range of statistics to calculate", required=True)
+def request_all_user_stats(range_):
+    """ Send a request to calculate the entity, listening activity and daily activity stats of all users
+    for the range in a single job to the spark cluster
+    """
+    database_suffix = date.today().strftime("%Y%m%d")
+    send_request_to_spark_cluster("stats.user.all", stats_range=range_, database_suffix=database_suffix)
+
+
 @cli.command(name="request_sitewide_stats")
 @click.option("--type", 'type_', type=click.Choice(['entity', 'listening_activity']),
               help="Type of statistics to calculate", required=True)
@@ -332,12 +343,15 @@ def request_model(rank, itr, lmbda, alpha, use_transformed_listencounts):
 @click.option("--raw", type=int, default=1000, help="Generate given number of raw recommendations")
 @click.option("--user-name", 'users', callback=parse_list, default=[], multiple=True,
               help="Generate recommendations for given users. Generate recommendations for all users by default.")
-def request_recommendations(raw, users):
+@click.option("--blocked", is_flag=True, default=False,
+              help="Score the recordings for each user using broadcast blocks of the model's item factors.")
+def request_recommendations(raw, users, blocked):
     """ Send the cluster a request to generate recommendations.
     """
     params = {
         'recommendation_raw_limit': raw,
-        'users': users
+        'users': users,
+        'blocked': blocked
     }
     send_request_to_spark_cluster('cf.recommendations.recording.recommendations', **params)
 
@@ -382,10 +396,12 @@ def request_import_mlhd_dump():
 
 @cli.command(name='request_similar_users')
 @click.option("--max-num-users", type=int, default=25, help="The maxiumum number of similar users to return for any given user.")
-def request_similar_users(max_num_users):
+@click.option("--mode", type=click.Choice(["sparse", "dense"]), default="sparse",
+              help="'dense' computes the full correlation matrix on the spark driver, 'sparse' distributes it.")
+def request_similar_users(max_num_users, mode):
     """ Send the cluster a request to generate similar users.
     """
-    send_request_to_spark_cluster('similarity.similar_users', max_num_users=max_num_users)
+    send_request_to_spark_cluster('similarity.similar_users', max_num_users=max_num_users, mode=mode)
 
 
 @cli.command(name="request_similar_recordings_mlhd")
@@ -469,6 +485,12 @@ def request_similar_artists(days, session, contribution, threshold, limit, skip,
     )
 
 
+@cli.command(name='request_similarity_embeddings')
+def request_similarity_embeddings():
+    """ Send the cluster a request to generate recording and artist embeddings from the latest recommendation model. """
+    send_request_to_spark_cluster("similarity.embeddings")
+
+
 @cli.command(name='request_popularity')
 @click.option("--use-mlhd", "mlhd", is_flag=True, help="Use MLHD+ data or ListenBrainz listens data")
 def request_popularity(mlhd):
@@ -561,11 +583,7 @@ def request_troi_playlists():
 def cron_request_all_stats(ctx):
     ctx.invoke(request_import_pg_tables)
     for stats_range in ALLOWED_STATISTICS_RANGE:
-        for entity in ["artists", "releases", "recordings", "release_groups"]:
-            ctx.invoke(request_user_stats, type_="entity", range_=stats_range, entity=entity)
-
-        for stat in ["listening_activity", "daily_activity"]:
-            ctx.invoke(request_user_stats, type_=stat, range_=stats_range)
+        ctx.invoke(request_all_user_stats, range_=stats_range)
 
         for entity in ["artists", "releases", "recordings", "release_groups"]:
             ctx.invoke(request_sitewide_stats, type_="entity", range_=stats_range, entity=entity)
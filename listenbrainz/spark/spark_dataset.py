@@ -8,6 +8,7 @@ from psycopg2.extras import execute_values
 from psycopg2.sql import Identifier, SQL, Literal
 
 from listenbrainz.db import couchdb, timescale
+from listenbrainz.db.binary_copy import encode_rows
 
 
 class SparkDataset(ABC):
@@ -116,6 +117,8 @@ class DatabaseDataset(SparkDataset, ABC):
         super().__init__(name)
         self.base_table_name = table_name
         self.schema = schema
+        # the connection used to import the current run of the dataset, from the start message to the end message
+        self.conn = None
 
     def _get_table_name(self, suffix=None, exclude_schema=False):
         if suffix is None:
@@ -153,6 +156,21 @@ class DatabaseDataset(SparkDataset, ABC):
         """
         raise NotImplementedError()
 
+    def get_copy_columns(self):
+        """ Return a list of (column name, encoder) tuples to bulk load the data messages of the dataset
+        with a binary COPY instead of the query returned by get_inserts, None to use that query.
+
+        The encoders are the encode_* functions in listenbrainz.db.binary_copy. The value of each column is
+        read from the item of the same name in the rows of the message's data, override get_copy_rows if the
+        data is structured differently.
+        """
+        return None
+
+    def get_copy_rows(self, message):
+        """ Return the rows of the data message to load with COPY, each row having a value per copy column. """
+        names = [name for name, _ in self.get_copy_columns()]
+        return [[row[name] for name in names] for row in message["data"]]
+
     def run_post_processing(self, cursor, message):
         """ Called after the rotate table swap is complete so that the user can execute any post processing steps. """
         pass
@@ -190,17 +208,29 @@ class DatabaseDataset(SparkDataset, ABC):
         query = SQL("DROP TABLE IF EXISTS {old_table}").format(old_table=self._get_table_name(suffix="old"))
         cursor.execute(query)
 
+    def _close_connection(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                current_app.logger.error("Error while closing the connection of dataset %s", self.name, exc_info=True)
+            self.conn = None
+
     def handle_start(self, message):
-        conn = timescale.engine.raw_connection()
+        # the previous run of the dataset may have been interrupted before its end message
+        self._close_connection()
+        self.conn = timescale.engine.raw_connection()
         try:
-            with conn.cursor() as curs:
+            with self.conn.cursor() as curs:
                 self.create_table(curs)
-            conn.commit()
-        finally:
-            conn.close()
+            self.conn.commit()
+        except Exception:
+            self._close_connection()
+            raise
 
     def handle_end(self, message):
-        conn = timescale.engine.raw_connection()
+        conn = self.conn if self.conn is not None else timescale.engine.raw_connection()
+        self.conn = None
         try:
             with conn.cursor() as curs:
                 self.create_indices(curs)
@@ -210,18 +240,47 @@ class DatabaseDataset(SparkDataset, ABC):
         finally:
             conn.close()
 
-    def handle_insert(self, message):
-        query, template, values = self.get_inserts(message)
+    def insert_rows(self, cursor, message):
+        """ Insert the data of the message in the temporary table, using COPY if the dataset supports it. """
         tmp_table = self._get_table_name("tmp")
-        query = SQL(query).format(table=tmp_table)
 
+        copy_columns = self.get_copy_columns()
+        if copy_columns is not None:
+            query = SQL("COPY {table} ({columns}) FROM STDIN WITH (FORMAT binary)").format(
+                table=tmp_table,
+                columns=SQL(", ").join(Identifier(name) for name, _ in copy_columns)
+            )
+            buffer = encode_rows(self.get_copy_rows(message), [encoder for _, encoder in copy_columns])
+            cursor.copy_expert(query, buffer)
+            return
+
+        query, template, values = self.get_inserts(message)
+        query = SQL(query).format(table=tmp_table)
         if isinstance(template, str):
             template = SQL(template)
+        execute_values(cursor, query, values, template)
+
+    def handle_insert(self, message):
+        if self.conn is None:
+            # data messages without a start message, import them using a connection of their own
+            conn = timescale.engine.raw_connection()
+            try:
+                with conn.cursor() as curs:
+                    self.insert_rows(curs, message)
+                conn.commit()
+            finally:
+                conn.close()
+            return
 
-        conn = timescale.engine.raw_connection()
         try:
-            with conn.cursor() as curs:
-                execute_values(curs, query, values, template)
-            conn.commit()
-        finally:
-            conn.close()
+            with self.conn.cursor() as curs:
+                self.insert_rows(curs, message)
+            self.conn.commit()
+        except Exception:
+            # discard the failed message, if the connection is broken the remaining messages of the run are
+            # imported using connections of their own
+            try:
+                self.conn.rollback()
+            except Exception:
+                self._close_connection()
+            raise
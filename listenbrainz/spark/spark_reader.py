@@ -3,12 +3,15 @@ import json
 import time
 
 import orjson
+import pyarrow.ipc
 import sentry_sdk
+from brainzutils import metrics
 from kombu import Connection, Message, Consumer, Exchange, Queue
 from kombu.mixins import ConsumerMixin
 
 from listenbrainz.db.popularity import get_all_popularity_datasets
-from listenbrainz.db.similarity import SimilarRecordingsDataset, SimilarArtistsDataset
+from listenbrainz.db.similarity import SimilarRecordingsDataset, SimilarArtistsDataset, \
+    RecordingEmbeddingsDataset, ArtistEmbeddingsDataset
 from listenbrainz.db.tags import TagsDataset
 from listenbrainz.spark.handlers import (
     handle_candidate_sets,
@@ -44,11 +47,29 @@ from listenbrainz.spark.handlers import (
     handle_yim_playlists,
     handle_yim_playlists_end, handle_echo
 )
+from listenbrainz.spark.dispatcher import MessageDispatcher
 from listenbrainz.spark.spark_dataset import CouchDbDataset
 from listenbrainz.utils import get_fallback_connection_name
 from listenbrainz.webserver import create_app
 
 
+# content type of the messages whose data is sent as an arrow table, see listenbrainz_spark.request_consumer
+ARROW_STREAM_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+
+# interval in seconds at which the queue lag and handler throughput metrics are submitted
+METRICS_INTERVAL = 60
+
+
+def decode_message(message: Message):
+    """ Decode a message sent by the spark request consumer. Messages are json, except for those whose data
+    is sent as an arrow table in which case the rest of the message is in the message header. """
+    if message.content_type == ARROW_STREAM_CONTENT_TYPE:
+        response = orjson.loads(message.headers["message"])
+        response["data"] = pyarrow.ipc.open_stream(message.body).read_all().to_pylist()
+        return response
+    return orjson.loads(message.body)
+
+
 class SparkReader(ConsumerMixin):
 
     def __init__(self, app):
@@ -57,13 +78,21 @@ class SparkReader(ConsumerMixin):
         self.spark_result_exchange = Exchange(app.config["SPARK_RESULT_EXCHANGE"], "fanout", durable=False)
         self.spark_result_queue = Queue(app.config["SPARK_RESULT_QUEUE"], exchange=self.spark_result_exchange,
                                         durable=True)
+        self.spark_result_control_exchange = Exchange(app.config["SPARK_RESULT_CONTROL_EXCHANGE"], "fanout",
+                                                      durable=False)
+        self.spark_result_control_queue = Queue(app.config["SPARK_RESULT_CONTROL_QUEUE"],
+                                                exchange=self.spark_result_control_exchange, durable=True)
         self.response_handlers = {}
+        self.dispatcher = None
+        self.next_metrics_submission = time.monotonic() + METRICS_INTERVAL
 
     def register_handlers(self):
         datasets = [
             CouchDbDataset,
             SimilarRecordingsDataset,
             SimilarArtistsDataset,
+            RecordingEmbeddingsDataset,
+            ArtistEmbeddingsDataset,
             TagsDataset,
             *get_all_popularity_datasets()
         ]
@@ -132,15 +161,55 @@ class SparkReader(ConsumerMixin):
     def callback(self, message: Message):
         """ Handle the data received from the queue and
             insert into the database accordingly.
+
+            The message is handed to the dispatcher to be processed on a worker thread, it is acknowledged
+            from on_iteration once processed.
         """
         self.app.logger.debug("Received a message, processing...")
-        response = orjson.loads(message.body)
-        self.process_response(response)
-        message.ack()
-        self.app.logger.debug("Done!")
+        response = decode_message(message)
+        if not isinstance(response, dict) or "type" not in response:
+            self.process_response(response)
+            message.ack()
+            return
+        self.dispatcher.submit(message, response)
+
+    def on_iteration(self):
+        """ Acknowledge the messages processed by the workers and submit the metrics. Called by the consumer
+        thread, which owns the channel, before it waits for new messages. """
+        for message in self.dispatcher.get_processed():
+            message.ack()
+
+        if time.monotonic() >= self.next_metrics_submission:
+            self.next_metrics_submission = time.monotonic() + METRICS_INTERVAL
+            dispatcher_metrics = self.dispatcher.get_metrics()
+            self.app.logger.info("Spark reader metrics: %s", dispatcher_metrics)
+            metrics.set("spark_reader", **dispatcher_metrics)
+
+    def on_connection_revived(self):
+        """ The messages that were not acknowledged on the lost connection are redelivered, so drop those
+        which have not been processed yet. """
+        self.dispatcher.reset()
 
     def get_consumers(self, _, channel):
-        return [Consumer(channel, queues=[self.spark_result_queue], on_message=lambda msg: self.callback(msg))]
+        """ The results of requests with a single message are received from the control queue, those of the other
+        requests from the result queue, see listenbrainz_spark.request_consumer. The prefetch count applies to each
+        consumer, so the single messages are still delivered while the prefetch window of the result queue is
+        full of the messages of bulk datasets waiting for their turn. """
+        prefetch_count = self.app.config["SPARK_READER_PREFETCH_COUNT"]
+        return [
+            Consumer(
+                channel,
+                queues=[self.spark_result_queue],
+                on_message=lambda msg: self.callback(msg),
+                prefetch_count=prefetch_count
+            ),
+            Consumer(
+                channel,
+                queues=[self.spark_result_control_queue],
+                on_message=lambda msg: self.callback(msg),
+                prefetch_count=prefetch_count
+            )
+        ]
 
     def init_rabbitmq_connection(self):
         self.connection = Connection(
@@ -156,6 +225,7 @@ class SparkReader(ConsumerMixin):
         """ initiates RabbitMQ connection and starts consuming from the queue
         """
         self.register_handlers()
+        self.dispatcher = MessageDispatcher(self.app, self.process_response, self.app.config["SPARK_READER_WORKERS"])
         with self.app.app_context():
             while True:
                 try:
@@ -168,6 +238,7 @@ class SparkReader(ConsumerMixin):
                 except Exception:
                     self.app.logger.error("Error in SparkReader:", exc_info=True)
                     time.sleep(3)
+            self.dispatcher.shutdown()
 
 
 if __name__ == '__main__':
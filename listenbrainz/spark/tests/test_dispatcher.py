@@ -0,0 +1,103 @@
+import threading
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from listenbrainz.spark.dispatcher import MessageDispatcher, get_ordering_key
+
+
+class MessageDispatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+        self.handled = []
+
+    def handler(self, response):
+        if response.get("block"):
+            self.release.wait(timeout=10)
+        with self.lock:
+            self.handled.append(response["id"])
+
+    def test_get_ordering_key(self):
+        self.assertEqual(get_ordering_key({"type": "couchdb_data_start", "database": "artists_week_1"}),
+                         "database:artists_week_1")
+        self.assertEqual(get_ordering_key({"type": "user_entity", "database": "artists_week_1"}),
+                         "database:artists_week_1")
+        self.assertEqual(get_ordering_key({"type": "similarity_recording_start"}), "similarity_recording")
+        self.assertEqual(get_ordering_key({"type": "similarity_recording"}), "similarity_recording")
+        self.assertEqual(get_ordering_key({"type": "troi_playlists_end"}), "troi_playlists")
+        self.assertEqual(get_ordering_key({"type": "echo"}), "echo")
+        self.assertEqual(get_ordering_key({"type": "cf_recommendations_recording_mail"}),
+                         "cf_recommendations_recording_recommendations")
+
+    def test_ordering_and_concurrency(self):
+        dispatcher = MessageDispatcher(self.app, self.handler, workers=4)
+        stats = [
+            {"id": 1, "type": "couchdb_data_start", "database": "artists_week_1", "block": True},
+            {"id": 2, "type": "user_entity", "database": "artists_week_1"},
+            {"id": 3, "type": "couchdb_data_end", "database": "artists_week_1"},
+        ]
+        for response in stats:
+            dispatcher.submit(response["id"], response)
+        dispatcher.submit(4, {"id": 4, "type": "echo"})
+
+        # the unrelated message is not blocked behind the stats dataset
+        for _ in range(100):
+            if dispatcher.get_processed():
+                break
+            threading.Event().wait(0.05)
+        self.assertEqual(self.handled, [4])
+
+        self.release.set()
+        self.assertTrue(dispatcher.wait(timeout=10))
+        self.assertEqual(self.handled, [4, 1, 2, 3])
+        self.assertEqual(dispatcher.get_processed(), [1, 2, 3])
+
+        metrics = dispatcher.get_metrics()
+        self.assertEqual(metrics["pending_count"], 0)
+        self.assertEqual(metrics["user_entity_processed_count"], 1)
+        self.assertEqual(metrics["echo_processed_count"], 1)
+        dispatcher.shutdown()
+
+    def test_recommendations_mail_waits_for_recommendations(self):
+        dispatcher = MessageDispatcher(self.app, self.handler, workers=4)
+        dispatcher.submit(1, {"id": 1, "type": "cf_recommendations_recording_recommendations", "block": True})
+        dispatcher.submit(2, {"id": 2, "type": "cf_recommendations_recording_recommendations"})
+        dispatcher.submit(3, {"id": 3, "type": "cf_recommendations_recording_mail"})
+
+        # the mail is not processed while the recommendations are being inserted, even with idle workers
+        self.assertFalse(dispatcher.wait(timeout=0.5))
+        self.assertEqual(self.handled, [])
+
+        self.release.set()
+        self.assertTrue(dispatcher.wait(timeout=10))
+        self.assertEqual(self.handled, [1, 2, 3])
+        dispatcher.shutdown()
+
+    def test_concurrency_limit(self):
+        dispatcher = MessageDispatcher(self.app, self.handler, workers=4, concurrency_limits={"user_entity": 1})
+        dispatcher.submit(1, {"id": 1, "type": "user_entity", "database": "artists_week_1", "block": True})
+        dispatcher.submit(2, {"id": 2, "type": "user_entity", "database": "releases_week_1"})
+        dispatcher.submit(3, {"id": 3, "type": "echo"})
+
+        self.assertFalse(dispatcher.wait(timeout=0.5))
+        # the second database has to wait for the first one because of the limit, others are not affected
+        self.assertEqual(self.handled, [3])
+
+        self.release.set()
+        self.assertTrue(dispatcher.wait(timeout=10))
+        self.assertEqual(self.handled, [3, 1, 2])
+        dispatcher.shutdown()
+
+    @patch("listenbrainz.spark.dispatcher.close_connections")
+    def test_closes_connections(self, mock_close_connections):
+        dispatcher = MessageDispatcher(self.app, self.handler, workers=2)
+        dispatcher.submit(1, {"id": 1, "type": "echo"})
+        # the connections are closed even if the handler fails
+        dispatcher.submit(2, {"type": "echo"})
+        self.assertTrue(dispatcher.wait(timeout=10))
+        self.assertEqual(mock_close_connections.call_count, 2)
+        dispatcher.shutdown()
@@ -157,7 +157,8 @@ class RequestManageTestCase(unittest.TestCase):
             'query': 'cf.recommendations.recording.recommendations',
             'params': {
                 'recommendation_raw_limit': 7,
-                'users': ['vansika']
+                'users': ['vansika'],
+                'blocked': True
             }
         }
         expected_message = orjson.dumps(message)
@@ -172,9 +173,11 @@ class RequestManageTestCase(unittest.TestCase):
         message = {
             'query': 'similarity.similar_users',
             'params': {
-                'max_num_users': 25 
+                'max_num_users': 25,
+                'mode': 'sparse'
             }
         }
         expected_message = orjson.dumps(message)
-        received_message = request_manage._prepare_query_message('similarity.similar_users', max_num_users=25)
+        received_message = request_manage._prepare_query_message('similarity.similar_users', max_num_users=25,
+                                                                  mode='sparse')
         self.assertEqual(expected_message, received_message)
@@ -0,0 +1,61 @@
+import uuid
+from unittest.mock import patch, MagicMock
+
+import orjson
+import pyarrow as pa
+import pyarrow.ipc
+from sqlalchemy import text
+
+from listenbrainz.db import timescale
+from listenbrainz.db.similarity import SimilarRecordingsDataset
+from listenbrainz.db.testing import TimescaleTestCase
+from listenbrainz.spark.spark_reader import decode_message, ARROW_STREAM_CONTENT_TYPE
+
+
+class DatabaseDatasetTestCase(TimescaleTestCase):
+
+    def get_similar_recordings(self):
+        result = self.ts_conn.execute(text("SELECT mbid0::TEXT, mbid1::TEXT, score FROM similarity.recording"))
+        return sorted(tuple(row) for row in result)
+
+    def test_copy_import(self):
+        mbids = sorted(str(uuid.uuid4()) for _ in range(3))
+        with patch.object(timescale.engine, "raw_connection", wraps=timescale.engine.raw_connection) as mock_conn:
+            SimilarRecordingsDataset.handle_start({"type": "similarity_recording_start", "algorithm": "foo"})
+            SimilarRecordingsDataset.handle_insert({
+                "type": "similarity_recording",
+                "algorithm": "foo",
+                "data": [{"mbid0": mbids[0], "mbid1": mbids[1], "score": 10}]
+            })
+            SimilarRecordingsDataset.handle_insert({
+                "type": "similarity_recording",
+                "algorithm": "foo",
+                "data": [{"mbid0": mbids[0], "mbid1": mbids[2], "score": 5}]
+            })
+            SimilarRecordingsDataset.handle_end({"type": "similarity_recording_end", "algorithm": "foo"})
+            # the same connection is used for the whole run of the dataset
+            mock_conn.assert_called_once()
+
+        self.assertIsNone(SimilarRecordingsDataset.conn)
+        self.assertEqual(self.get_similar_recordings(), [(mbids[0], mbids[1], 10), (mbids[0], mbids[2], 5)])
+
+    def test_decode_arrow_message(self):
+        table = pa.Table.from_pylist([{"mbid0": "a", "mbid1": "b", "score": 1}])
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+
+        message = MagicMock()
+        message.content_type = ARROW_STREAM_CONTENT_TYPE
+        message.headers = {"message": orjson.dumps({"type": "similarity_recording", "algorithm": "foo"})}
+        message.body = sink.getvalue().to_pybytes()
+        self.assertEqual(decode_message(message), {
+            "type": "similarity_recording",
+            "algorithm": "foo",
+            "data": [{"mbid0": "a", "mbid1": "b", "score": 1}]
+        })
+
+        message = MagicMock()
+        message.content_type = "application/json"
+        message.body = orjson.dumps({"type": "similarity_recording_end"})
+        self.assertEqual(decode_message(message), {"type": "similarity_recording_end"})
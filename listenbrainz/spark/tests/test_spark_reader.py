@@ -0,0 +1,78 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+import orjson
+from flask import Flask
+
+from listenbrainz.spark.dispatcher import MessageDispatcher
+from listenbrainz.spark.spark_reader import SparkReader
+
+
+class SparkReaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(
+            SPARK_RESULT_EXCHANGE="spark_result",
+            SPARK_RESULT_QUEUE="spark_result",
+            SPARK_RESULT_CONTROL_EXCHANGE="spark_result_control",
+            SPARK_RESULT_CONTROL_QUEUE="spark_result_control",
+            SPARK_READER_PREFETCH_COUNT=2,
+        )
+        self.release = threading.Event()
+        self.handled = []
+
+        self.reader = SparkReader(self.app)
+        self.reader.response_handlers = {
+            "similarity_recording": self.handle_dataset,
+            "echo": lambda response: self.handled.append(response["type"]),
+        }
+        self.reader.dispatcher = MessageDispatcher(self.app, self.reader.process_response, workers=2)
+
+    def tearDown(self):
+        self.release.set()
+        self.reader.dispatcher.shutdown()
+
+    def handle_dataset(self, response):
+        self.release.wait(timeout=10)
+        self.handled.append(response["type"])
+
+    @staticmethod
+    def make_message(response):
+        message = MagicMock()
+        message.content_type = "application/json"
+        message.body = orjson.dumps(response)
+        return message
+
+    def test_control_messages_are_not_blocked_by_datasets(self):
+        result_consumer, control_consumer = self.reader.get_consumers(None, MagicMock())
+        self.assertEqual([q.name for q in result_consumer.queues], ["spark_result"])
+        self.assertEqual([q.name for q in control_consumer.queues], ["spark_result_control"])
+        # each consumer has a prefetch window of its own
+        self.assertEqual(result_consumer.prefetch_count, 2)
+        self.assertEqual(control_consumer.prefetch_count, 2)
+
+        # the prefetch window of the result queue is full of messages of a dataset waiting for their turn
+        dataset = [self.make_message({"type": "similarity_recording", "algorithm": "foo"}) for _ in range(2)]
+        for message in dataset:
+            result_consumer.on_message(message)
+        echo = self.make_message({"type": "echo"})
+        control_consumer.on_message(echo)
+
+        for _ in range(100):
+            self.reader.on_iteration()
+            if echo.ack.called:
+                break
+            threading.Event().wait(0.05)
+        echo.ack.assert_called_once()
+        self.assertEqual(self.handled, ["echo"])
+        for message in dataset:
+            message.ack.assert_not_called()
+
+        self.release.set()
+        self.assertTrue(self.reader.dispatcher.wait(timeout=10))
+        self.reader.on_iteration()
+        for message in dataset:
+            message.ack.assert_called_once()
+        self.assertEqual(self.handled, ["echo", "similarity_recording", "similarity_recording"])
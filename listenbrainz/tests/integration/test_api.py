@@ -10,6 +10,7 @@ import listenbrainz.db.user_relationship as db_user_relationship
 from data.model.external_service import ExternalServiceType
 from listenbrainz import db
 from listenbrainz.tests.integration import ListenAPIIntegrationTestCase
+from listenbrainz.webserver import redis_connection
 from listenbrainz.webserver.views.api_tools import is_valid_uuid
 import listenbrainz.db.external_service_oauth as db_oauth
 from listenbrainz.webserver.views.playlist_api import PLAYLIST_EXTENSION_URI, PlaylistAPIXMLError
@@ -181,6 +182,35 @@ class APITestCase(ListenAPIIntegrationTestCase):
         response = self.client.get(url)
         self.assert404(response)
 
+    def test_get_listens_recent_listens_cache(self):
+        """ Test that the latest listens are served from the per-user cache and that it is invalidated
+        when new listens are inserted """
+        with open(self.path_to_data_file('valid_single.json'), 'r') as f:
+            payload = json.load(f)
+
+        user = db_user.get_or_create(self.db_conn, 1, 'test_recent_cache')
+        payload['payload'][0]['listened_at'] = 1400000000
+        response = self.send_data(payload, user, recalculate=True)
+        self.assert200(response)
+
+        url = self.custom_url_for('api_v1.get_listens', user_name=user['musicbrainz_id'])
+        response = self.wait_for_query_to_have_items(url, 1, query_string={'count': '1'})
+        self.assertEqual(response.json['payload']['count'], 1)
+
+        cached = redis_connection._redis.get_recent_listens_for_user(user['id'], 1)
+        self.assertIsNotNone(cached)
+        self.assertEqual(cached[0], response.json['payload']['listens'])
+
+        payload['payload'][0]['listened_at'] = 1400000100
+        response = self.send_data(payload, user, recalculate=True)
+        self.assert200(response)
+
+        response = self.wait_for_query_to_have_items(url, 2)
+        data = response.json['payload']
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['listens'][0]['listened_at'], 1400000100)
+        self.assertEqual(data['latest_listen_ts'], 1400000100)
+
     def test_get_listens_order(self):
         """ Test to make sure that the api sends listens in valid order.
         """
@@ -28,7 +28,7 @@ import listenbrainz.db.user_relationship as db_user_relationship
 import listenbrainz.db.user_timeline_event as db_user_timeline_event
 import time
 import json
-from listenbrainz.webserver.views.user_timeline_event_api import DEFAULT_LISTEN_EVENT_WINDOW_NEW
+from listenbrainz.webserver.views.user_timeline_event_api import DEFAULT_LISTEN_EVENT_WINDOW_NEW, invalidate_feed_cache
 
 
 class FeedAPITestCase(ListenAPIIntegrationTestCase):
@@ -484,6 +484,58 @@ class FeedAPITestCase(ListenAPIIntegrationTestCase):
         self.assertEqual('Dummy', payload['events'][1]['metadata']['track_metadata']['release_name'])
         self.assertEqual(msid, payload['events'][1]['metadata']['track_metadata']['additional_info']['recording_msid'])
 
+    def test_it_caches_feed_pages(self):
+        msid = self.insert_metadata()
+        url = self.custom_url_for('user_timeline_event_api_bp.user_feed', user_name=self.main_user['musicbrainz_id'])
+        headers = {'Authorization': f"Token {self.main_user['auth_token']}"}
+        query_string = {'max_ts': int(time.time()) + 10}
+
+        r = self.client.get(url, headers=headers, query_string=query_string)
+        self.assert200(r)
+        self.assertEqual(0, self.remove_own_follow_events(r.json['payload'])['count'])
+
+        # events created directly in the database only show up once the cached page expires or is invalidated
+        db_user_timeline_event.create_user_track_recommendation_event(
+            self.db_conn,
+            user_id=self.main_user['id'],
+            metadata=RecordingRecommendationMetadata(recording_msid=msid)
+        )
+        r = self.client.get(url, headers=headers, query_string=query_string)
+        self.assert200(r)
+        self.assertEqual(0, self.remove_own_follow_events(r.json['payload'])['count'])
+
+        with self.app.app_context():
+            invalidate_feed_cache(self.main_user['id'])
+        r = self.client.get(url, headers=headers, query_string=query_string)
+        self.assert200(r)
+        payload = self.remove_own_follow_events(r.json['payload'])
+        self.assertEqual(1, payload['count'])
+        self.assertEqual('recording_recommendation', payload['events'][0]['event_type'])
+
+    def test_pinning_invalidates_cached_feed_pages(self):
+        msid = self.insert_metadata()
+        url = self.custom_url_for('user_timeline_event_api_bp.user_feed', user_name=self.main_user['musicbrainz_id'])
+        headers = {'Authorization': f"Token {self.main_user['auth_token']}"}
+        query_string = {'max_ts': int(time.time()) + 10}
+
+        r = self.client.get(url, headers=headers, query_string=query_string)
+        self.assert200(r)
+        self.assertEqual(0, self.remove_own_follow_events(r.json['payload'])['count'])
+
+        r = self.client.post(
+            self.custom_url_for('pinned_rec_api_bp_v1.pin_recording_for_user'),
+            data=json.dumps({'recording_msid': msid, 'blurb_content': 'Wow'}),
+            headers=headers,
+            content_type='application/json'
+        )
+        self.assert200(r)
+
+        r = self.client.get(url, headers=headers, query_string=query_string)
+        self.assert200(r)
+        payload = self.remove_own_follow_events(r.json['payload'])
+        self.assertEqual(1, payload['count'])
+        self.assertEqual('recording_pin', payload['events'][0]['event_type'])
+
     def test_it_returns_empty_list_if_user_does_not_follow_anyone(self):
         new_user = db_user.get_or_create(self.db_conn, 111, 'totally_new_user_with_no_friends')
         r = self.client.get(
@@ -0,0 +1,45 @@
+import struct
+import unittest
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from listenbrainz.db.binary_copy import encode_rows, encode_timestamptz, encode_int4, encode_uuid, encode_jsonb, \
+    encode_float4_array, COPY_HEADER, COPY_TRAILER, FLOAT4_OID
+
+
+class BinaryCopyTestCase(unittest.TestCase):
+
+    def test_encode_timestamptz(self):
+        self.assertEqual(encode_timestamptz(datetime(2000, 1, 1)), struct.pack("!q", 0))
+        self.assertEqual(encode_timestamptz(datetime(2000, 1, 1, 0, 0, 1)), struct.pack("!q", 1_000_000))
+        self.assertEqual(encode_timestamptz(datetime(1999, 12, 31, 23, 59, 59)), struct.pack("!q", -1_000_000))
+        # aware datetimes are converted to UTC
+        aware = datetime(2000, 1, 1, 1, 0, 0, tzinfo=timezone(timedelta(hours=1)))
+        self.assertEqual(encode_timestamptz(aware), struct.pack("!q", 0))
+
+    def test_encode_float4_array(self):
+        self.assertEqual(
+            encode_float4_array([1.0, -0.5]),
+            struct.pack("!iiiii", 1, 0, FLOAT4_OID, 2, 1) + struct.pack("!if", 4, 1.0) + struct.pack("!if", 4, -0.5)
+        )
+        self.assertEqual(encode_float4_array([]), struct.pack("!iii", 0, 0, FLOAT4_OID))
+
+    def test_encode_rows(self):
+        msid = uuid.uuid4()
+        buffer = encode_rows(
+            [(datetime(2000, 1, 1), 1, str(msid), '{"a": 1}'), (datetime(2000, 1, 1), None, msid, b"{}")],
+            (encode_timestamptz, encode_int4, encode_uuid, encode_jsonb)
+        )
+        expected = COPY_HEADER \
+            + struct.pack("!h", 4) \
+            + struct.pack("!i", 8) + struct.pack("!q", 0) \
+            + struct.pack("!i", 4) + struct.pack("!i", 1) \
+            + struct.pack("!i", 16) + msid.bytes \
+            + struct.pack("!i", 9) + b'\x01{"a": 1}' \
+            + struct.pack("!h", 4) \
+            + struct.pack("!i", 8) + struct.pack("!q", 0) \
+            + struct.pack("!i", -1) \
+            + struct.pack("!i", 16) + msid.bytes \
+            + struct.pack("!i", 3) + b"\x01{}" \
+            + COPY_TRAILER
+        self.assertEqual(buffer.read(), expected)
@@ -0,0 +1,54 @@
+from unittest import TestCase, mock
+
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool
+
+from listenbrainz.db import pool
+from listenbrainz.db.pool import get_pool_options, create_pooled_engine, InstrumentedQueuePool, raw_connection
+
+
+class DBPoolTestCase(TestCase):
+
+    def test_get_pool_options(self):
+        self.assertIsNone(get_pool_options({}))
+        self.assertIsNone(get_pool_options({"DB_POOL_MODE": "null"}))
+        self.assertEqual(get_pool_options({"DB_POOL_MODE": "queue", "DB_POOL_SIZE": 2}), {
+            "pool_size": 2,
+            "max_overflow": pool.DEFAULT_POOL_MAX_OVERFLOW,
+            "pool_timeout": pool.DEFAULT_POOL_TIMEOUT,
+            "pool_recycle": pool.DEFAULT_POOL_RECYCLE,
+            "pool_pre_ping": pool.DEFAULT_POOL_PRE_PING,
+        })
+        with self.assertRaises(ValueError):
+            get_pool_options({"DB_POOL_MODE": "pgbouncer"})
+
+    def test_create_null_pool_engine(self):
+        engine = create_pooled_engine("sqlite://", "test")
+        self.assertIsInstance(engine.pool, NullPool)
+
+    @mock.patch("listenbrainz.db.pool.metrics")
+    def test_pool_stats(self, mock_metrics):
+        engine = create_pooled_engine("sqlite://", "test", {"pool_size": 1, "max_overflow": 0})
+        self.assertIsInstance(engine.pool, InstrumentedQueuePool)
+
+        with engine.connect() as connection:
+            self.assertEqual(connection.execute(text("SELECT 1")).scalar(), 1)
+        with raw_connection(engine) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 2")
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+        stats = engine.pool.stats
+        self.assertEqual(stats.checkouts, 2)
+        self.assertEqual(stats.timeouts, 0)
+        self.assertEqual(engine.pool.checkedout(), 0)
+
+        # the stats survive the pool being recreated, and are submitted once the interval has passed
+        engine.dispose()
+        self.assertIs(engine.pool.stats, stats)
+        stats.submitted -= pool.POOL_METRICS_INTERVAL
+        with engine.connect():
+            pass
+        mock_metrics.set.assert_called_once()
+        self.assertEqual(mock_metrics.set.call_args.kwargs["checkouts"], 3)
+        self.assertEqual(stats.checkouts, 0)
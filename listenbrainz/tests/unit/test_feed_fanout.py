@@ -0,0 +1,46 @@
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+from listenbrainz.feed_fanout.feed_fanout import FeedFanoutWriter
+
+
+@mock.patch("listenbrainz.feed_fanout.feed_fanout.db")
+@mock.patch("listenbrainz.feed_fanout.feed_fanout.redis_connection")
+@mock.patch("listenbrainz.feed_fanout.feed_fanout.db_user_relationship.get_followers_of_users")
+class FeedFanoutWriterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app = Flask(__name__)
+        app.config.update(UNIQUE_EXCHANGE="unique", FEED_FANOUT_QUEUE="feed_fanout", FEED_FANOUT_MAX_FOLLOWERS=2)
+        self.writer = FeedFanoutWriter(app)
+
+    def test_fanout(self, mock_get_followers, mock_redis_connection, _):
+        # user 1 has followers 10 and 11, user 2 has more followers than the threshold
+        mock_get_followers.return_value = {1: [10, 11], 2: [10, 11, 12]}
+        self.writer.fanout([
+            {"user_id": 1, "timestamp": 100, "recording_msid": "a"},
+            {"user_id": 2, "timestamp": 101, "recording_msid": "b"},
+            {"user_id": 1, "timestamp": 102, "recording_msid": "c"},
+            {"user_id": 2, "timestamp": 103, "recording_msid": "d"},
+            {"user_id": 3, "timestamp": 104, "recording_msid": "e"},
+        ])
+
+        redis = mock_redis_connection._redis
+        refs = [(1, 100, "a"), (1, 102, "c")]
+        redis.add_to_feed_timelines.assert_called_once_with({10: refs, 11: refs})
+        # the latest skipped listen of the user is recorded so that the feed can pull the user from timescale
+        redis.add_feed_fanout_skipped.assert_called_once_with({2: 103})
+
+        self.assertEqual(self.writer.listens, 5)
+        self.assertEqual(self.writer.skipped_listens, 2)
+        self.assertEqual(self.writer.timeline_writes, 4)
+
+    def test_fanout_without_skipped_users(self, mock_get_followers, mock_redis_connection, _):
+        mock_get_followers.return_value = {1: [10]}
+        self.writer.fanout([{"user_id": 1, "timestamp": 100, "recording_msid": "a"}])
+
+        redis = mock_redis_connection._redis
+        redis.add_to_feed_timelines.assert_called_once_with({10: [(1, 100, "a")]})
+        redis.add_feed_fanout_skipped.assert_not_called()
@@ -0,0 +1,99 @@
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
+
+from flask import Flask
+
+from listenbrainz.webserver.views.user_timeline_event_api import get_listens_from_feed_timeline
+
+
+def make_user(user_id):
+    return {"id": user_id, "musicbrainz_id": f"user_{user_id}"}
+
+
+def fetch_listens_by_keys(user_names, keys):
+    return [SimpleNamespace(user_id=user_id, timestamp=listened_at) for user_id, listened_at, _ in keys]
+
+
+@mock.patch("listenbrainz.webserver.views.user_timeline_event_api.timescale_connection")
+@mock.patch("listenbrainz.webserver.views.user_timeline_event_api.redis_connection")
+@mock.patch("listenbrainz.webserver.views.user_timeline_event_api.db_user_relationship.get_follower_counts")
+class FeedTimelineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["FEED_FANOUT_MAX_FOLLOWERS"] = 100
+        self.user = make_user(100)
+
+    def get_listens(self, users, min_ts=10, max_ts=1000):
+        with self.app.app_context():
+            return get_listens_from_feed_timeline(
+                self.user, users, datetime.utcfromtimestamp(min_ts), datetime.utcfromtimestamp(max_ts)
+            )
+
+    def setup_mocks(self, mock_follower_counts, mock_redis, mock_timescale, refs, complete_from=0,
+                    follower_counts=None, skipped=None):
+        mock_follower_counts.return_value = follower_counts or {}
+        mock_redis._redis.get_feed_fanout_skipped.return_value = skipped or {}
+        mock_redis._redis.get_feed_timeline.return_value = (refs, complete_from)
+        mock_timescale._ts.fetch_listens_by_keys.side_effect = fetch_listens_by_keys
+        return mock_timescale._ts
+
+    def test_limits(self, mock_follower_counts, mock_redis, mock_timescale):
+        users = [make_user(user_id) for user_id in range(1, 7)]
+        # three listens of each user, the listens of user 1 are the newest
+        refs = [(user_id, 1000 - user_id * 10 - i, f"msid-{user_id}-{i}") for user_id in range(1, 7) for i in range(3)]
+        # the timeline is incomplete before 900 but the overall limit is reached before
+        ts = self.setup_mocks(mock_follower_counts, mock_redis, mock_timescale, refs, complete_from=900)
+
+        listens = self.get_listens(users)
+
+        # at most 2 listens per user and 10 listens overall
+        expected = [(user_id, 1000 - user_id * 10 - i) for user_id in range(1, 6) for i in range(2)]
+        self.assertEqual([(listen.user_id, listen.timestamp) for listen in listens], expected)
+        user_names, keys = ts.fetch_listens_by_keys.call_args.args
+        self.assertEqual(user_names, {user["id"]: user["musicbrainz_id"] for user in users})
+        self.assertEqual([(user_id, listened_at) for user_id, listened_at, _ in keys], expected)
+        ts.fetch_recent_listens_for_users.assert_not_called()
+
+    def test_incomplete_timeline(self, mock_follower_counts, mock_redis, mock_timescale):
+        refs = [(1, 800, "msid-1"), (1, 400, "msid-2")]
+        ts = self.setup_mocks(mock_follower_counts, mock_redis, mock_timescale, refs, complete_from=500)
+        # listens before complete_from may be missing, the feed falls back to timescale
+        self.assertIsNone(self.get_listens([make_user(1)]))
+        ts.fetch_listens_by_keys.assert_not_called()
+
+        # the timeline of the user doesn't exist
+        mock_redis._redis.get_feed_timeline.return_value = None
+        self.assertIsNone(self.get_listens([make_user(1)]))
+
+    def test_deleted_listens(self, mock_follower_counts, mock_redis, mock_timescale):
+        refs = [(1, 800, "msid-1"), (1, 700, "msid-2")]
+        ts = self.setup_mocks(mock_follower_counts, mock_redis, mock_timescale, refs)
+        # one of the listens has been deleted since it was added to the timeline
+        ts.fetch_listens_by_keys.side_effect = lambda user_names, keys: fetch_listens_by_keys(user_names, keys[:1])
+        self.assertIsNone(self.get_listens([make_user(1)]))
+
+    def test_pulled_users(self, mock_follower_counts, mock_redis, mock_timescale):
+        users = [make_user(user_id) for user_id in range(1, 5)]
+        refs = [(1, 100, "msid-1"), (2, 95, "msid-2"), (4, 90, "msid-4")]
+        ts = self.setup_mocks(
+            mock_follower_counts, mock_redis, mock_timescale, refs,
+            # user 2 has too many followers, listens of user 3 were skipped during the requested range and
+            # those of user 4 before it
+            follower_counts={1: 5, 2: 500},
+            skipped={3: 50, 4: 5}
+        )
+        ts.fetch_recent_listens_for_users.return_value = [
+            SimpleNamespace(user_id=2, timestamp=98),
+            SimpleNamespace(user_id=3, timestamp=92),
+        ]
+
+        listens = self.get_listens(users)
+
+        self.assertEqual([(listen.user_id, listen.timestamp) for listen in listens], [(1, 100), (2, 98), (3, 92), (4, 90)])
+        self.assertEqual(ts.fetch_recent_listens_for_users.call_args.args[0], [users[1], users[2]])
+        # the timeline entries of pulled users are ignored
+        _, keys = ts.fetch_listens_by_keys.call_args.args
+        self.assertEqual(keys, [(1, 100, "msid-1"), (4, 90, "msid-4")])
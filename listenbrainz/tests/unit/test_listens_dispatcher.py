@@ -0,0 +1,86 @@
+import unittest
+from unittest import mock
+
+import orjson
+
+from listenbrainz.websockets.listens_dispatcher import ListensDispatcher
+
+
+def make_listen(user_name: str, timestamp: int, track_name: str) -> dict:
+    return {
+        "user_id": 1,
+        "user_name": user_name,
+        "timestamp": timestamp,
+        "recording_msid": "2edee875-55c3-4dad-b3ea-e8741484f4b5",
+        "track_metadata": {
+            "artist_name": "Portishead",
+            "track_name": track_name,
+            "additional_info": {},
+        },
+    }
+
+
+class ListensDispatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = mock.MagicMock()
+        self.app.config = {
+            "UNIQUE_EXCHANGE": "unique",
+            "PLAYING_NOW_EXCHANGE": "playing_now",
+            "WEBSOCKETS_QUEUE": "websockets",
+            "PLAYING_NOW_QUEUE": "playing_now",
+            "WEBSOCKETS_COALESCE_EMITS": True,
+        }
+        self.socketio = mock.MagicMock()
+        self.socketio.server.manager.rooms = {"/": {"occupied": {"sid": "eio_sid"}, "empty": {}}}
+        self.dispatcher = ListensDispatcher(self.app, self.socketio)
+
+    def send(self, event_name, listens):
+        message = mock.MagicMock()
+        message.body = orjson.dumps(listens)
+        self.dispatcher.send_listens(event_name, message)
+        message.ack.assert_called_once()
+
+    def test_skips_unoccupied_rooms(self):
+        self.send("listen", [make_listen("empty", 1, "Roads"), make_listen("nobody", 2, "Sour Times")])
+        self.socketio.emit.assert_not_called()
+        self.assertEqual(self.dispatcher.skipped_listens, 2)
+
+    def test_batches_listens_per_room(self):
+        self.send("listen", [make_listen("occupied", 1, "Roads")])
+        self.socketio.emit.assert_called_once()
+        event_name, data = self.socketio.emit.call_args.args
+        self.assertEqual(event_name, "listen")
+        self.assertEqual(orjson.loads(data)["track_metadata"]["track_name"], "Roads")
+
+        self.socketio.emit.reset_mock()
+        self.send("listen", [make_listen("occupied", 1, "Roads"), make_listen("occupied", 2, "Sour Times")])
+        self.socketio.emit.assert_called_once()
+        event_name, data = self.socketio.emit.call_args.args
+        self.assertEqual(event_name, "listens")
+        self.assertEqual([orjson.loads(listen)["track_metadata"]["track_name"] for listen in data], ["Roads", "Sour Times"])
+        self.assertEqual(self.socketio.emit.call_args.kwargs["to"], "occupied")
+        self.assertEqual(self.dispatcher.emitted_events, 2)
+        self.assertEqual(self.dispatcher.emitted_listens, 3)
+
+    def test_sends_last_playing_now(self):
+        self.send("playing_now", [make_listen("occupied", 1, "Roads"), make_listen("occupied", 2, "Sour Times")])
+        self.socketio.emit.assert_called_once()
+        event_name, data = self.socketio.emit.call_args.args
+        self.assertEqual(event_name, "playing_now")
+        self.assertEqual(orjson.loads(data)["track_metadata"]["track_name"], "Sour Times")
+
+    def test_multi_node(self):
+        self.app.config["WEBSOCKETS_MESSAGE_QUEUE"] = "redis://redis:6379/0"
+        self.app.config["WEBSOCKETS_COALESCE_EMITS"] = False
+        self.dispatcher = ListensDispatcher(self.app, self.socketio)
+        # each node gets queues of its own named by the broker, even if the nodes share a container name
+        for queue in (self.dispatcher.websockets_queue, self.dispatcher.playing_now_queue):
+            self.assertEqual(queue.name, "")
+            self.assertTrue(queue.exclusive)
+            self.assertTrue(queue.auto_delete)
+
+        # listens are delivered to the clients of this node only
+        self.send("listen", [make_listen("occupied", 1, "Roads"), make_listen("empty", 2, "Sour Times")])
+        self.socketio.emit.assert_called_once()
+        self.assertEqual(self.socketio.emit.call_args.kwargs, {"to": "occupied", "ignore_queue": True})
@@ -0,0 +1,77 @@
+import unittest
+from unittest import mock
+
+from listenbrainz.timescale_writer.msid_cache import MsidCache, get_msid_cache_key
+
+
+class MsidCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = MsidCache(max_size=2, ttl=60)
+        self.key_1 = get_msid_cache_key({"artist": "Frank Ocean", "title": "Nikes", "release": "Blond"})
+        self.key_2 = get_msid_cache_key({"artist": "Frank Ocean", "title": "Ivy", "release": "Blond"})
+        self.key_3 = get_msid_cache_key({"artist": "Frank Ocean", "title": "Pink + White", "release": "Blond"})
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get(self.key_1))
+        self.cache.put(self.key_1, "msid-1")
+        self.assertEqual(self.cache.get(self.key_1), "msid-1")
+
+        metrics = self.cache.get_metrics()
+        self.assertEqual(metrics["msid_cache_hits"], 1)
+        self.assertEqual(metrics["msid_cache_misses"], 1)
+        self.assertEqual(metrics["msid_cache_size"], 1)
+
+        # counters are reset after each metrics submission
+        metrics = self.cache.get_metrics()
+        self.assertEqual(metrics["msid_cache_hits"], 0)
+        self.assertEqual(metrics["msid_cache_misses"], 0)
+
+    def test_key_includes_all_fields(self):
+        key = get_msid_cache_key({"artist": "Frank Ocean", "title": "Nikes", "release": "Blond", "duration": 314000})
+        self.assertNotEqual(key, self.key_1)
+
+    def test_key_is_case_insensitive(self):
+        key = get_msid_cache_key({"artist": "FRANK OCEAN", "title": "nikes", "release": "BLOND"})
+        self.assertEqual(key, self.key_1)
+        # whitespace is significant to messybrainz lookups
+        key = get_msid_cache_key({"artist": "Frank Ocean ", "title": "Nikes", "release": "Blond"})
+        self.assertNotEqual(key, self.key_1)
+
+    def test_lru_eviction(self):
+        self.cache.put(self.key_1, "msid-1")
+        self.cache.put(self.key_2, "msid-2")
+        # access key_1 so that key_2 becomes the least recently used entry
+        self.cache.get(self.key_1)
+        self.cache.put(self.key_3, "msid-3")
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get(self.key_2))
+        self.assertEqual(self.cache.get(self.key_1), "msid-1")
+        self.assertEqual(self.cache.get(self.key_3), "msid-3")
+        self.assertEqual(self.cache.get_metrics()["msid_cache_evictions"], 1)
+
+    @mock.patch("listenbrainz.timescale_writer.msid_cache.monotonic")
+    def test_ttl(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        self.cache.put(self.key_1, "msid-1")
+        mock_monotonic.return_value = 159
+        self.assertEqual(self.cache.get(self.key_1), "msid-1")
+        mock_monotonic.return_value = 161
+        self.assertIsNone(self.cache.get(self.key_1))
+        self.assertEqual(len(self.cache), 0)
+
+    @mock.patch("listenbrainz.timescale_writer.msid_cache.get_msid_cache_generation")
+    def test_check_generation(self, mock_generation):
+        mock_generation.return_value = 1
+        self.cache.check_generation()
+        self.cache.put(self.key_1, "msid-1")
+
+        # generation is only checked once per interval
+        mock_generation.return_value = 2
+        self.cache.check_generation()
+        self.assertEqual(self.cache.get(self.key_1), "msid-1")
+
+        self.cache.next_generation_check = 0
+        self.cache.check_generation()
+        self.assertIsNone(self.cache.get(self.key_1))
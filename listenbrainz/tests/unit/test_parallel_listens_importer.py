@@ -0,0 +1,31 @@
+import queue
+import unittest
+from unittest import mock
+
+from listenbrainz.listenstore.timescale_listenstore import ParallelListensImporter, TimescaleListenStoreException
+
+
+class ParallelListensImporterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # skip __init__ so that no worker processes are started
+        self.importer = ParallelListensImporter.__new__(ParallelListensImporter)
+        self.importer.QUEUE_PUT_TIMEOUT = 0.01
+        self.importer.chunks = queue.Queue(maxsize=1)
+        self.importer.chunks.put([b"line"])
+
+    def test_finish_with_dead_worker(self):
+        """ finish must not block forever on a full queue if the workers have died """
+        self.importer.processes = [mock.Mock(pid=1, exitcode=1)]
+        with self.assertRaises(TimescaleListenStoreException):
+            self.importer.finish()
+
+    def test_submit_waits_for_live_workers(self):
+        self.importer.processes = [mock.Mock(pid=1, exitcode=None)]
+        self.importer.submitted = 0
+        self.importer.next_progress_log = float("inf")
+
+        with mock.patch.object(self.importer.chunks, "put", side_effect=[queue.Full, None]) as mock_put:
+            self.importer.submit([b"line"])
+        self.assertEqual(mock_put.call_count, 2)
+        self.assertEqual(self.importer.submitted, 1)
@@ -0,0 +1,61 @@
+import unittest
+import uuid
+from unittest import mock
+
+from flask import Flask
+
+from listenbrainz.messybrainz.exceptions import BadDataException
+from listenbrainz.timescale_writer.timescale_writer import TimescaleWriterSubscriber
+
+
+def make_listen(title):
+    return {"track_metadata": {"artist_name": "Frank Ocean", "track_name": title}}
+
+
+def lookup_msids(submissions):
+    if any(data["title"] == "bad" for data in submissions):
+        raise BadDataException("bad listen")
+    return [str(uuid.uuid4()) for _ in submissions]
+
+
+@mock.patch("listenbrainz.timescale_writer.timescale_writer.Listen.from_json", side_effect=lambda listen: listen)
+class TimescaleWriterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(
+            INCOMING_EXCHANGE="incoming",
+            INCOMING_QUEUE="incoming",
+            UNIQUE_EXCHANGE="unique",
+            UNIQUE_QUEUE="unique",
+            TIMESCALE_WRITER_BATCH_SIZE=100,
+        )
+        with self.app.app_context():
+            self.writer = TimescaleWriterSubscriber()
+        self.writer.insert_to_listenstore = mock.MagicMock(return_value=0)
+        self.writer.lookup_msids = mock.MagicMock(side_effect=lookup_msids)
+
+    def test_batch_is_looked_up_at_once(self, _):
+        message = mock.MagicMock()
+        listens = [make_listen(f"Track {i}") for i in range(25)]
+        with self.app.app_context():
+            self.writer.process_listens([message], listens)
+
+        self.writer.lookup_msids.assert_called_once()
+        self.assertEqual(len(self.writer.lookup_msids.call_args.args[0]), 25)
+        submitted = self.writer.insert_to_listenstore.call_args.args[0]
+        self.assertEqual(len(submitted), 25)
+        self.assertTrue(all(listen["recording_msid"] for listen in submitted))
+        message.ack.assert_called_once()
+
+    def test_failed_batch_is_looked_up_in_chunks(self, _):
+        listens = [make_listen(f"Track {i}") for i in range(25)]
+        listens[12] = make_listen("bad")
+        with self.app.app_context():
+            self.writer.process_listens([mock.MagicMock()], listens)
+
+        # one lookup for the batch and then one for each chunk of 10, only the chunk of the bad listen is lost
+        self.assertEqual(self.writer.lookup_msids.call_count, 4)
+        submitted = self.writer.insert_to_listenstore.call_args.args[0]
+        self.assertEqual([listen["track_metadata"]["track_name"] for listen in submitted],
+                         [f"Track {i}" for i in list(range(10)) + list(range(20, 25))])
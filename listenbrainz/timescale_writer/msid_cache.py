@@ -0,0 +1,123 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Optional
+
+from brainzutils import cache
+
+# Redis key holding a counter which is incremented whenever msids may have changed in MessyBrainz.
+# All timescale writers clear their in-process caches when they notice a change in its value.
+MSID_CACHE_GENERATION_KEY = "messybrainz.msid_cache_generation"
+
+MSID_CACHE_DEFAULT_SIZE = 500_000
+MSID_CACHE_DEFAULT_TTL = 6 * 60 * 60  # seconds
+MSID_CACHE_GENERATION_CHECK_INTERVAL = 30  # seconds
+
+
+def _lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+def get_msid_cache_key(submission: dict) -> tuple:
+    """ Returns the cache key for a submission prepared for a MessyBrainz lookup.
+
+    The key is the (artist, title, release, track_number, duration) tuple with the text fields lowercased, the
+    same way MessyBrainz compares them (see get_or_create_msids), so case variants of a recording share an entry.
+    MessyBrainz does not ignore whitespace differences, neither does the key.
+    """
+    return (
+        _lower(submission["artist"]),
+        _lower(submission["title"]),
+        _lower(submission.get("release")),
+        _lower(submission.get("track_number")),
+        submission.get("duration")
+    )
+
+
+def invalidate_all_msid_caches():
+    """ Signal all running timescale writers to drop their cached msids. Should be called after
+    msids have been merged or redirected in MessyBrainz. """
+    cache.increment(MSID_CACHE_GENERATION_KEY)
+
+
+def get_msid_cache_generation() -> int:
+    value = cache.get(MSID_CACHE_GENERATION_KEY, decode=False)
+    return int(value) if value else 0
+
+
+class MsidCache:
+    """ A size capped LRU cache with a TTL mapping MessyBrainz submissions to msids.
+
+    Args:
+        max_size: the maximum number of entries to keep, least recently used entries are evicted first
+        ttl: the number of seconds after which an entry expires
+    """
+
+    def __init__(self, max_size: int = MSID_CACHE_DEFAULT_SIZE, ttl: int = MSID_CACHE_DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict[tuple, tuple[str, float]] = OrderedDict()
+
+        self.generation = None
+        self.next_generation_check = 0
+
+        # these are counts since the last metric update was submitted
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key: tuple) -> Optional[str]:
+        """ Return the cached msid for the key or None if it is missing or expired. """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        msid, expires_at = entry
+        if expires_at < monotonic():
+            del self.entries[key]
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return msid
+
+    def put(self, key: tuple, msid: str):
+        """ Add or refresh an entry in the cache, evicting the least recently used entries if the cache is full. """
+        self.entries[key] = (msid, monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def check_generation(self):
+        """ Clear the cache if the msids were invalidated by another process since the last check. The redis
+         lookup is only done once every MSID_CACHE_GENERATION_CHECK_INTERVAL seconds. """
+        now = monotonic()
+        if now < self.next_generation_check:
+            return
+        self.next_generation_check = now + MSID_CACHE_GENERATION_CHECK_INTERVAL
+
+        generation = get_msid_cache_generation()
+        if self.generation is not None and generation != self.generation:
+            self.clear()
+        self.generation = generation
+
+    def get_metrics(self) -> dict:
+        """ Return the hit/miss counters since the last call along with the current size and reset the counters. """
+        data = {
+            "msid_cache_hits": self.hits,
+            "msid_cache_misses": self.misses,
+            "msid_cache_evictions": self.evictions,
+            "msid_cache_size": len(self.entries)
+        }
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        return data
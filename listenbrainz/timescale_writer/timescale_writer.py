@@ -14,6 +14,8 @@ from more_itertools import chunked
 
 from listenbrainz import messybrainz
 from listenbrainz.listen import Listen
+from listenbrainz.timescale_writer.msid_cache import MsidCache, get_msid_cache_key, MSID_CACHE_DEFAULT_SIZE, \
+    MSID_CACHE_DEFAULT_TTL
 from listenbrainz.utils import get_fallback_connection_name
 from listenbrainz.webserver import create_app, redis_connection, timescale_connection
 from listenbrainz.webserver.views.api_tools import MAX_ITEMS_PER_MESSYBRAINZ_LOOKUP
@@ -21,6 +23,10 @@ from listenbrainz.webserver.views.api_tools import MAX_ITEMS_PER_MESSYBRAINZ_LOO
 METRIC_UPDATE_INTERVAL = 60  # seconds
 LISTEN_INSERT_ERROR_SENTINEL = -1  #
 
+# batching of incoming messages is disabled by default, see TimescaleWriterSubscriber.callback
+DEFAULT_BATCH_SIZE = 0  # listens
+DEFAULT_BATCH_LATENCY = 250  # milliseconds
+
 
 class TimescaleWriterSubscriber(ConsumerProducerMixin):
 
@@ -39,22 +45,68 @@ class TimescaleWriterSubscriber(ConsumerProducerMixin):
         self.unique_listens = 0
         self.metric_submission_time = monotonic() + METRIC_UPDATE_INTERVAL
 
+        self.msid_cache = MsidCache(
+            max_size=current_app.config.get("MSID_CACHE_SIZE", MSID_CACHE_DEFAULT_SIZE),
+            ttl=current_app.config.get("MSID_CACHE_TTL", MSID_CACHE_DEFAULT_TTL)
+        )
+
+        # if batching is enabled, messages are collected until either the number of pending listens reaches
+        # batch_size or the oldest pending message has waited for batch_latency seconds.
+        self.batch_size = current_app.config.get("TIMESCALE_WRITER_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+        self.batch_latency = current_app.config.get("TIMESCALE_WRITER_BATCH_LATENCY", DEFAULT_BATCH_LATENCY) / 1000
+        self.pending_messages = []
+        self.pending_listens = []
+        self.batch_started = None
+
     def get_consumers(self, _, channel):
         return [
             Consumer(
                 channel,
                 queues=[self.incoming_queue],
                 on_message=lambda x: self.callback(x),
-                prefetch_count=500
+                prefetch_count=max(500, self.batch_size)
             )
         ]
 
     def callback(self, message: Message):
         listens = orjson.loads(message.body)
 
-        msb_listens = []
-        for chunk in chunked(listens, MAX_ITEMS_PER_MESSYBRAINZ_LOOKUP):
-            msb_listens.extend(self.messybrainz_lookup(chunk))
+        if not self.batch_size:
+            return self.process_listens([message], listens)
+
+        if not self.pending_messages:
+            self.batch_started = monotonic()
+        self.pending_messages.append(message)
+        self.pending_listens.extend(listens)
+
+        if len(self.pending_listens) >= self.batch_size:
+            return self.flush()
+        return 0
+
+    def on_iteration(self):
+        """ Called by kombu before waiting for new messages, at least once every safety interval. Flush
+         the pending batch if it has waited for longer than the latency budget. """
+        if self.pending_messages and monotonic() - self.batch_started >= self.batch_latency:
+            self.flush()
+
+    def flush(self):
+        """ Process all pending messages as one batch. """
+        messages, listens = self.pending_messages, self.pending_listens
+        self.pending_messages, self.pending_listens = [], []
+        self.batch_started = None
+        return self.process_listens(messages, listens)
+
+    def process_listens(self, messages: list[Message], listens: list[dict]):
+        """ Lookup msids for and insert the listens received in the given messages and ack the messages
+         once the listens have been inserted. """
+        # the msids of all the listens are resolved with a single lookup. if it fails, the listens are looked up
+        # again in small chunks so that a bad listen only loses the listens of its chunk instead of the whole batch.
+        msb_listens = self.messybrainz_lookup(listens)
+        if msb_listens is None:
+            msb_listens = []
+            if len(listens) > MAX_ITEMS_PER_MESSYBRAINZ_LOOKUP:
+                for chunk in chunked(listens, MAX_ITEMS_PER_MESSYBRAINZ_LOOKUP):
+                    msb_listens.extend(self.messybrainz_lookup(chunk) or [])
 
         submit = []
         for listen in msb_listens:
@@ -65,15 +117,17 @@ class TimescaleWriterSubscriber(ConsumerProducerMixin):
 
         ret = self.insert_to_listenstore(submit)
 
-        # If there is an error, we do not ack the message so that rabbitmq redelivers it later.
+        # If there is an error, we do not ack the messages so that rabbitmq redelivers them later.
         if ret == LISTEN_INSERT_ERROR_SENTINEL:
             return ret
 
-        message.ack()
+        for message in messages:
+            message.ack()
 
         return ret
 
     def messybrainz_lookup(self, listens):
+        """ Add the msids to the given listens. Returns None if the lookup failed. """
         msb_listens = []
         for listen in listens:
             if 'additional_info' not in listen['track_metadata']:
@@ -99,10 +153,10 @@ class TimescaleWriterSubscriber(ConsumerProducerMixin):
             msb_listens.append(data)
 
         try:
-            msb_responses = messybrainz.submit_listens_and_sing_me_a_sweet_song(msb_listens)
+            msb_responses = self.lookup_msids(msb_listens)
         except (messybrainz.exceptions.BadDataException, messybrainz.exceptions.ErrorAddingException):
             current_app.logger.error("MessyBrainz lookup for listens failed: ", exc_info=True)
-            return []
+            return None
 
         augmented_listens = []
         for listen, msid in zip(listens, msb_responses):
@@ -110,6 +164,40 @@ class TimescaleWriterSubscriber(ConsumerProducerMixin):
             augmented_listens.append(listen)
         return augmented_listens
 
+    def lookup_msids(self, msb_listens):
+        """ Resolve msids for the given MessyBrainz submissions. Cached msids are served from the
+         in-process cache, only the rest are looked up in MessyBrainz.
+
+        Returns:
+            a list of msids in the same order as the submissions
+        """
+        try:
+            self.msid_cache.check_generation()
+        except Exception:
+            # Not critical, entries will expire anyway so just log it to Sentry and move forward
+            current_app.logger.error("Could not check msid cache generation in redis", exc_info=True)
+
+        msids = []
+        misses = {}
+        for data in msb_listens:
+            key = get_msid_cache_key(data)
+            msid = self.msid_cache.get(key)
+            if msid is None and key not in misses:
+                misses[key] = data
+            msids.append(msid)
+
+        if misses:
+            msb_responses = messybrainz.submit_listens_and_sing_me_a_sweet_song(list(misses.values()))
+            resolved = dict(zip(misses.keys(), msb_responses))
+            for key, msid in resolved.items():
+                self.msid_cache.put(key, msid)
+
+            for idx, data in enumerate(msb_listens):
+                if msids[idx] is None:
+                    msids[idx] = resolved[get_msid_cache_key(data)]
+
+        return msids
+
     def insert_to_listenstore(self, data):
         """
         Inserts a batch of listens to the ListenStore. Timescale will report back as
@@ -157,6 +245,7 @@ class TimescaleWriterSubscriber(ConsumerProducerMixin):
             return len(data)
 
         redis_connection._redis.update_recent_listens(unique)
+        redis_connection._redis.invalidate_recent_listens_for_users(listen.user_id for listen in unique)
         self.unique_listens += len(unique)
 
         self.producer.publish(
@@ -168,7 +257,12 @@ class TimescaleWriterSubscriber(ConsumerProducerMixin):
 
         if monotonic() > self.metric_submission_time:
             self.metric_submission_time += METRIC_UPDATE_INTERVAL
-            metrics.set("timescale_writer", incoming_listens=self.incoming_listens, unique_listens=self.unique_listens)
+            metrics.set(
+                "timescale_writer",
+                incoming_listens=self.incoming_listens,
+                unique_listens=self.unique_listens,
+                **self.msid_cache.get_metrics()
+            )
             self.incoming_listens = 0
             self.unique_listens = 0
 
@@ -189,7 +283,13 @@ class TimescaleWriterSubscriber(ConsumerProducerMixin):
             try:
                 current_app.logger.info("Timescale Writer started.")
                 self.init_rabbitmq_connection()
-                self.run()
+                # unacked messages will be redelivered on the new connection
+                self.pending_messages, self.pending_listens = [], []
+                if self.batch_size:
+                    # wake up at least once per latency budget so that on_iteration can flush partial batches
+                    self.run(safety_interval=self.batch_latency)
+                else:
+                    self.run()
             except KeyboardInterrupt:
                 current_app.logger.error("Keyboard interrupt!")
                 break
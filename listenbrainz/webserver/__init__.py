@@ -12,6 +12,7 @@ from werkzeug.local import LocalProxy
 
 from listenbrainz import db
 from listenbrainz.db import create_test_database_connect_strings, timescale
+from listenbrainz.db.pool import get_pool_options
 from listenbrainz.db.timescale import create_test_timescale_connect_strings
 
 API_PREFIX = '/1'
@@ -39,6 +40,19 @@ def _get_ts_conn():
     return _ts_conn
 
 
+def close_connections():
+    """ Close the database connections opened in the current app context """
+    _db_conn = getattr(g, "_db_conn", None)
+    if _db_conn is not None:
+        _db_conn.close()
+        del g._db_conn
+
+    _ts_conn = getattr(g, "_ts_conn", None)
+    if _ts_conn is not None:
+        _ts_conn.close()
+        del g._ts_conn
+
+
 db_conn = LocalProxy(_get_db_conn)
 ts_conn = LocalProxy(_get_ts_conn)
 
@@ -121,20 +135,13 @@ def create_app(debug=None):
         db.init_db_connection(db_connect["DB_CONNECT"])
         timescale.init_db_connection(ts_connect["DB_CONNECT"])
     else:
-        db.init_db_connection(app.config["SQLALCHEMY_DATABASE_URI"])
-        timescale.init_db_connection(app.config["SQLALCHEMY_TIMESCALE_URI"])
+        pool_options = get_pool_options(app.config)
+        db.init_db_connection(app.config["SQLALCHEMY_DATABASE_URI"], pool_options)
+        timescale.init_db_connection(app.config["SQLALCHEMY_TIMESCALE_URI"], pool_options)
 
     @app.teardown_request
     def close_connection(exception):
-        _db_conn = getattr(g, "_db_conn", None)
-        if _db_conn is not None:
-            _db_conn.close()
-            del g._db_conn
-
-        _ts_conn = getattr(g, "_ts_conn", None)
-        if _ts_conn is not None:
-            _ts_conn.close()
-            del g._ts_conn
+        close_connections()
 
     # Redis connection
     from listenbrainz.webserver.redis_connection import init_redis_connection
@@ -3,7 +3,7 @@ from brainzutils.musicbrainz_db import engine as mb_engine
 from brainzutils.musicbrainz_db import editor as mb_editor
 
 from listenbrainz.domain.musicbrainz import MusicBrainzService, MUSICBRAINZ_SCOPES
-from listenbrainz.webserver import db_conn
+from listenbrainz.webserver import db_conn, token_cache
 from listenbrainz.webserver.utils import generate_string
 from listenbrainz.webserver.timescale_connection import _ts as ts
 import listenbrainz.db.user as db_user
@@ -53,6 +53,7 @@ def get_user():
         user["email"] = user_email
         # every time a user logs in, update the email in LB.
         db_user.update_user_details(db_conn, user["id"], musicbrainz_id, user_email)
+        token_cache.invalidate_token(user["auth_token"])
 
     # save user's MB OAuth token, this check cannot be merged with the previous signup/login check because
     # we have a different service user row for each LB deployment but a common user row for all three
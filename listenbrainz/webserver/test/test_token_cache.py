@@ -0,0 +1,56 @@
+from unittest import mock
+
+from brainzutils import cache
+
+import listenbrainz.db.user as db_user
+from listenbrainz.db.testing import DatabaseTestCase
+from listenbrainz.webserver.testing import ServerTestCase
+from listenbrainz.webserver.token_cache import TokenUserCache
+
+
+class TokenUserCacheTestCase(DatabaseTestCase, ServerTestCase):
+
+    def setUp(self):
+        ServerTestCase.setUp(self)
+        DatabaseTestCase.setUp(self)
+        db_user.create(self.db_conn, 1, "token_cache_user", "user@example.org")
+        self.user = db_user.get_by_mb_id(self.db_conn, "token_cache_user")
+        self.cache = TokenUserCache()
+
+    def tearDown(self):
+        cache._r.flushdb()
+        DatabaseTestCase.tearDown(self)
+        ServerTestCase.tearDown(self)
+
+    def test_get(self):
+        expected = {"id": self.user["id"], "musicbrainz_id": "token_cache_user", "has_email": True}
+        self.assertEqual(self.cache.get(self.db_conn, self.user["auth_token"]), expected)
+        self.assertEqual(self.cache.misses, 1)
+
+        # served from the in-process cache
+        with mock.patch("listenbrainz.webserver.token_cache.db_user.get_by_token") as mock_get_by_token:
+            self.assertEqual(self.cache.get(self.db_conn, self.user["auth_token"]), expected)
+            mock_get_by_token.assert_not_called()
+        self.assertEqual(self.cache.local_hits, 1)
+
+        # served from redis by another process
+        other_cache = TokenUserCache()
+        with mock.patch("listenbrainz.webserver.token_cache.db_user.get_by_token") as mock_get_by_token:
+            self.assertEqual(other_cache.get(self.db_conn, self.user["auth_token"]), expected)
+            mock_get_by_token.assert_not_called()
+        self.assertEqual(other_cache.redis_hits, 1)
+
+    def test_get_invalid_token(self):
+        self.assertIsNone(self.cache.get(self.db_conn, "not-a-token"))
+        self.assertEqual(len(self.cache.entries), 0)
+
+    def test_invalidate(self):
+        old_token = self.user["auth_token"]
+        self.assertIsNotNone(self.cache.get(self.db_conn, old_token))
+
+        db_user.update_token(self.db_conn, self.user["id"])
+        self.cache.invalidate(old_token)
+        self.assertIsNone(self.cache.get(self.db_conn, old_token))
+
+        new_token = db_user.get(self.db_conn, self.user["id"])["auth_token"]
+        self.assertEqual(self.cache.get(self.db_conn, new_token)["id"], self.user["id"])
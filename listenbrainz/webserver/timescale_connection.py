@@ -16,7 +16,7 @@ def init_timescale_connection(app):
 
     while True:
         try:
-            _ts = TimescaleListenStore(app.logger)
+            _ts = TimescaleListenStore(app.logger, keyset_fetch=app.config.get("LISTENS_KEYSET_FETCH", True))
             break
         except Exception:
             app.logger.error(f"Couldn't create TimescaleListenStore instance (sleeping and trying again...):", exc_info=True)
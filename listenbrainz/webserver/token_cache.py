@@ -0,0 +1,117 @@
+""" A short lived cache of the users authenticated by their auth tokens, used on the listen submission path
+so that every submission doesn't need a database lookup.
+
+Entries are kept in redis for TOKEN_USER_CACHE_EXPIRY seconds and in a small in-process cache for
+TOKEN_USER_LOCAL_EXPIRY seconds. Invalidating a token removes it from redis and from the cache of the
+current process, the other processes may still accept it for up to TOKEN_USER_LOCAL_EXPIRY seconds.
+"""
+import hashlib
+from collections import OrderedDict
+from time import monotonic
+from typing import Optional
+
+import orjson
+from brainzutils import cache, metrics
+from flask import current_app
+
+import listenbrainz.db.user as db_user
+
+TOKEN_USER_CACHE_KEY = "auth.token."
+TOKEN_USER_CACHE_EXPIRY = 5 * 60  # seconds
+TOKEN_USER_LOCAL_EXPIRY = 10  # seconds
+TOKEN_USER_LOCAL_MAX_SIZE = 10000
+TOKEN_USER_METRICS_INTERVAL = 60  # seconds
+
+
+def _get_cache_key(token: str) -> str:
+    # don't store the tokens themselves in redis
+    return TOKEN_USER_CACHE_KEY + hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class TokenUserCache:
+    """ Maps auth tokens to the minimal user record needed to submit listens:
+    {"id": <user id>, "musicbrainz_id": <MusicBrainz username>, "has_email": <whether the user has an email>}
+    """
+
+    def __init__(self):
+        self.entries: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+
+        # these are counts since the last metric update was submitted
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.metrics_submitted = monotonic()
+
+    def get(self, db_conn, token: str) -> Optional[dict]:
+        """ Return the submission user record for the token, or None if the token is invalid. """
+        key = _get_cache_key(token)
+
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] > monotonic():
+            self.local_hits += 1
+            self._submit_metrics()
+            return entry[0]
+
+        user = None
+        cached = cache.get(key, decode=False)
+        if cached:
+            user = orjson.loads(cached)
+            self.redis_hits += 1
+        else:
+            self.misses += 1
+            row = db_user.get_by_token(db_conn, token, fetch_email=True)
+            if row is not None:
+                user = {"id": row["id"], "musicbrainz_id": row["musicbrainz_id"], "has_email": bool(row["email"])}
+                cache.set(key, orjson.dumps(user), expirein=TOKEN_USER_CACHE_EXPIRY, encode=False)
+
+        if user is not None:
+            self._put_local(key, user)
+        self._submit_metrics()
+        return user
+
+    def invalidate(self, token: str):
+        """ Drop the cached user record of the token, should be called whenever the token is reset or the
+        user record changes. """
+        key = _get_cache_key(token)
+        self.entries.pop(key, None)
+        cache.delete(key)
+
+    def _put_local(self, key: str, user: dict):
+        self.entries[key] = (user, monotonic() + TOKEN_USER_LOCAL_EXPIRY)
+        self.entries.move_to_end(key)
+        while len(self.entries) > TOKEN_USER_LOCAL_MAX_SIZE:
+            self.entries.popitem(last=False)
+
+    def _submit_metrics(self):
+        now = monotonic()
+        if now < self.metrics_submitted + TOKEN_USER_METRICS_INTERVAL:
+            return
+        self.metrics_submitted = now
+
+        try:
+            metrics.set(
+                "token_user_cache",
+                local_hits=self.local_hits,
+                redis_hits=self.redis_hits,
+                misses=self.misses,
+                local_size=len(self.entries)
+            )
+        except Exception:
+            current_app.logger.error("Cannot submit token user cache metrics:", exc_info=True)
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+
+_token_user_cache = TokenUserCache()
+
+
+def get_user_by_token(db_conn, token: str) -> Optional[dict]:
+    """ Return the cached submission user record for the token, see TokenUserCache. """
+    return _token_user_cache.get(db_conn, token)
+
+
+def invalidate_token(token: Optional[str]):
+    """ Drop the cached user record of the token. """
+    if token:
+        _token_user_cache.invalidate(token)
@@ -25,7 +25,7 @@ from listenbrainz.webserver.utils import REJECT_LISTENS_WITHOUT_EMAIL_ERROR
 from listenbrainz.webserver.views.api_tools import insert_payload, log_raise_400, validate_listen, \
     is_valid_uuid, MAX_LISTEN_PAYLOAD_SIZE, MAX_LISTENS_PER_REQUEST, MAX_LISTEN_SIZE, LISTEN_TYPE_SINGLE, \
     LISTEN_TYPE_IMPORT, _validate_get_endpoint_params, LISTEN_TYPE_PLAYING_NOW, validate_auth_header, \
-    get_non_negative_param, _parse_int_arg
+    get_non_negative_param, _parse_int_arg, validate_submission_auth_header
 
 api_bp = Blueprint('api_v1', __name__)
 
@@ -72,8 +72,8 @@ def submit_listen():
     :statuscode 401: invalid authorization. See error message for details.
     :resheader Content-Type: *application/json*
     """
-    user = validate_auth_header(fetch_email=True)
-    if mb_engine and current_app.config["REJECT_LISTENS_WITHOUT_USER_EMAIL"] and not user["email"]:
+    user = validate_submission_auth_header()
+    if mb_engine and current_app.config["REJECT_LISTENS_WITHOUT_USER_EMAIL"] and not user["has_email"]:
         raise APIUnauthorized(REJECT_LISTENS_WITHOUT_EMAIL_ERROR)
 
     raw_data = request.get_data()
@@ -161,25 +161,51 @@ def get_listens(user_name):
     if min_ts and max_ts and min_ts >= max_ts:
         raise APIBadRequest("min_ts should be less than max_ts")
 
-    listens, min_ts_per_user, max_ts_per_user = timescale_connection._ts.fetch_listens(
-        user,
-        limit=count,
-        from_ts=datetime.utcfromtimestamp(min_ts) if min_ts else None,
-        to_ts=datetime.utcfromtimestamp(max_ts) if max_ts else None
-    )
-    listen_data = []
-    for listen in listens:
-        listen_data.append(listen.to_api())
+    if not min_ts and not max_ts and 0 < count <= redis_connection._redis.USER_RECENT_LISTENS_MAX:
+        listen_data, oldest_listen_ts, latest_listen_ts = _get_recent_listens_for_user(user, count)
+    else:
+        listens, min_ts_per_user, max_ts_per_user = timescale_connection._ts.fetch_listens(
+            user,
+            limit=count,
+            from_ts=datetime.utcfromtimestamp(min_ts) if min_ts else None,
+            to_ts=datetime.utcfromtimestamp(max_ts) if max_ts else None
+        )
+        listen_data = [listen.to_api() for listen in listens]
+        oldest_listen_ts = int(min_ts_per_user.timestamp())
+        latest_listen_ts = int(max_ts_per_user.timestamp())
 
     return jsonify({'payload': {
         'user_id': user_name,
         'count': len(listen_data),
         'listens': listen_data,
-        'latest_listen_ts': int(max_ts_per_user.timestamp()),
-        'oldest_listen_ts': int(min_ts_per_user.timestamp()),
+        'latest_listen_ts': latest_listen_ts,
+        'oldest_listen_ts': oldest_listen_ts,
     }})
 
 
+def _get_recent_listens_for_user(user, count):
+    """ Return the count latest listens of the user in the api format along with the oldest and latest listen
+     timestamps of the user. The listens are served from the per-user recent listens cache in redis, which is
+     filled from the listenstore on a miss. """
+    cached = redis_connection._redis.get_recent_listens_for_user(user["id"], count)
+    if cached is not None:
+        return cached
+
+    # read the version before the listens, the listens are not cached if they are invalidated meanwhile
+    version = redis_connection._redis.get_recent_listens_version(user["id"])
+    listens, min_ts_per_user, max_ts_per_user = timescale_connection._ts.fetch_listens(
+        user,
+        limit=redis_connection._redis.USER_RECENT_LISTENS_MAX
+    )
+    listen_data = [listen.to_api() for listen in listens]
+    oldest_listen_ts = int(min_ts_per_user.timestamp())
+    latest_listen_ts = int(max_ts_per_user.timestamp())
+    redis_connection._redis.put_recent_listens_for_user(
+        user["id"], listen_data, oldest_listen_ts, latest_listen_ts, version
+    )
+    return listen_data[:count], oldest_listen_ts, latest_listen_ts
+
+
 @api_bp.route("/user/<user_name>/listen-count", methods=['GET', 'OPTIONS'])
 @crossdomain
 @ratelimit()
@@ -511,6 +537,7 @@ def delete_listen():
     try:
         timescale_connection._ts.delete_listen(listened_at=listened_at,
                                                recording_msid=recording_msid, user_id=user["id"])
+        redis_connection._redis.invalidate_recent_listens_for_users([user["id"]])
     except TimescaleListenStoreException as e:
         current_app.logger.error("Cannot delete listen for user: %s" % str(e))
         raise APIServiceUnavailable(
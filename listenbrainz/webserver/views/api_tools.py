@@ -1,4 +1,4 @@
-from typing import Dict, Tuple
+from typing import Dict, Tuple, Optional
 from urllib.parse import urlparse
 
 import bleach
@@ -7,6 +7,7 @@ from kombu.entity import PERSISTENT_DELIVERY_MODE
 
 import listenbrainz.webserver.rabbitmq_connection as rabbitmq_connection
 import listenbrainz.webserver.redis_connection as redis_connection
+import listenbrainz.webserver.token_cache as token_cache
 import listenbrainz.db.user as db_user
 import time
 import orjson
@@ -469,22 +470,42 @@ def validate_auth_header(*, optional: bool = False, fetch_email: bool = False):
         fetch_email: if True, include email in the returned dict
     """
 
+    auth_token = _get_auth_token(optional)
+    if auth_token is None:
+        return None
+
+    user = db_user.get_by_token(db_conn, auth_token, fetch_email=fetch_email)
+    if user is None:
+        raise APIUnauthorized("Invalid authorization token.")
+
+    return user
+
+
+def validate_submission_auth_header():
+    """ Examine the current request headers for an Authorization: Token <uuid> header like
+        validate_auth_header, but return the cached minimal user record needed to submit listens
+        instead, see :class:`~listenbrainz.webserver.token_cache.TokenUserCache`. Raise an
+        APIUnauthorized() exception if the token is missing or invalid.
+    """
+    auth_token = _get_auth_token(optional=False)
+    user = token_cache.get_user_by_token(db_conn, auth_token)
+    if user is None:
+        raise APIUnauthorized("Invalid authorization token.")
+
+    return user
+
+
+def _get_auth_token(optional: bool) -> Optional[str]:
     auth_token = request.headers.get('Authorization')
     if not auth_token:
         if optional:
             return None
         raise APIUnauthorized("You need to provide an Authorization header.")
     try:
-        auth_token = auth_token.split(" ")[1]
+        return auth_token.split(" ")[1]
     except IndexError:
         raise APIUnauthorized("Provided Authorization header is invalid.")
 
-    user = db_user.get_by_token(db_conn, auth_token, fetch_email=fetch_email)
-    if user is None:
-        raise APIUnauthorized("Invalid authorization token.")
-
-    return user
-
 
 def _allow_metabrainz_domains(tag, name, value):
     """A bleach attribute cleaner for <a> tags that only allows hrefs to point
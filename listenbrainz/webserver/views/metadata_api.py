@@ -8,7 +8,7 @@ from listenbrainz.labs_api.labs.api.artist_credit_recording_lookup import Artist
 from listenbrainz.labs_api.labs.api.artist_credit_recording_release_lookup import \
     ArtistCreditRecordingReleaseLookupQuery
 from listenbrainz.mbid_mapping_writer.mbid_mapper import MBIDMapper
-from listenbrainz.webserver import ts_conn
+from listenbrainz.webserver import ts_conn, redis_connection
 from listenbrainz.webserver.decorators import crossdomain
 from listenbrainz.webserver.errors import APIBadRequest, APIInternalServerError
 from listenbrainz.webserver.utils import parse_boolean_arg
@@ -333,6 +333,7 @@ def submit_manual_mapping():
     )
 
     create_mbid_manual_mapping(ts_conn, mapping)
+    redis_connection._redis.invalidate_recent_listens_for_users([user["id"]])
 
     return jsonify({"status": "ok"})
 
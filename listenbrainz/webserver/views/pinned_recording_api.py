@@ -7,6 +7,7 @@ from listenbrainz.db.msid_mbid_mapping import fetch_track_metadata_for_items
 from listenbrainz.webserver import db_conn, ts_conn
 from listenbrainz.webserver.decorators import crossdomain
 from listenbrainz.webserver.errors import APIInternalServerError, APINotFound
+from listenbrainz.webserver.views.user_timeline_event_api import invalidate_feed_cache
 from brainzutils.ratelimit import ratelimit
 from listenbrainz.webserver.views.api_tools import (
     log_raise_400,
@@ -70,6 +71,7 @@ def pin_recording_for_user():
         current_app.logger.error("Error while inserting pinned track record: {}".format(e))
         raise APIInternalServerError("Something went wrong. Please try again.")
 
+    invalidate_feed_cache(user["id"])
     return jsonify({"pinned_recording": recording_to_pin_with_id.to_api()})
 
 
@@ -98,6 +100,7 @@ def unpin_recording_for_user():
     if recording_unpinned is False:
         raise APINotFound("Cannot find an active pinned recording for user '%s' to unpin" % (user["musicbrainz_id"]))
 
+    invalidate_feed_cache(user["id"])
     return jsonify({"status": "ok"})
 
 
@@ -128,6 +131,7 @@ def delete_pin_for_user(row_id):
     if recording_deleted is False:
         raise APINotFound("Cannot find pin with row_id '%s' for user '%s'" % (row_id, user["musicbrainz_id"]))
 
+    invalidate_feed_cache(user["id"])
     return jsonify({"status": "ok"})
 
 
@@ -21,7 +21,7 @@ from listenbrainz.domain.musicbrainz import MusicBrainzService
 from listenbrainz.domain.soundcloud import SoundCloudService
 from listenbrainz.domain.spotify import SpotifyService, SPOTIFY_LISTEN_PERMISSIONS, SPOTIFY_IMPORT_PERMISSIONS
 from listenbrainz.webserver import db_conn, ts_conn
-from listenbrainz.webserver import timescale_connection
+from listenbrainz.webserver import timescale_connection, token_cache
 from listenbrainz.webserver.decorators import web_listenstore_needed
 from listenbrainz.webserver.errors import APIServiceUnavailable, APINotFound, APIForbidden, APIInternalServerError
 from listenbrainz.webserver.login import api_login_required
@@ -38,6 +38,7 @@ EXPORT_FETCH_COUNT = 5000
 def reset_token():
     try:
         db_user.update_token(db_conn, current_user.id)
+        token_cache.invalidate_token(current_user.auth_token)
         return jsonify({"success": True})
     except DatabaseException:
         raise APIInternalServerError("Something went wrong! Unable to reset token right now.")
@@ -2,12 +2,13 @@ from flask import Blueprint, current_app, jsonify
 
 import listenbrainz.db.user as db_user
 import listenbrainz.db.user_relationship as db_user_relationship
-from listenbrainz.webserver import db_conn
+from listenbrainz.webserver import db_conn, redis_connection
 
 from listenbrainz.webserver.decorators import crossdomain
 from listenbrainz.webserver.errors import APINotFound, APIInternalServerError, APIBadRequest
 from brainzutils.ratelimit import ratelimit
 from listenbrainz.webserver.views.api_tools import validate_auth_header
+from listenbrainz.webserver.views.user_timeline_event_api import invalidate_feed_cache
 
 social_api_bp = Blueprint('social_api_v1', __name__)
 
@@ -107,6 +108,10 @@ def follow_user(user_name: str):
 
     try:
         db_user_relationship.insert(db_conn, current_user["id"], user["id"], "follow")
+        redis_connection._redis.invalidate_feed_timelines([current_user["id"]])
+        # the follow event shows up in the feeds of both users
+        invalidate_feed_cache(current_user["id"])
+        invalidate_feed_cache(user["id"])
     except Exception as e:
         current_app.logger.error("Error while trying to insert a relationship: %s", str(e))
         raise APIInternalServerError("Something went wrong, please try again later")
@@ -136,6 +141,10 @@ def unfollow_user(user_name: str):
 
     try:
         db_user_relationship.delete(db_conn, current_user["id"], user["id"], "follow")
+        redis_connection._redis.invalidate_feed_timelines([current_user["id"]])
+        # the follow event shows up in the feeds of both users
+        invalidate_feed_cache(current_user["id"])
+        invalidate_feed_cache(user["id"])
     except Exception as e:
         current_app.logger.error("Error while trying to delete a relationship: %s", str(e))
         raise APIInternalServerError("Something went wrong, please try again later")
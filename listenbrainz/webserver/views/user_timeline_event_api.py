@@ -16,12 +16,18 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
+import heapq
+import itertools
 import time
-from datetime import datetime, timedelta
-from typing import List, Dict, Iterable
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Iterable, Optional
 
 import pydantic
 import orjson
+from brainzutils import cache
 from brainzutils.ratelimit import ratelimit
 from flask import Blueprint, jsonify, request, current_app
 
@@ -37,7 +43,9 @@ from listenbrainz.db.model.review import CBReviewMetadata
 from listenbrainz.db.pinned_recording import get_pins_for_feed, get_pin_by_id
 from listenbrainz.db.exceptions import DatabaseException
 from listenbrainz.domain.critiquebrainz import CritiqueBrainzService
-from listenbrainz.webserver import timescale_connection, db_conn, ts_conn
+from listenbrainz.feed_fanout import DEFAULT_MAX_FOLLOWERS
+from listenbrainz.listen import Listen
+from listenbrainz.webserver import timescale_connection, db_conn, ts_conn, redis_connection, close_connections
 from listenbrainz.webserver.decorators import crossdomain, api_listenstore_needed
 from listenbrainz.webserver.errors import APIBadRequest, APIInternalServerError, APIUnauthorized, APINotFound, \
     APIForbidden
@@ -48,6 +56,11 @@ MAX_LISTEN_EVENTS_PER_USER = 2  # the maximum number of listens we want to retur
 MAX_LISTEN_EVENTS_OVERALL = 10  # the maximum number of listens we want to return in the feed overall across users
 DEFAULT_LISTEN_EVENT_WINDOW = timedelta(days=14) # to limit the search space of listen events and avoid timeouts
 DEFAULT_LISTEN_EVENT_WINDOW_NEW = timedelta(days=7) # to limit the search space of listen events and avoid timeouts
+FEED_QUERY_THREADS = 4  # the number of feed event sub-queries to run concurrently
+FEED_CACHE_KEY = "feed."
+FEED_CACHE_VERSION_KEY = "feed.version."
+FEED_CACHE_EXPIRY = 30  # seconds, feed pages are cached so that polling clients don't query the databases every time
+FEED_CACHE_VERSION_EXPIRY = 10 * FEED_CACHE_EXPIRY
 
 user_timeline_event_api_bp = Blueprint('user_timeline_event_api_bp', __name__)
 
@@ -97,6 +110,7 @@ def create_user_recording_recommendation_event(user_name):
 
     try:
         event = db_user_timeline_event.create_user_track_recommendation_event(db_conn, user['id'], metadata)
+        invalidate_feed_cache(user['id'])
     except DatabaseException:
         raise APIInternalServerError("Something went wrong, please try again.")
 
@@ -153,6 +167,7 @@ def create_user_notification_event(user_name):
 
     try:
         event = db_user_timeline_event.create_user_notification_event(db_conn, user['id'], metadata)
+        invalidate_feed_cache(user['id'])
     except DatabaseException:
         raise APIInternalServerError("Something went wrong, please try again.")
 
@@ -222,6 +237,7 @@ def create_user_cb_review_event(user_name):
         entity_name=review.name
     )
     event = db_user_timeline_event.create_user_cb_review_event(db_conn, user["id"], metadata)
+    invalidate_feed_cache(user["id"])
 
     event_data = event.dict()
     event_data["created"] = int(event_data["created"].timestamp())
@@ -259,64 +275,60 @@ def user_feed(user_name: str):
         raise APIForbidden("You don't have permissions to view this user's timeline.")
 
     min_ts, max_ts, count = _validate_get_endpoint_params()
+
+    cache_key = _get_feed_cache_key(user['id'], min_ts, max_ts, count)
+    cached = cache.get(cache_key, decode=False)
+    if cached:
+        return current_app.response_class(cached, mimetype="application/json")
+
     if min_ts is None and max_ts is None:
         max_ts = int(time.time())
 
     users_following = db_user_relationship.get_following_for_user(db_conn, user['id'])
 
-    # TODO: Remove these listen events from event list after listen events endpoint is active.
-    # get all listen events
-    if len(users_following) == 0:
-        listen_events = []
-    else:
-        listen_events = get_listen_events(users_following, min_ts, max_ts)
-
     # for events like "follow" and "recording recommendations", we want to show the user
     # their own events as well
     users_for_feed_events = users_following + [user]
-    follow_events = get_follow_events(
-        users_for_events=users_for_feed_events,
-        min_ts=min_ts or 0,
-        max_ts=max_ts or int(time.time()),
-        count=count,
-    )
-
-    recording_recommendation_events = get_recording_recommendation_events(
-        users_for_events=users_for_feed_events,
-        min_ts=min_ts or 0,
-        max_ts=max_ts or int(time.time()),
-        count=count,
-    )
-
-    personal_recording_recommendation_events = get_personal_recording_recommendation_events(
-        user=user,
-        min_ts=min_ts or 0,
-        max_ts=max_ts or int(time.time()),
-        count=count,
-    )
-
-    cb_review_events = get_cb_review_events(
-        users_for_events=users_for_feed_events,
-        min_ts=min_ts or 0,
-        max_ts=max_ts or int(time.time()),
-        count=count,
-    )
+    events_min_ts = min_ts or 0
+    events_max_ts = max_ts or int(time.time())
+
+    # the sub-queries are independent of each other, run them concurrently. each of them gets
+    # its own app context and hence its own database connections.
+    app = current_app._get_current_object()
+    with ThreadPoolExecutor(max_workers=FEED_QUERY_THREADS) as executor:
+        def submit(func, *args):
+            return executor.submit(_run_in_app_context, app, func, *args)
+
+        # TODO: Remove these listen events from event list after listen events endpoint is active.
+        # get all listen events
+        if len(users_following) == 0:
+            listen_events_future = None
+        else:
+            listen_events_future = submit(get_listen_events, users_following, min_ts, max_ts, user)
 
-    notification_events = get_notification_events(
-        user=user,
-        min_ts=min_ts or 0,
-        max_ts=max_ts or int(time.time()),
-        count=count,
-    )
+        follow_events_future = submit(get_follow_events, users_for_feed_events, events_min_ts, events_max_ts, count)
+        recording_recommendation_events_future = submit(
+            get_recording_recommendation_events, users_for_feed_events, events_min_ts, events_max_ts, count
+        )
+        personal_recording_recommendation_events_future = submit(
+            get_personal_recording_recommendation_events, user, events_min_ts, events_max_ts, count
+        )
+        cb_review_events_future = submit(get_cb_review_events, users_for_feed_events, events_min_ts, events_max_ts, count)
+        notification_events_future = submit(get_notification_events, user, events_min_ts, events_max_ts, count)
+        recording_pin_events_future = submit(
+            get_recording_pin_events, users_for_feed_events, events_min_ts, events_max_ts, count
+        )
+        hidden_events_future = submit(lambda: db_user_timeline_event.get_hidden_timeline_events(db_conn, user['id'], count))
 
-    recording_pin_events = get_recording_pin_events(
-        users_for_events=users_for_feed_events,
-        min_ts=min_ts or 0,
-        max_ts=max_ts or int(time.time()),
-        count=count,
-    )
+        listen_events = listen_events_future.result() if listen_events_future is not None else []
+        follow_events = follow_events_future.result()
+        recording_recommendation_events = recording_recommendation_events_future.result()
+        personal_recording_recommendation_events = personal_recording_recommendation_events_future.result()
+        cb_review_events = cb_review_events_future.result()
+        notification_events = notification_events_future.result()
+        recording_pin_events = recording_pin_events_future.result()
+        hidden_events = hidden_events_future.result()
 
-    hidden_events = db_user_timeline_event.get_hidden_timeline_events(db_conn, user['id'], count)
     hidden_events_pin = {}
     hidden_events_recommendation = {}
 
@@ -335,23 +347,25 @@ def user_feed(user_name: str):
             event.hidden = True
 
     # TODO: add playlist event and like event
-    all_events = sorted(
-        listen_events + follow_events + recording_recommendation_events + recording_pin_events
-        + cb_review_events + notification_events + personal_recording_recommendation_events,
-        key=lambda event: -event.created,
-    )
+    # each list of events is already sorted by time in descending order
+    all_events = list(itertools.islice(heapq.merge(
+        listen_events, follow_events, recording_recommendation_events, recording_pin_events,
+        cb_review_events, notification_events, personal_recording_recommendation_events,
+        key=lambda event: event.created,
+        reverse=True,
+    ), count))
 
     # Sadly, we need to serialize the event_type ourselves, otherwise, jsonify converts it badly.
     for index, event in enumerate(all_events):
         all_events[index].event_type = event.event_type.value
 
-    all_events = all_events[:count]
-
-    return jsonify({'payload': {
+    response = jsonify({'payload': {
         'count': len(all_events),
         'user_id': user_name,
         'events': [event.dict() for event in all_events],
     }})
+    cache.set(cache_key, response.get_data(), expirein=FEED_CACHE_EXPIRY, encode=False)
+    return response
 
 
 @user_timeline_event_api_bp.route('/user/<user_name>/feed/events/listens/following', methods=['OPTIONS', 'GET'])
@@ -512,6 +526,7 @@ def delete_feed_events(user_name):
             if not event_deleted:
                 raise APINotFound("Cannot find '%s' event with id '%s' for user '%s'" % (event["event_type"], event["id"],
                     user["id"]))
+            invalidate_feed_cache(user["id"])
             return jsonify({"status": "ok"})
 
         raise APIBadRequest("This event type is not supported for deletion via this method")
@@ -581,6 +596,7 @@ def hide_user_timeline_event(user_name):
 
     if db_user_relationship.is_following_user(db_conn, user['id'], result.user_id):
         db_user_timeline_event.hide_user_timeline_event(db_conn, user['id'], data["event_type"], data["event_id"])
+        invalidate_feed_cache(user['id'])
         return jsonify({"status": "ok"})
     else:
         raise APIUnauthorized("You cannot hide events of this user")
@@ -625,6 +641,7 @@ def unhide_user_timeline_event(user_name):
         raise APIBadRequest("JSON document must contain both event_type and event_id", data)
 
     db_user_timeline_event.unhide_timeline_event(db_conn, user['id'], data['event_type'], data['event_id'])
+    invalidate_feed_cache(user['id'])
     return jsonify({"status": "ok"})
 
 
@@ -685,6 +702,7 @@ def create_personal_recommendation_event(user_name):
         if non_followers:
             raise APIBadRequest(f"You cannot recommend tracks to non-followers! These people don't follow you {str(non_followers)}")
         event = db_user_timeline_event.create_personal_recommendation_event(db_conn, user['id'], metadata)
+        invalidate_feed_cache(user['id'])
     except pydantic.ValidationError as e:
         raise APIBadRequest(f"Invalid metadata: {str(e)}")
     except DatabaseException:
@@ -696,12 +714,40 @@ def create_personal_recommendation_event(user_name):
     return jsonify(event_data)
 
 
+def _get_feed_cache_key(user_id: int, min_ts: Optional[int], max_ts: Optional[int], count: int) -> str:
+    """ Returns the cache key of a feed page of the user, the key changes whenever the feed cache of the user
+    is invalidated. """
+    version = cache.get(FEED_CACHE_VERSION_KEY + str(user_id), decode=False) or b"0"
+    return f"{FEED_CACHE_KEY}{user_id}.{version.decode('utf-8')}.{min_ts}.{max_ts}.{count}"
+
+
+def invalidate_feed_cache(user_id: int):
+    """ Invalidate the cached feed pages of the user, should be called when the user changes events in their feed.
+    Changes by the users they follow show up once the cached pages expire. """
+    # a random version never repeats, so pages cached under an earlier version can't be served again even if a
+    # slow request stores its page after the invalidation. the version outlives the pages cached under it.
+    cache.set(FEED_CACHE_VERSION_KEY + str(user_id), uuid.uuid4().hex, expirein=FEED_CACHE_VERSION_EXPIRY, encode=False)
+
+
+def _run_in_app_context(app, func, *args):
+    """ Run func in a new app context, so that it uses its own database connections, and close them afterwards. """
+    with app.app_context():
+        try:
+            return func(*args)
+        finally:
+            close_connections()
+
+
 def get_listen_events(
     users: List[Dict],
     min_ts: int,
     max_ts: int,
+    user: Optional[Dict] = None,
 ) -> List[APITimelineEvent]:
     """ Gets all listen events in the feed.
+
+    If the feed fanout is enabled, the listens are taken from the feed timeline of the user when
+    it covers the requested range.
     """
     # to avoid timeouts while fetching listen events, we want to make
     # sure that both min_ts and max_ts are defined. if only one of those
@@ -722,13 +768,21 @@ def get_listen_events(
             max_ts = datetime.utcnow()
             min_ts = max_ts - DEFAULT_LISTEN_EVENT_WINDOW
 
-    listens = timescale_connection._ts.fetch_recent_listens_for_users(
-        users,
-        min_ts=min_ts,
-        max_ts=max_ts,
-        per_user_limit=MAX_LISTEN_EVENTS_PER_USER,
-        limit=MAX_LISTEN_EVENTS_OVERALL
-    )
+    listens = None
+    if user is not None and current_app.config.get("FEED_FANOUT_ENABLED", False):
+        try:
+            listens = get_listens_from_feed_timeline(user, users, min_ts, max_ts)
+        except Exception:
+            current_app.logger.error("Cannot fetch listens from feed timeline:", exc_info=True)
+
+    if listens is None:
+        listens = timescale_connection._ts.fetch_recent_listens_for_users(
+            users,
+            min_ts=min_ts,
+            max_ts=max_ts,
+            per_user_limit=MAX_LISTEN_EVENTS_PER_USER,
+            limit=MAX_LISTEN_EVENTS_OVERALL
+        )
 
     events = []
     for listen in listens:
@@ -748,6 +802,68 @@ def get_listen_events(
     return events
 
 
+def get_listens_from_feed_timeline(user: Dict, users: List[Dict], min_ts: datetime, max_ts: datetime) -> Optional[List[Listen]]:
+    """ Gets the feed listens of the followed users from the feed timeline of the user written by the feed fanout,
+    with the same limits as fetch_recent_listens_for_users. The listens of users with too many followers to be
+    copied to the timelines are fetched from timescale.
+
+    Returns None if the timeline of the user doesn't cover the requested range.
+    """
+    min_ts_epoch = int(min_ts.replace(tzinfo=timezone.utc).timestamp())
+    max_ts_epoch = int(max_ts.replace(tzinfo=timezone.utc).timestamp())
+
+    max_followers = current_app.config.get("FEED_FANOUT_MAX_FOLLOWERS", DEFAULT_MAX_FOLLOWERS)
+    user_ids = [u["id"] for u in users]
+    follower_counts = db_user_relationship.get_follower_counts(db_conn, user_ids)
+    # users who had too many followers at some point have no timeline entries for the listens skipped meanwhile
+    skipped = redis_connection._redis.get_feed_fanout_skipped(user_ids)
+    fanned_out_users = {}
+    pulled_users = []
+    for followed in users:
+        if follower_counts.get(followed["id"], 0) > max_followers or skipped.get(followed["id"], 0) > min_ts_epoch:
+            pulled_users.append(followed)
+        else:
+            fanned_out_users[followed["id"]] = followed["musicbrainz_id"]
+
+    timeline = redis_connection._redis.get_feed_timeline(user["id"], min_ts_epoch, max_ts_epoch)
+    if timeline is None:
+        return None
+    refs, complete_from = timeline
+
+    selected = []
+    per_user_count = Counter()
+    for ref in refs:
+        user_id, listened_at, _ = ref
+        if listened_at < complete_from or len(selected) == MAX_LISTEN_EVENTS_OVERALL:
+            break
+        if user_id not in fanned_out_users or per_user_count[user_id] == MAX_LISTEN_EVENTS_PER_USER:
+            continue
+        per_user_count[user_id] += 1
+        selected.append(ref)
+
+    # listens older than complete_from may be missing from the timeline
+    if len(selected) < MAX_LISTEN_EVENTS_OVERALL and min_ts_epoch < complete_from:
+        return None
+
+    listens = timescale_connection._ts.fetch_listens_by_keys(fanned_out_users, selected)
+    if len(listens) != len(selected):
+        # some of the listens have been deleted since they were added to the timeline
+        return None
+
+    if pulled_users:
+        pulled_listens = timescale_connection._ts.fetch_recent_listens_for_users(
+            pulled_users,
+            min_ts=min_ts,
+            max_ts=max_ts,
+            per_user_limit=MAX_LISTEN_EVENTS_PER_USER,
+            limit=MAX_LISTEN_EVENTS_OVERALL
+        )
+        merged = heapq.merge(listens, pulled_listens, key=lambda listen: listen.timestamp, reverse=True)
+        listens = list(itertools.islice(merged, MAX_LISTEN_EVENTS_OVERALL))
+
+    return listens
+
+
 def get_all_listen_events(
     users: List[Dict],
     min_ts: int,
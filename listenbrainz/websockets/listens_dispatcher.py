@@ -1,6 +1,9 @@
-import json
 import time
+from collections import defaultdict
+from time import monotonic
 
+import orjson
+from brainzutils import metrics
 from kombu.mixins import ConsumerMixin
 
 from listenbrainz.listen import Listen, NowPlayingListen
@@ -8,6 +11,9 @@ from listenbrainz.utils import get_fallback_connection_name
 
 from kombu import Connection, Exchange, Queue, Consumer
 
+METRIC_UPDATE_INTERVAL = 60  # seconds
+SOCKETIO_NAMESPACE = "/"
+
 
 class ListensDispatcher(ConsumerMixin):
 
@@ -22,19 +28,108 @@ class ListensDispatcher(ConsumerMixin):
 
         self.unique_exchange = Exchange(app.config["UNIQUE_EXCHANGE"], "fanout", durable=False)
         self.playing_now_exchange = Exchange(app.config["PLAYING_NOW_EXCHANGE"], "fanout", durable=False)
-        self.websockets_queue = Queue(app.config["WEBSOCKETS_QUEUE"], exchange=self.unique_exchange, durable=True)
-        self.playing_now_queue = Queue(app.config["PLAYING_NOW_QUEUE"], exchange=self.playing_now_exchange,
-                                       durable=True)
+
+        # with a socketio message queue, there can be several websockets nodes. each node then consumes all the
+        # listens from its own queue and delivers them directly to the clients connected to it, instead of
+        # competing for the messages of the shared queue and broadcasting them to all nodes. the queues are named
+        # by the broker, all the nodes run with the same container name so a name of our own could be shared.
+        self.multi_node = bool(app.config.get("WEBSOCKETS_MESSAGE_QUEUE"))
+        if self.multi_node:
+            self.websockets_queue = Queue("", exchange=self.unique_exchange, exclusive=True, auto_delete=True)
+            self.playing_now_queue = Queue("", exchange=self.playing_now_exchange, exclusive=True, auto_delete=True)
+        else:
+            self.websockets_queue = Queue(app.config["WEBSOCKETS_QUEUE"], exchange=self.unique_exchange, durable=True)
+            self.playing_now_queue = Queue(app.config["PLAYING_NOW_QUEUE"], exchange=self.playing_now_exchange,
+                                           durable=True)
+
+        # if enabled, only the listens of users with connected clients are serialized and all the listens
+        # of a user in a message are sent in a single "listens" event. nodes only know about their own
+        # clients, so this is always enabled with multiple nodes.
+        self.coalesce = app.config.get("WEBSOCKETS_COALESCE_EMITS", False) or self.multi_node
+
+        # these are counts since the last metric update was submitted
+        self.emitted_events = 0
+        self.emitted_listens = 0
+        self.skipped_listens = 0
+        self.metric_submission_time = monotonic() + METRIC_UPDATE_INTERVAL
+
+    def is_room_occupied(self, room: str) -> bool:
+        """ Check whether any client connected to this process has joined the room """
+        rooms = self.socketio.server.manager.rooms.get(SOCKETIO_NAMESPACE, {})
+        return bool(rooms.get(room))
 
     def send_listens(self, event_name, message):
-        listens = json.loads(message.body)
+        listens = orjson.loads(message.body)
+        if self.coalesce:
+            self.send_listens_coalesced(event_name, listens)
+        else:
+            for data in listens:
+                if event_name == "playing_now":
+                    listen = NowPlayingListen(user_id=data["user_id"], user_name=data["user_name"], data=data["track_metadata"])
+                else:
+                    listen = Listen.from_json(data)
+                self.socketio.emit(event_name, orjson.dumps(listen.to_api()).decode("utf-8"), to=listen.user_name)
+                self.emitted_events += 1
+                self.emitted_listens += 1
+        message.ack()
+        self.submit_metrics()
+
+    def send_listens_coalesced(self, event_name, listens):
+        """ Group the listens by user and emit them to the rooms of the users which have connected clients.
+
+        A single listen is sent as before, more listens for the same user are sent together as a "listens"
+        event with a list of the serialized listens in the order they were received. Only the last
+        playing now of each user is sent.
+        """
+        listens_by_room = defaultdict(list)
         for data in listens:
+            listens_by_room[data["user_name"]].append(data)
+
+        for room, room_listens in listens_by_room.items():
+            if not self.is_room_occupied(room):
+                self.skipped_listens += len(room_listens)
+                continue
+
             if event_name == "playing_now":
+                data = room_listens[-1]
                 listen = NowPlayingListen(user_id=data["user_id"], user_name=data["user_name"], data=data["track_metadata"])
+                self.emit(event_name, orjson.dumps(listen.to_api()).decode("utf-8"), room)
+                self.skipped_listens += len(room_listens) - 1
+                self.emitted_listens += 1
             else:
-                listen = Listen.from_json(data)
-            self.socketio.emit(event_name, json.dumps(listen.to_api()), to=listen.user_name)
-        message.ack()
+                serialized = [orjson.dumps(Listen.from_json(data).to_api()).decode("utf-8") for data in room_listens]
+                if len(serialized) == 1:
+                    self.emit(event_name, serialized[0], room)
+                else:
+                    self.emit("listens", serialized, room)
+                self.emitted_listens += len(serialized)
+            self.emitted_events += 1
+
+    def emit(self, event_name, data, room):
+        """ Emit the event to the clients of the room connected to this process """
+        if self.multi_node:
+            # every node receives all the listens, don't send them to the other nodes through the message queue
+            self.socketio.emit(event_name, data, to=room, ignore_queue=True)
+        else:
+            self.socketio.emit(event_name, data, to=room)
+
+    def submit_metrics(self):
+        if monotonic() < self.metric_submission_time:
+            return
+        self.metric_submission_time = monotonic() + METRIC_UPDATE_INTERVAL
+
+        try:
+            metrics.set(
+                "websockets_dispatcher",
+                emitted_events=self.emitted_events,
+                emitted_listens=self.emitted_listens,
+                skipped_listens=self.skipped_listens
+            )
+        except Exception:
+            self.app.logger.error("Cannot submit websockets dispatcher metrics:", exc_info=True)
+        self.emitted_events = 0
+        self.emitted_listens = 0
+        self.skipped_listens = 0
 
     def get_consumers(self, _, channel):
         self.playing_now_channel = channel.connection.channel()
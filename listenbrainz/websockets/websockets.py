@@ -43,7 +43,14 @@ def joined(data):
 
 
 def run_websockets(app, host='0.0.0.0', port=7082, debug=True):
-    socketio.init_app(app)
+    # with a message queue, events emitted to rooms, like playlist changes, reach the clients connected
+    # to any of the websockets nodes
+    message_queue = app.config.get("WEBSOCKETS_MESSAGE_QUEUE")
+    if message_queue:
+        socketio.init_app(app, message_queue=message_queue,
+                          channel=app.config.get("WEBSOCKETS_MESSAGE_QUEUE_CHANNEL", "listenbrainz-websockets"))
+    else:
+        socketio.init_app(app)
     dispatcher = ListensDispatcher(app, socketio)
     socketio.start_background_task(dispatcher.start)
     socketio.run(app, debug=debug, host=host, port=port)
@@ -80,6 +80,15 @@ USER_SIMILARITY_METADATA_DATAFRAME = os.path.join(
 USER_SIMILARITY_MAPPED_LISTENS = os.path.join(
     USER_SIMILARITY_DATAFRAME_DIR, 'mapped_listens_df.parquet')
 
+#############################################
+# paths/dirs used by incremental user stats #
+#############################################
+# listen counts of each user per month, see listenbrainz_spark.stats.user.partials
+USER_STATS_PARTIALS_DIRECTORY = os.path.join('/', 'stats', 'user', 'partials')
+USER_STATS_MONTHLY_LISTEN_COUNTS = os.path.join(USER_STATS_PARTIALS_DIRECTORY, 'monthly_listen_counts.parquet')
+# the listen files which have been aggregated into the monthly listen counts
+USER_STATS_PARTIALS_SOURCES = os.path.join(USER_STATS_PARTIALS_DIRECTORY, 'sources.parquet')
+
 # MusicBrainz Release JSON dump
 MUSICBRAINZ_RELEASE_DUMP = "/musicbrainz/release"
 MUSICBRAINZ_RELEASE_DUMP_JSON_FILE = "/musicbrainz/release/mbdump/release"
@@ -3,7 +3,7 @@ from more_itertools import chunked
 from listenbrainz_spark import config
 from listenbrainz_spark.path import MLHD_PLUS_DATA_DIRECTORY, RELEASE_METADATA_CACHE_DATAFRAME
 from listenbrainz_spark.stats import run_query
-from listenbrainz_spark.utils import get_listens_from_dump, read_files_from_HDFS
+from listenbrainz_spark.utils import get_listens_from_dump, read_files_from_HDFS, rows_to_arrow
 
 STATS_PER_MESSAGE = 10000
 
@@ -19,14 +19,9 @@ def generate_popularity_stats(name, query, mlhd):
     itr = df.toLocalIterator()
 
     for rows in chunked(itr, STATS_PER_MESSAGE):
-        entries = []
-        for row in rows:
-            entry = row.asDict(recursive=True)
-            entries.append(entry)
-
         yield {
             "type": name,
-            "data": entries,
+            "data": rows_to_arrow(rows),
             "mlhd": mlhd
         }
 
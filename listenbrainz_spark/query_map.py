@@ -6,6 +6,7 @@ import listenbrainz_spark.recommendations.recording.train_models
 import listenbrainz_spark.request_consumer.jobs.import_dump
 import listenbrainz_spark.stats.sitewide.entity
 import listenbrainz_spark.stats.sitewide.listening_activity
+import listenbrainz_spark.stats.user.combined
 import listenbrainz_spark.stats.user.daily_activity
 import listenbrainz_spark.stats.user.entity
 import listenbrainz_spark.stats.user.listening_activity
@@ -27,6 +28,7 @@ import listenbrainz_spark.fresh_releases.fresh_releases
 import listenbrainz_spark.similarity.recording
 import listenbrainz_spark.similarity.artist
 import listenbrainz_spark.similarity.user
+import listenbrainz_spark.similarity.embeddings
 import listenbrainz_spark.postgres
 import listenbrainz_spark.troi.periodic_jams
 import listenbrainz_spark.tags.tags
@@ -41,6 +43,7 @@ functions = {
     'stats.user.entity': listenbrainz_spark.stats.user.entity.get_entity_stats,
     'stats.user.listening_activity': listenbrainz_spark.stats.user.listening_activity.get_listening_activity,
     'stats.user.daily_activity': listenbrainz_spark.stats.user.daily_activity.get_daily_activity,
+    'stats.user.all': listenbrainz_spark.stats.user.combined.get_all_stats,
     'stats.sitewide.entity': listenbrainz_spark.stats.sitewide.entity.get_entity_stats,
     'stats.sitewide.listening_activity': listenbrainz_spark.stats.sitewide.listening_activity.get_listening_activity,
     'import.dump.full_newest': listenbrainz_spark.request_consumer.jobs.import_dump.import_newest_full_dump_handler,
@@ -64,6 +67,7 @@ functions = {
     'similarity.recording.mlhd': listenbrainz_spark.mlhd.similarity.main,
     'similarity.recording': listenbrainz_spark.similarity.recording.main,
     'similarity.artist': listenbrainz_spark.similarity.artist.main,
+    'similarity.embeddings': listenbrainz_spark.similarity.embeddings.main,
     'popularity.all': listenbrainz_spark.popularity.main.main,
     'year_in_music.new_releases_of_top_artists':
         listenbrainz_spark.year_in_music.new_releases_of_top_artists.get_new_releases_of_top_artists,
@@ -13,7 +13,9 @@ import logging
 import time
 from collections import defaultdict
 
+import numpy as np
 import pyspark.sql
+from more_itertools import chunked
 from py4j.protocol import Py4JJavaError
 from pyspark.ml.recommendation import ALSModel
 from pyspark.sql.functions import col
@@ -32,6 +34,11 @@ from listenbrainz_spark.utils import save_parquet
 
 logger = logging.getLogger(__name__)
 
+# the number of items scored at once by the blocked recommendations, each block is broadcast separately
+ITEM_BLOCK_SIZE = 32768
+# the number of users scored at once in a partition by the blocked recommendations
+USER_BATCH_SIZE = 256
+
 
 def get_most_recent_model_meta():
     """ Get model id of recently created model.
@@ -211,7 +218,7 @@ def get_user_name_and_user_id(all_users_df, users):
     return users_df
 
 
-def create_messages(model_id, model_html_file, raw_recs_df, active_user_count, total_time):
+def create_messages(model_id, model_html_file, raw_recs_df, active_user_count, total_time, stage_times=None):
     """ Create messages to send the data to the webserver via RabbitMQ.
 
         Args:
@@ -220,6 +227,7 @@ def create_messages(model_id, model_html_file, raw_recs_df, active_user_count, t
             raw_recs_df (dataframe): Raw recommendations.
             active_user_count (int): Number of users active in the last week.
             total_time (float): Time taken in exceuting the whole script.
+            stage_times (dict): Time taken in seconds by each stage of the script.
 
         Returns:
             messages: A list of messages to be sent via RabbitMQ
@@ -251,7 +259,8 @@ def create_messages(model_id, model_html_file, raw_recs_df, active_user_count, t
         'type': 'cf_recommendations_recording_mail',
         'active_user_count': active_user_count,
         'raw_rec_user_count': raw_rec_user_count,
-        'total_time': '{:.2f}'.format(total_time / 3600)
+        'total_time': '{:.2f}'.format(total_time / 3600),
+        'stage_times': {stage: '{:.2f}'.format(seconds) for stage, seconds in (stage_times or {}).items()}
     }
 
 
@@ -307,12 +316,108 @@ def get_raw_recommendations(model: ALSModel, limit, users_df):
     return recs_df
 
 
+def _merge_top_k(scores, ids, limit):
+    """ Keep the limit highest scores in each row of the scores matrix along with the corresponding ids. """
+    if scores.shape[1] > limit:
+        top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+        scores = np.take_along_axis(scores, top, axis=1)
+        ids = np.take_along_axis(ids, top, axis=1)
+    return scores, ids
+
+
+def _recommend_for_batch(rows, item_blocks, limit):
+    """ Calculate the top recommendations for a batch of users using the broadcast blocks of item factors. """
+    user_factors = np.array([row.features for row in rows], dtype=np.float32)
+
+    best_scores = np.empty((len(rows), 0), dtype=np.float32)
+    best_ids = np.empty((len(rows), 0), dtype=np.int64)
+    for block in item_blocks:
+        block_ids, block_factors = block.value
+        scores = user_factors @ block_factors.T
+        scores, ids = _merge_top_k(scores, np.broadcast_to(block_ids, scores.shape), limit)
+        best_scores, best_ids = _merge_top_k(
+            np.concatenate((best_scores, scores), axis=1),
+            np.concatenate((best_ids, ids), axis=1),
+            limit
+        )
+
+    for row, scores, ids in zip(rows, best_scores, best_ids):
+        order = np.argsort(-scores, kind="stable")
+        for score, recording_id in zip(scores[order], ids[order]):
+            yield row.spark_user_id, int(recording_id), float(score)
+
+
+def broadcast_item_factors(model: ALSModel, block_size: int = ITEM_BLOCK_SIZE):
+    """ Broadcast the item factors of the model in blocks of block_size items.
+
+        Returns:
+            the list of broadcast blocks, each block is a tuple of item ids and the matrix of their factors.
+    """
+    ids, factors = [], []
+    for row in model.itemFactors.toLocalIterator():
+        ids.append(row.id)
+        factors.append(row.features)
+    ids = np.array(ids, dtype=np.int64)
+    factors = np.array(factors, dtype=np.float32)
+
+    context = listenbrainz_spark.context
+    return [
+        context.broadcast((ids[start:start + block_size], factors[start:start + block_size]))
+        for start in range(0, len(ids), block_size)
+    ]
+
+
+def get_blocked_raw_recommendations(model: ALSModel, limit, users_df):
+    """ Get recommendations from the model by scoring all items for each user in blocks.
+
+        The item factors are broadcast in blocks and each partition of users scores a batch of users against a
+        block at a time using a matrix multiplication, keeping only the top scores of each user between blocks.
+        This avoids the shuffles of recommendForUserSubset.
+
+        Args:
+            model: the ALSModel to use to predict tracks
+            limit: maximum number of recs to generate per user
+            users_df: list of users names to generate recommendations.
+
+        Returns:
+            recs_df: generated recommendations.
+    """
+    item_blocks = broadcast_item_factors(model, ITEM_BLOCK_SIZE)
+    try:
+        users = model.userFactors \
+            .join(users_df.select("spark_user_id"), col("id") == col("spark_user_id")) \
+            .select("spark_user_id", "features")
+
+        def recommend_partition(rows):
+            for batch in chunked(rows, USER_BATCH_SIZE):
+                yield from _recommend_for_batch(batch, item_blocks, limit)
+
+        recommendations = listenbrainz_spark.session.createDataFrame(
+            users.rdd.mapPartitions(recommend_partition),
+            schema="spark_user_id INT, recording_id INT, prediction FLOAT"
+        )
+        return process_recommendations(recommendations, limit)
+    finally:
+        # the broadcasts are only removed from the executors, they are sent again if the recommendations
+        # need to be recomputed
+        for block in item_blocks:
+            block.unpersist()
+
+
 def get_user_count(df):
     """ Get distinct user count from the given dataframe. """
     return df.select('user_id').distinct().count()
 
 
-def main(recommendation_raw_limit=None, users=None):
+def main(recommendation_raw_limit=None, users=None, blocked=False):
+    """ Generate recommendations for the given users, or all users if none are given.
+
+        Args:
+            recommendation_raw_limit: the number of recommendations to generate per user
+            users: the names of the users to generate recommendations for
+            blocked: use get_blocked_raw_recommendations instead of the recommendForUserSubset of the model
+    """
+    stage_times = {}
 
     try:
         listenbrainz_spark.init_spark_session('Recommendations')
@@ -334,8 +439,10 @@ def main(recommendation_raw_limit=None, users=None):
         raise
 
     logger.info('Loading model...')
+    ts = time.monotonic()
     model_id, model_html_file = get_most_recent_model_meta()
     model = load_model(model_id)
+    stage_times['load_model'] = time.monotonic() - ts
 
     # an action must be called to persist data in memory
     recordings_df.count()
@@ -352,16 +459,21 @@ def main(recommendation_raw_limit=None, users=None):
         users_df.persist()
 
         users_df.createOrReplaceTempView("user")
-        logger.info('Took {:.2f}sec to get active user count'.format(time.monotonic() - ts_initial))
+        stage_times['active_users'] = time.monotonic() - ts_initial
+        logger.info('Took {:.2f}sec to get active user count'.format(stage_times['active_users']))
     except EmptyDataframeExcpetion as err:
         logger.error(str(err), exc_info=True)
         raise
 
     logger.info('Generating recommendations...')
     ts = time.monotonic()
-    raw_recs_df = get_raw_recommendations(model, recommendation_raw_limit, users_df)
+    if blocked:
+        raw_recs_df = get_blocked_raw_recommendations(model, recommendation_raw_limit, users_df)
+    else:
+        raw_recs_df = get_raw_recommendations(model, recommendation_raw_limit, users_df)
+    stage_times['recommendations'] = time.monotonic() - ts
     logger.info('Recommendations generated!')
-    logger.info('Took {:.2f}sec to generate recommendations for all active users'.format(time.monotonic() - ts))
+    logger.info('Took {:.2f}sec to generate recommendations for all active users'.format(stage_times['recommendations']))
 
     # persisted data must be cleared from memory after usage to avoid OOM
     recordings_df.unpersist()
@@ -369,7 +481,7 @@ def main(recommendation_raw_limit=None, users=None):
     total_time = time.monotonic() - ts_initial
     logger.info('Total time: {:.2f}sec'.format(total_time))
 
-    result = create_messages(model_id, model_html_file, raw_recs_df, active_user_count, total_time)
+    result = create_messages(model_id, model_html_file, raw_recs_df, active_user_count, total_time, stage_times)
 
     users_df.unpersist()
 
@@ -255,10 +255,39 @@ class RecommendTestClass(RecommendationsTestCase):
                 'type': 'cf_recommendations_recording_mail',
                 'active_user_count': active_user_count,
                 'raw_rec_user_count': raw_rec_user_count,
-                'total_time': '1.00'
+                'total_time': '1.00',
+                'stage_times': {}
             }
         ])
 
+        data = recommend.create_messages(model_id, model_html_file, raw_rec_df, active_user_count, total_time,
+                                         {'load_model': 12.345, 'recommendations': 100})
+        self.assertEqual(list(data)[-1]['stage_times'], {'load_model': '12.35', 'recommendations': '100.00'})
+
+    @patch('listenbrainz_spark.recommendations.recording.recommend.ITEM_BLOCK_SIZE', 3)
+    @patch('listenbrainz_spark.recommendations.recording.recommend.process_recommendations')
+    def test_get_blocked_raw_recommendations(self, mock_process):
+        mock_process.side_effect = lambda df, limit: df
+        model = MagicMock()
+        model.itemFactors = listenbrainz_spark.session.createDataFrame(
+            [(4, [-1.0, 0.0]), (1, [1.0, 0.0]), (2, [0.0, 1.0]), (3, [1.0, 1.0])],
+            schema="id INT, features ARRAY<FLOAT>"
+        )
+        model.userFactors = listenbrainz_spark.session.createDataFrame(
+            [(1, [1.0, 0.5]), (2, [0.2, 1.0]), (3, [1.0, 1.0])],
+            schema="id INT, features ARRAY<FLOAT>"
+        )
+        users_df = listenbrainz_spark.session.createDataFrame([Row(spark_user_id=1), Row(spark_user_id=2)])
+
+        def get_recs(df):
+            recs = {}
+            for row in df.collect():
+                recs.setdefault(row.spark_user_id, []).append((row.recording_id, round(row.prediction, 4)))
+            return {user: sorted(items, key=lambda x: -x[1]) for user, items in recs.items()}
+
+        recs_df = recommend.get_blocked_raw_recommendations(model, 2, users_df)
+        self.assertEqual({1: [(3, 1.5), (1, 1.0)], 2: [(3, 1.2), (2, 1.0)]}, get_recs(recs_df))
+
     def test_get_user_count(self):
         df = listenbrainz_spark.session.createDataFrame(
             [Row(user_id=3), Row(user_id=3), Row(user_id=2)], schema=None
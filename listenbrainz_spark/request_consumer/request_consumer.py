@@ -16,11 +16,14 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
+import itertools
 import json
 import socket
 import time
 import logging
 
+import pyarrow as pa
+import pyarrow.ipc
 from kombu import Exchange, Queue, Message, Connection, Consumer
 from kombu.entity import PERSISTENT_DELIVERY_MODE
 from kombu.mixins import ConsumerProducerMixin
@@ -31,17 +34,43 @@ from listenbrainz_spark import config, hdfs_connection
 
 
 RABBITMQ_HEARTBEAT_TIME = 2 * 60 * 60  # 2 hours -- a full dump import takes 40 minutes right now
+# content type of the messages whose data is sent as an arrow table, the rest of the message is sent in a header
+ARROW_STREAM_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
 
 logger = logging.getLogger(__name__)
 
 
+def serialize_message(message):
+    """ Serialize a message to publish to the result queue.
+
+    If the data of the message is an arrow table, the table is sent in the IPC stream format as the body of the
+    message and the other fields of the message are sent as json in the message header. Otherwise, the whole
+    message is sent as json.
+
+    Returns:
+        a tuple of the body, the content type (None for json) and the headers of the message
+    """
+    data = message.get("data")
+    if not isinstance(data, pa.Table):
+        return json.dumps(message), None, None
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, data.schema) as writer:
+        writer.write_table(data)
+    headers = {"message": json.dumps({key: value for key, value in message.items() if key != "data"})}
+    return sink.getvalue().to_pybytes(), ARROW_STREAM_CONTENT_TYPE, headers
+
+
 class RequestConsumer(ConsumerProducerMixin):
 
     def __init__(self):
         self.connection = None
 
         self.spark_result_exchange = Exchange(config.SPARK_RESULT_EXCHANGE, "fanout", durable=False)
-        self.spark_result_queue = Queue(config.SPARK_REQUEST_QUEUE, exchange=self.spark_result_exchange, durable=True)
+        self.spark_result_queue = Queue(config.SPARK_RESULT_QUEUE, exchange=self.spark_result_exchange, durable=True)
+        self.spark_result_control_exchange = Exchange(config.SPARK_RESULT_CONTROL_EXCHANGE, "fanout", durable=False)
+        self.spark_result_control_queue = Queue(config.SPARK_RESULT_CONTROL_QUEUE,
+                                                exchange=self.spark_result_control_exchange, durable=True)
         self.spark_request_exchange = Exchange(config.SPARK_REQUEST_EXCHANGE, "fanout", durable=False)
         self.spark_request_queue = Queue(config.SPARK_REQUEST_QUEUE, exchange=self.spark_request_exchange, durable=True)
 
@@ -79,20 +108,53 @@ class RequestConsumer(ConsumerProducerMixin):
             logger.error("Error in the query handler for query '%s': %s", query, str(e), exc_info=True)
             return None
 
+    def get_result_queue(self, messages):
+        """ Get the exchange and queue to publish the results of a request to.
+
+        Requests with a single result, like echo and the notifications of imports, are sent to the control queue
+        so that the spark reader doesn't receive them only after the bulk datasets sent before them. The results of
+        a request are always sent to the same queue, which keeps the start, data and end messages of a dataset in
+        order.
+
+        Returns:
+            a tuple of the exchange, the queue and an iterator over all the messages
+        """
+        messages = iter(messages)
+        head = list(itertools.islice(messages, 2))
+        if len(head) == 1:
+            exchange, queue = self.spark_result_control_exchange, self.spark_result_control_queue
+        else:
+            exchange, queue = self.spark_result_exchange, self.spark_result_queue
+        return exchange, queue, itertools.chain(head, messages)
+
     def push_to_result_queue(self, messages):
         logger.debug("Pushing result to RabbitMQ...")
         num_of_messages = 0
         avg_size_of_message = 0
+        exchange, queue, messages = self.get_result_queue(messages)
         for message in messages:
             num_of_messages += 1
-            body = json.dumps(message)
+            body, content_type, headers = serialize_message(message)
             avg_size_of_message += len(body)
-            self.producer.publish(
-                exchange=self.spark_result_exchange,
-                routing_key='',
-                body=body,
-                properties=PERSISTENT_DELIVERY_MODE,
-            )
+            if content_type is None:
+                self.producer.publish(
+                    exchange=exchange,
+                    routing_key='',
+                    body=body,
+                    properties=PERSISTENT_DELIVERY_MODE,
+                    declare=[queue],
+                )
+            else:
+                self.producer.publish(
+                    exchange=exchange,
+                    routing_key='',
+                    body=body,
+                    content_type=content_type,
+                    content_encoding="binary",
+                    headers=headers,
+                    properties=PERSISTENT_DELIVERY_MODE,
+                    declare=[queue],
+                )
 
         if num_of_messages:
             avg_size_of_message //= num_of_messages
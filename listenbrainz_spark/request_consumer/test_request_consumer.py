@@ -1,6 +1,11 @@
+import json
 from unittest.mock import patch, MagicMock
 
-from listenbrainz_spark.request_consumer.request_consumer import RequestConsumer
+import pyarrow as pa
+import pyarrow.ipc
+
+from listenbrainz_spark.request_consumer.request_consumer import RequestConsumer, serialize_message, \
+    ARROW_STREAM_CONTENT_TYPE
 from listenbrainz_spark.tests import SparkNewTestCase
 
 
@@ -33,3 +38,25 @@ class RequestConsumerTestCase(SparkNewTestCase):
         self.assertEqual(self.consumer.get_result({'query': 'i_know_what_this_means'}), {'result': 'ok'})
         mock_get_query_handler.assert_called_once()
         mock_query_handler.assert_called_once()
+
+    def test_serialize_message(self):
+        message = {"type": "similarity_recording_end", "algorithm": "foo"}
+        self.assertEqual(serialize_message(message), (json.dumps(message), None, None))
+
+        table = pa.Table.from_pylist([{"mbid0": "a", "mbid1": "b", "score": 1}])
+        body, content_type, headers = serialize_message({"type": "similarity_recording", "data": table})
+        self.assertEqual(content_type, ARROW_STREAM_CONTENT_TYPE)
+        self.assertEqual(json.loads(headers["message"]), {"type": "similarity_recording"})
+        self.assertEqual(pa.ipc.open_stream(body).read_all().to_pylist(), table.to_pylist())
+
+    def test_get_result_queue(self):
+        exchange, queue, messages = self.consumer.get_result_queue([{"type": "echo"}])
+        self.assertEqual(exchange, self.consumer.spark_result_control_exchange)
+        self.assertEqual(queue, self.consumer.spark_result_control_queue)
+        self.assertEqual(list(messages), [{"type": "echo"}])
+
+        dataset = [{"type": "troi_playlists", "data": i} for i in range(3)] + [{"type": "troi_playlists_end"}]
+        exchange, queue, messages = self.consumer.get_result_queue(iter(dataset))
+        self.assertEqual(exchange, self.consumer.spark_result_exchange)
+        self.assertEqual(queue, self.consumer.spark_result_queue)
+        self.assertEqual(list(messages), dataset)
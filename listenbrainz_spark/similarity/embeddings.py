@@ -0,0 +1,129 @@
+""" Export dense embeddings of recordings and artists from the latest recording recommendation model.
+
+The item factors of the ALS model are used as the recording embeddings. The embedding of an artist is the average of
+the normalized embeddings of the recordings credited to it. The webserver stores the embeddings and builds an
+approximate nearest neighbour index from them which allows finding recordings and artists similar to a set of seeds,
+including those which fall below the cutoffs of the similarity pair lists.
+"""
+import logging
+
+from more_itertools import chunked
+
+from listenbrainz_spark import path
+from listenbrainz_spark.recommendations.recording.recommend import get_most_recent_model_meta, load_model
+from listenbrainz_spark.stats import run_query
+from listenbrainz_spark.utils import read_files_from_HDFS, rows_to_arrow
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_PER_MESSAGE = 2000
+
+
+def get_recording_embeddings(item_factors_table, recordings_table):
+    """ Return the query to map the ALS item factors back to the recording mbids.
+
+    The item factors are normalized so that the dot product of two embeddings is their cosine similarity.
+    """
+    return f"""
+        WITH norms AS (
+            SELECT id
+                 , features
+                 , sqrt(aggregate(features, 0D, (acc, x) -> acc + x * x)) AS norm
+              FROM {item_factors_table}
+        )   SELECT DISTINCT r.recording_mbid AS mbid
+                 , transform(n.features, x -> CAST(x / n.norm AS FLOAT)) AS vector
+              FROM norms n
+              JOIN {recordings_table} r
+                ON n.id = r.recording_id
+             WHERE n.norm > 0
+    """
+
+
+def get_artist_embeddings(recording_embeddings_table, recordings_table, artist_credit_table):
+    """ Return the query to calculate the embeddings of the artists from those of their recordings.
+
+    Each recording contributes its embedding to all the artists of its credit, the averaged embeddings are
+    normalized again.
+    """
+    return f"""
+        WITH artist_recordings AS (
+            SELECT DISTINCT ac.artist_mbid
+                 , e.mbid AS recording_mbid
+                 , e.vector
+              FROM {recording_embeddings_table} e
+              JOIN {recordings_table} r
+                ON e.mbid = r.recording_mbid
+              JOIN {artist_credit_table} ac
+                ON r.artist_credit_id = ac.artist_credit_id
+        ), exploded AS (
+            SELECT artist_mbid
+                 , pos
+                 , avg(value) AS value
+              FROM artist_recordings
+     LATERAL VIEW posexplode(vector) AS pos, value
+          GROUP BY artist_mbid
+                 , pos
+        ), averaged AS (
+            SELECT artist_mbid
+                 , transform(array_sort(collect_list(struct(pos, value))), x -> x.value) AS vector
+              FROM exploded
+          GROUP BY artist_mbid
+        ), norms AS (
+            SELECT artist_mbid
+                 , vector
+                 , sqrt(aggregate(vector, 0D, (acc, x) -> acc + x * x)) AS norm
+              FROM averaged
+        )   SELECT artist_mbid AS mbid
+                 , transform(vector, x -> CAST(x / norm AS FLOAT)) AS vector
+              FROM norms
+             WHERE norm > 0
+    """
+
+
+def create_messages(entity, algorithm, data):
+    """ Create the start, data and end messages of the embeddings dataset of the given entity. """
+    message_type = f"similarity_{entity}_embeddings"
+    yield {
+        "type": f"{message_type}_start",
+        "algorithm": algorithm
+    }
+
+    for entries in chunked(data, EMBEDDINGS_PER_MESSAGE):
+        yield {
+            "type": message_type,
+            "algorithm": algorithm,
+            "data": rows_to_arrow(entries)
+        }
+
+    yield {
+        "type": f"{message_type}_end",
+        "algorithm": algorithm
+    }
+
+
+def main():
+    """ Generate recording and artist embeddings from the item factors of the latest recommendation model. """
+    model_id, _ = get_most_recent_model_meta()
+    model = load_model(model_id)
+    algorithm = f"als_{model_id}"
+    logger.info("Generating embeddings using model %s", model_id)
+
+    item_factors_table = "als_item_factors"
+    recordings_table = "als_recordings"
+    artist_credit_table = "artist_credit"
+    recording_embeddings_table = "recording_embeddings"
+
+    model.itemFactors.createOrReplaceTempView(item_factors_table)
+    read_files_from_HDFS(path.RECOMMENDATION_RECORDINGS_DATAFRAME).createOrReplaceTempView(recordings_table)
+    read_files_from_HDFS(path.ARTIST_CREDIT_MBID_DATAFRAME).createOrReplaceTempView(artist_credit_table)
+
+    recording_embeddings_df = run_query(get_recording_embeddings(item_factors_table, recordings_table))
+    recording_embeddings_df.cache()
+    try:
+        recording_embeddings_df.createOrReplaceTempView(recording_embeddings_table)
+        yield from create_messages("recording", algorithm, recording_embeddings_df.toLocalIterator())
+
+        query = get_artist_embeddings(recording_embeddings_table, recordings_table, artist_credit_table)
+        yield from create_messages("artist", algorithm, run_query(query).toLocalIterator())
+    finally:
+        recording_embeddings_df.unpersist()
@@ -6,7 +6,7 @@ import listenbrainz_spark
 from listenbrainz_spark import config
 from listenbrainz_spark.path import RECORDING_LENGTH_DATAFRAME
 from listenbrainz_spark.stats import run_query
-from listenbrainz_spark.utils import get_listens_from_dump
+from listenbrainz_spark.utils import get_listens_from_dump, rows_to_arrow
 
 
 RECORDINGS_PER_MESSAGE = 10000
@@ -132,11 +132,10 @@ def main(days, session, contribution, threshold, limit, skip, is_production_data
         }
 
     for entries in chunked(data, RECORDINGS_PER_MESSAGE):
-        items = [row.asDict() for row in entries]
         yield {
             "type": "similarity_recording",
             "algorithm": algorithm,
-            "data": items,
+            "data": rows_to_arrow(entries),
             "is_production_dataset": is_production_dataset
         }
 
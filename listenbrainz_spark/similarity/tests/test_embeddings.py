@@ -0,0 +1,65 @@
+import math
+
+from pyspark.sql import Row
+
+import listenbrainz_spark
+from listenbrainz_spark.similarity import embeddings
+from listenbrainz_spark.stats import run_query
+from listenbrainz_spark.tests import SparkNewTestCase
+
+
+class EmbeddingsTestCase(SparkNewTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        listenbrainz_spark.session.createDataFrame(
+            [(1, [3.0, 4.0]), (2, [0.0, 2.0]), (3, [0.0, 0.0])],
+            schema="id INT, features ARRAY<FLOAT>"
+        ).createOrReplaceTempView("test_item_factors")
+        listenbrainz_spark.session.createDataFrame(
+            [(10, "recording-1", 1), (11, "recording-1", 1), (10, "recording-2", 2), (12, "recording-3", 3)],
+            schema="artist_credit_id INT, recording_mbid STRING, recording_id INT"
+        ).createOrReplaceTempView("test_recordings")
+        listenbrainz_spark.session.createDataFrame(
+            [(10, "artist-a"), (11, "artist-b"), (12, "artist-c")],
+            schema="artist_credit_id INT, artist_mbid STRING"
+        ).createOrReplaceTempView("test_artist_credit")
+
+    def assertVectorsEqual(self, expected, received):
+        self.assertEqual(expected.keys(), received.keys())
+        for mbid, vector in expected.items():
+            self.assertEqual(len(vector), len(received[mbid]))
+            for x, y in zip(vector, received[mbid]):
+                self.assertAlmostEqual(x, y, places=5)
+
+    def test_embeddings(self):
+        query = embeddings.get_recording_embeddings("test_item_factors", "test_recordings")
+        recordings_df = run_query(query)
+        recordings_df.createOrReplaceTempView("test_recording_embeddings")
+        received = {row.mbid: row.vector for row in recordings_df.collect()}
+        # the embeddings are normalized and zero vectors are skipped
+        self.assertVectorsEqual({"recording-1": [0.6, 0.8], "recording-2": [0.0, 1.0]}, received)
+
+        query = embeddings.get_artist_embeddings("test_recording_embeddings", "test_recordings", "test_artist_credit")
+        received = {row.mbid: row.vector for row in run_query(query).collect()}
+        norm = math.sqrt(0.3 ** 2 + 0.9 ** 2)
+        self.assertVectorsEqual({
+            "artist-a": [0.3 / norm, 0.9 / norm],
+            "artist-b": [0.6, 0.8],
+        }, received)
+
+    def test_create_messages(self):
+        rows = [Row(mbid="recording-1", vector=[1.0])]
+        messages = list(embeddings.create_messages("recording", "als_test", rows))
+        # the data is sent as an arrow table
+        messages[1]["data"] = messages[1]["data"].to_pylist()
+        self.assertEqual([
+            {"type": "similarity_recording_embeddings_start", "algorithm": "als_test"},
+            {
+                "type": "similarity_recording_embeddings",
+                "algorithm": "als_test",
+                "data": [{"mbid": "recording-1", "vector": [1.0]}]
+            },
+            {"type": "similarity_recording_embeddings_end", "algorithm": "als_test"},
+        ], messages)
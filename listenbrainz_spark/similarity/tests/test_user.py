@@ -0,0 +1,42 @@
+import numpy as np
+
+import listenbrainz_spark
+from listenbrainz_spark.similarity import user
+from listenbrainz_spark.tests import SparkNewTestCase
+
+
+class UserSimilarityTestCase(SparkNewTestCase):
+
+    def test_threshold_similar_users(self):
+        matrix = np.array([
+            [1.0, 0.5, np.nan, 0.9],
+            [0.5, 1.0, -0.2, 0.1],
+            [np.nan, -0.2, 1.0, 0.0],
+            [0.9, 0.1, 0.0, 1.0],
+        ])
+        self.assertEqual(user.threshold_similar_users(matrix, 2), [
+            (0, 3, 0.9), (0, 1, 0.5),
+            (1, 0, 0.5), (1, 3, 0.1),
+            (2, 3, 0.0),
+            (3, 0, 0.9), (3, 1, 0.1),
+        ])
+
+    def test_sparse_matches_dense(self):
+        rng = np.random.default_rng(42)
+        playcounts = [
+            (recording_id, spark_user_id, int(rng.integers(1, 20)))
+            for recording_id in range(60)
+            for spark_user_id in range(15)
+            if rng.random() < 0.3
+        ]
+        playcounts_df = listenbrainz_spark.session.createDataFrame(
+            playcounts,
+            ["recording_id", "spark_user_id", "playcount"]
+        )
+
+        dense = user.get_dense_similar_users(playcounts_df, 5)
+        # the rows of the distributed matrix are not returned in order, the users within each row are
+        sparse = sorted(user.get_sparse_similar_users(playcounts_df, 5).collect(), key=lambda r: (r[0], -r[2]))
+
+        self.assertEqual([(x, y) for x, y, _ in dense], [(x, y) for x, y, _ in sparse])
+        np.testing.assert_allclose([value for _, _, value in dense], [value for _, _, value in sparse])
@@ -1,13 +1,12 @@
 import logging
-from operator import itemgetter
-import math
 from typing import List, Tuple
-from pyspark.sql.dataframe import DataFrame
-from numpy import ndarray
 
-from pyspark.mllib.linalg.distributed import CoordinateMatrix, MatrixEntry
+import numpy as np
+from numpy import ndarray
+from pyspark.mllib.linalg.distributed import CoordinateMatrix, MatrixEntry, BlockMatrix
 from pyspark.ml.stat import Correlation
-from pyspark.sql.functions import struct, collect_list
+from pyspark.sql.dataframe import DataFrame
+from pyspark.sql.functions import struct, collect_list, sum as _sum, countDistinct
 
 import listenbrainz_spark
 from listenbrainz_spark import SparkSessionNotInitializedException, utils, path
@@ -16,6 +15,15 @@ from listenbrainz_spark.exceptions import PathNotFoundException, FileNotFetchedE
 
 logger = logging.getLogger(__name__)
 
+# dense: compute the full pearson correlation matrix of users on the driver.
+# sparse: compute the correlations from the product of the sparse user x recording playcounts matrix with its
+#   transpose, distributed over the cluster as a block matrix, and select the top users of each row on the executors.
+SIMILARITY_MODE_DENSE = "dense"
+SIMILARITY_MODE_SPARSE = "sparse"
+
+# the size of the blocks of the distributed matrices in the sparse mode
+SIMILARITY_BLOCK_SIZE = 1024
+
 
 def create_messages(similar_users_df: DataFrame) -> dict:
     """
@@ -48,23 +56,25 @@ def create_messages(similar_users_df: DataFrame) -> dict:
     }
 
 
+def get_top_similar_users(x: int, row: ndarray, max_num_users: int) -> List[Tuple[int, int, float]]:
+    """ Get the max_num_users users with the highest non-negative similarity in the row of user x,
+        in descending order of similarity. """
+    candidates = np.flatnonzero(row >= 0)  # also drops nans
+    candidates = candidates[candidates != x]
+    if len(candidates) > max_num_users:
+        candidates = candidates[np.argpartition(-row[candidates], max_num_users - 1)[:max_num_users]]
+    candidates = candidates[np.argsort(-row[candidates], kind="stable")]
+    return [(x, int(y), float(row[y])) for y in candidates]
+
+
 def threshold_similar_users(matrix: ndarray, max_num_users: int) -> List[Tuple[int, int, float]]:
     """ Determine the minimum and maximum values in the matriz, scale
         the result to the range of [0.0 - 1.0] and limit each user to max of
         max_num_users other users.
     """
-    rows, cols = matrix.shape
     similar_users = list()
-
-    for x in range(rows):
-        row = []
-        for y in range(cols):
-            value = float(matrix[x, y])
-            if x == y or math.isnan(value) or value < 0:
-                continue
-            row.append((x, y, value))
-        similar_users.extend(sorted(row, key=itemgetter(2), reverse=True)[:max_num_users])
-
+    for x in range(matrix.shape[0]):
+        similar_users.extend(get_top_similar_users(x, matrix[x], max_num_users))
     return similar_users
 
 
@@ -89,7 +99,63 @@ def get_vectors_df(playcounts_df):
     return listenbrainz_spark.session.createDataFrame(vectors_mapped_rdd, ['index', 'vector'])
 
 
-def get_similar_users_df(max_num_users: int):
+def get_dense_similar_users(playcounts_df: DataFrame, max_num_users: int) -> List[Tuple[int, int, float]]:
+    """ Compute the pearson correlation matrix of all users on the driver and threshold it. """
+    vectors_df = get_vectors_df(playcounts_df)
+    similarity_matrix = Correlation.corr(vectors_df, 'vector', 'pearson').first()['pearson(vector)'].toArray()
+    return threshold_similar_users(similarity_matrix, max_num_users)
+
+
+def get_sparse_similar_users(playcounts_df: DataFrame, max_num_users: int):
+    """ Compute the same pearson correlations of users as the dense mode without materializing the matrix on the driver.
+
+    The correlation of the playcounts x and y of two users over all n recordings is
+
+        (x.y - sum(x) * sum(y) / n) / sqrt((x.x - sum(x)^2 / n) * (y.y - sum(y)^2 / n))
+
+    so only the dot products of users are needed in addition to the sums and sums of squares of each user. The
+    dot products are computed by multiplying the sparse users x recordings playcounts matrix with its transpose
+    as distributed block matrices. Each row of the product is then scored and thresholded on the executors.
+
+    Returns:
+        an rdd of (spark_user_id, other_spark_user_id, similarity) tuples
+    """
+    stats = playcounts_df \
+        .groupBy('spark_user_id') \
+        .agg(_sum('playcount').alias('total'), _sum(playcounts_df.playcount * playcounts_df.playcount).alias('squares')) \
+        .collect()
+    num_recordings = playcounts_df.select(countDistinct('recording_id')).first()[0]
+
+    num_users = max(row.spark_user_id for row in stats) + 1
+    totals = np.zeros(num_users)
+    squares = np.zeros(num_users)
+    for row in stats:
+        totals[row.spark_user_id] = row.total
+        squares[row.spark_user_id] = row.squares
+    variances = squares - totals * totals / num_recordings
+
+    context = listenbrainz_spark.context
+    totals_bc = context.broadcast(totals)
+    variances_bc = context.broadcast(variances)
+
+    entries = playcounts_df.rdd.map(lambda r: MatrixEntry(r["spark_user_id"], r["recording_id"], r["playcount"]))
+    playcounts_matrix: BlockMatrix = CoordinateMatrix(entries, num_users) \
+        .toBlockMatrix(SIMILARITY_BLOCK_SIZE, SIMILARITY_BLOCK_SIZE) \
+        .cache()
+    dot_products = playcounts_matrix.multiply(playcounts_matrix.transpose())
+
+    def threshold_row(row):
+        x = row.index
+        sums, variances = totals_bc.value, variances_bc.value
+        covariances = row.vector.toArray() - sums[x] * sums / num_recordings
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlations = covariances / np.sqrt(variances[x] * variances)
+        return get_top_similar_users(x, correlations, max_num_users)
+
+    return dot_products.toIndexedRowMatrix().rows.flatMap(threshold_row)
+
+
+def get_similar_users_df(max_num_users: int, mode: str = SIMILARITY_MODE_SPARSE):
     logger.info('Start generating similar user matrix')
     try:
         listenbrainz_spark.init_spark_session('User Similarity')
@@ -107,10 +173,12 @@ def get_similar_users_df(max_num_users: int):
         logger.error(str(err), exc_info=True)
         raise
 
-    vectors_df = get_vectors_df(playcounts_df)
-
-    similarity_matrix = Correlation.corr(vectors_df, 'vector', 'pearson').first()['pearson(vector)'].toArray()
-    similar_users = threshold_similar_users(similarity_matrix, max_num_users)
+    if mode == SIMILARITY_MODE_DENSE:
+        similar_users = get_dense_similar_users(playcounts_df, max_num_users)
+    elif mode == SIMILARITY_MODE_SPARSE:
+        similar_users = get_sparse_similar_users(playcounts_df, max_num_users)
+    else:
+        raise ValueError(f"Unknown user similarity mode: {mode}")
 
     # Due to an unresolved bug in Spark (https://issues.apache.org/jira/browse/SPARK-10925), we cannot join twice on
     # the same dataframe. Hence, we create a modified dataframe with the columns renamed.
@@ -133,6 +201,6 @@ def get_similar_users_df(max_num_users: int):
     return similar_users_df
 
 
-def main(max_num_users: int):
-    similar_users_df = get_similar_users_df(max_num_users)
+def main(max_num_users: int, mode: str = SIMILARITY_MODE_SPARSE):
+    similar_users_df = get_similar_users_df(max_num_users, mode)
     return create_messages(similar_users_df)
@@ -9,7 +9,7 @@ def get_artists(table: str, cache_tables: List[str], number_of_results: int) ->
         ordered by listen count
 
         Args:
-            table: name of the temporary table.
+            table: name of the temporary table of listen counts, see get_listen_counts_for_range.
             number_of_results: number of top results to keep per user.
 
         Returns:
@@ -31,11 +31,13 @@ def get_artists(table: str, cache_tables: List[str], number_of_results: int) ->
             SELECT user_id
                  , artist_name AS artist_credit_name
                  , explode_outer(artist_credit_mbids) AS artist_mbid
+                 , listen_count
              FROM {table}
         ), listens_with_mb_data as (
             SELECT user_id
                  , COALESCE(at.artist_name, el.artist_credit_name) AS artist_name
                  , el.artist_mbid
+                 , el.listen_count
               FROM exploded_listens el
          LEFT JOIN {cache_table} at
                 ON el.artist_mbid = at.artist_mbid
@@ -49,7 +51,7 @@ def get_artists(table: str, cache_tables: List[str], number_of_results: int) ->
             -- listens and doesn't matter for mapped ones.
                  , first(artist_name) AS any_artist_name
                  , artist_mbid
-                 , count(*) AS listen_count
+                 , sum(listen_count) AS listen_count
              FROM listens_with_mb_data
          GROUP BY user_id
                 , lower(artist_name)
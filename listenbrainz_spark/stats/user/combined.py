@@ -0,0 +1,104 @@
+""" Calculate all the user stats of a stats range in a single pass over the listens.
+
+The separate stats.user.entity, stats.user.listening_activity and stats.user.daily_activity queries each load
+and filter the listens of the range and the entity stats each read their own metadata caches. This job loads
+the listens of the widest range needed once and persists them, persists the listen counts and the metadata
+caches shared by the entity stats and then produces the same messages as the separate queries.
+"""
+import logging
+from typing import Dict, Iterator, Optional
+
+from pyspark import StorageLevel
+
+from listenbrainz_spark.stats import get_dates_for_stats_range
+from listenbrainz_spark.stats.common.listening_activity import setup_time_range
+from listenbrainz_spark.stats.user import daily_activity, listening_activity
+from listenbrainz_spark.stats.user.entity import entity_cache_map, calculate_entity_stats
+from listenbrainz_spark.stats.user.partials import get_listen_counts_for_range
+from listenbrainz_spark.utils import get_listens_from_dump, read_files_from_HDFS
+
+logger = logging.getLogger(__name__)
+
+ENTITIES = ["artists", "releases", "recordings", "release_groups"]
+
+
+def _get_database(prefix: str, stats_range: str, database_suffix: Optional[str]) -> Optional[str]:
+    if database_suffix is None:
+        return None
+    return f"{prefix}_{stats_range}_{database_suffix}"
+
+
+def get_all_stats(stats_range: str, database_suffix: str = None) -> Iterator[Optional[Dict]]:
+    """ Calculate the entity, listening activity and daily activity stats of all users for the stats range.
+
+    Args:
+        stats_range: the range to calculate the stats for
+        database_suffix: if specified, the stats are stored in the databases named
+            {stat}_{stats_range}_{database_suffix}, otherwise in the default databases of each stat
+    """
+    logger.debug(f"Calculating all user stats for {stats_range}...")
+
+    from_date, to_date = get_dates_for_stats_range(stats_range)
+    # the listening activity compares the range with the previous one so it needs a wider range of listens
+    activity_from_date, activity_to_date, _, _, _ = setup_time_range(stats_range)
+    listens_df = get_listens_from_dump(min(from_date, activity_from_date), max(to_date, activity_to_date))
+    listens_df.persist(StorageLevel.MEMORY_AND_DISK)
+
+    cache_dfs = {}
+    listen_counts_df = None
+    try:
+        listens_df \
+            .where(f"listened_at >= to_timestamp('{activity_from_date}') "
+                   f"AND listened_at <= to_timestamp('{activity_to_date}')") \
+            .createOrReplaceTempView("listens")
+        data = listening_activity.calculate_listening_activity()
+        yield from listening_activity.create_messages(
+            data=data,
+            stats_range=stats_range,
+            from_date=activity_from_date,
+            to_date=activity_to_date,
+            message_type="user_listening_activity",
+            database=_get_database("listening_activity", stats_range, database_suffix)
+        )
+
+        listens_df \
+            .where(f"listened_at >= to_timestamp('{from_date}') AND listened_at <= to_timestamp('{to_date}')") \
+            .createOrReplaceTempView("listens")
+        data = daily_activity.calculate_daily_activity()
+        yield from daily_activity.create_messages(
+            data=data,
+            stats_range=stats_range,
+            from_date=from_date,
+            to_date=to_date,
+            database=_get_database("daily_activity", stats_range, database_suffix)
+        )
+
+        listen_counts_df = get_listen_counts_for_range(from_date, to_date, listens_df)
+        listen_counts_df.persist(StorageLevel.MEMORY_AND_DISK)
+        table = f"user_all_{stats_range}"
+        listen_counts_df.createOrReplaceTempView(table)
+
+        for entity in ENTITIES:
+            cache_tables = []
+            for df_path in entity_cache_map[entity]:
+                # the caches shared by several entities are only read once
+                if df_path not in cache_dfs:
+                    df_name = f"entity_data_cache_{len(cache_dfs)}"
+                    df = read_files_from_HDFS(df_path)
+                    df.persist(StorageLevel.MEMORY_AND_DISK)
+                    df.createOrReplaceTempView(df_name)
+                    cache_dfs[df_path] = (df_name, df)
+                cache_tables.append(cache_dfs[df_path][0])
+
+            yield from calculate_entity_stats(
+                from_date, to_date, table, cache_tables, entity, stats_range, "user_entity",
+                _get_database(entity, stats_range, database_suffix)
+            )
+    finally:
+        listens_df.unpersist()
+        if listen_counts_df is not None:
+            listen_counts_df.unpersist()
+        for _, df in cache_dfs.values():
+            df.unpersist()
+
+    logger.debug("Done!")
@@ -16,10 +16,11 @@ from listenbrainz_spark.path import RELEASE_METADATA_CACHE_DATAFRAME, ARTIST_COU
 from listenbrainz_spark.stats import get_dates_for_stats_range
 from listenbrainz_spark.stats.user import USERS_PER_MESSAGE
 from listenbrainz_spark.stats.user.artist import get_artists
+from listenbrainz_spark.stats.user.partials import get_listen_counts_for_range
 from listenbrainz_spark.stats.user.recording import get_recordings
 from listenbrainz_spark.stats.user.release import get_releases
 from listenbrainz_spark.stats.user.release_group import get_release_groups
-from listenbrainz_spark.utils import get_listens_from_dump, read_files_from_HDFS
+from listenbrainz_spark.utils import read_files_from_HDFS
 
 logger = logging.getLogger(__name__)
 
@@ -75,10 +76,14 @@ def get_entity_stats_for_range(
     message_type: str,
     database: str = None
 ):
-    """ Calculate entity stats for all users' listens between the start and the end datetime. """
-    listens_df = get_listens_from_dump(from_date, to_date)
+    """ Calculate entity stats for all users' listens between the start and the end datetime.
+
+    The listen counts of the months completely within the range are read from the materialized monthly
+    listen counts, only the listens of the remaining days are read from the dumps.
+    """
+    listen_counts_df = get_listen_counts_for_range(from_date, to_date)
     table = f"user_{entity}_{stats_range}"
-    listens_df.createOrReplaceTempView(table)
+    listen_counts_df.createOrReplaceTempView(table)
 
     cache_dfs = []
     for idx, df_path in enumerate(entity_cache_map.get(entity)):
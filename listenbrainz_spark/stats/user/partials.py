@@ -0,0 +1,167 @@
+""" Materialized monthly listen counts of each user, used to calculate the user entity stats of long ranges.
+
+The listens of each user are counted per month, grouped by all the listen columns used by the entity stats
+queries. The counts are stored in HDFS and kept up to date by aggregating only the listen files which have
+been imported since the last update: the counts of new incremental dumps are appended to the existing ones,
+while importing a full dump replaces all listen files and the counts are rebuilt from scratch.
+
+The stats of a range are then calculated from the counts of the months completely within the range and the
+listens of the partial months at either end of it.
+"""
+import logging
+from datetime import datetime
+from typing import Optional
+
+from dateutil.relativedelta import relativedelta
+from py4j.protocol import Py4JJavaError
+from pyspark.sql import DataFrame, Row
+from pyspark.sql.functions import col, count, date_trunc, lit, to_date
+from pyspark.sql.types import StructType, StructField, StringType
+
+import listenbrainz_spark
+from listenbrainz_spark import config, hdfs_connection
+from listenbrainz_spark.exceptions import FileNotSavedException, PathNotFoundException
+from listenbrainz_spark.hdfs.utils import delete_dir, path_exists
+from listenbrainz_spark.path import LISTENBRAINZ_NEW_DATA_DIRECTORY, INCREMENTAL_DUMPS_SAVE_PATH, \
+    USER_STATS_MONTHLY_LISTEN_COUNTS, USER_STATS_PARTIALS_SOURCES
+from listenbrainz_spark.utils import get_listens_from_dump, read_files_from_HDFS, save_parquet
+
+logger = logging.getLogger(__name__)
+
+# the listen columns used by the user entity stats queries
+LISTEN_COUNT_COLUMNS = [
+    "user_id",
+    "recording_name",
+    "recording_mbid",
+    "artist_name",
+    "artist_credit_mbids",
+    "release_name",
+    "release_mbid",
+]
+
+sources_schema = StructType([StructField("source", StringType(), nullable=False)])
+
+
+def get_listen_sources() -> set[str]:
+    """ Get the listen files currently stored in HDFS. Each file is identified by its path and modification
+    time so that the files of a newly imported full dump can be told apart from those of the previous one.
+    """
+    sources = set()
+    # the incremental dumps are stored in a directory inside the full dump directory
+    for directory in [LISTENBRAINZ_NEW_DATA_DIRECTORY, INCREMENTAL_DUMPS_SAVE_PATH]:
+        if not hdfs_connection.client.status(directory, strict=False):
+            continue
+        for name, status in hdfs_connection.client.list(directory, status=True):
+            if name.endswith(".parquet") and status["type"] == "FILE":
+                sources.add(f"{directory}/{name}@{status['modificationTime']}")
+    return sources
+
+
+def get_aggregated_sources() -> Optional[set[str]]:
+    """ Get the listen files which have been aggregated into the stored monthly listen counts, None if
+    the counts need to be rebuilt. """
+    if not path_exists(USER_STATS_PARTIALS_SOURCES) or not path_exists(USER_STATS_MONTHLY_LISTEN_COUNTS):
+        return None
+    return {row.source for row in read_files_from_HDFS(USER_STATS_PARTIALS_SOURCES).collect()}
+
+
+def aggregate_listens(listens_df: DataFrame) -> DataFrame:
+    """ Count the listens of each user per month and per distinct value of the LISTEN_COUNT_COLUMNS. """
+    return listens_df \
+        .groupBy(to_date(date_trunc("month", col("listened_at"))).alias("month"), *LISTEN_COUNT_COLUMNS) \
+        .agg(count("*").alias("listen_count"))
+
+
+def update_listen_counts():
+    """ Bring the stored monthly listen counts up to date with the listen files in HDFS. """
+    current = get_listen_sources()
+    aggregated = get_aggregated_sources()
+
+    if aggregated is None or not aggregated <= current:
+        # the counts don't exist yet or some of the listen files they were created from have been removed
+        logger.info("Rebuilding monthly listen counts of users from %d listen files", len(current))
+        counts_df = aggregate_listens(get_listens_from_dump())
+        mode = "overwrite"
+    else:
+        new_sources = current - aggregated
+        if not new_sources:
+            return
+        logger.info("Adding %d new listen files to monthly listen counts of users", len(new_sources))
+        paths = [config.HDFS_CLUSTER_URI + source.rsplit("@", 1)[0] for source in new_sources]
+        counts_df = aggregate_listens(listenbrainz_spark.sql_context.read.parquet(*paths))
+        mode = "append"
+
+    # remove the list of aggregated files while the counts are being updated, so that if the update fails
+    # midway the counts are rebuilt the next time instead of having the same listens added to them again.
+    if path_exists(USER_STATS_PARTIALS_SOURCES):
+        delete_dir(USER_STATS_PARTIALS_SOURCES, recursive=True)
+
+    try:
+        counts_df.write \
+            .partitionBy("month") \
+            .mode(mode) \
+            .parquet(config.HDFS_CLUSTER_URI + USER_STATS_MONTHLY_LISTEN_COUNTS)
+    except Py4JJavaError as err:
+        raise FileNotSavedException(err.java_exception, USER_STATS_MONTHLY_LISTEN_COUNTS)
+
+    sources_df = listenbrainz_spark.session.createDataFrame(
+        [Row(source=source) for source in sorted(current)],
+        schema=sources_schema
+    )
+    save_parquet(sources_df, USER_STATS_PARTIALS_SOURCES)
+
+
+def _count_each_listen(listens_df: DataFrame) -> DataFrame:
+    return listens_df.select(*LISTEN_COUNT_COLUMNS, lit(1).cast("long").alias("listen_count"))
+
+
+def _get_month_start(date: datetime) -> datetime:
+    return datetime(date.year, date.month, 1)
+
+
+def _get_listens(from_date: datetime, to_date: datetime, listens_df: Optional[DataFrame]) -> DataFrame:
+    if listens_df is None:
+        return get_listens_from_dump(from_date, to_date)
+    return listens_df.where(
+        f"listened_at >= to_timestamp('{from_date}') AND listened_at <= to_timestamp('{to_date}')"
+    )
+
+
+def get_listen_counts_for_range(from_date: datetime, to_date: datetime,
+                                listens_df: Optional[DataFrame] = None) -> DataFrame:
+    """ Get the listen counts of users for listens between from_date and to_date (both inclusive).
+
+    The returned dataframe has the LISTEN_COUNT_COLUMNS and a listen_count column. A combination of the
+    other columns may appear in several rows, the listen counts of those need to be summed up.
+
+    Args:
+        from_date: the start of the range
+        to_date: the end of the range
+        listens_df: listens already loaded by the caller covering at least the range, if None the
+            listens are loaded from the dumps
+    """
+    # the months completely within the range are read from the monthly listen counts
+    first_month = _get_month_start(from_date)
+    if first_month < from_date:
+        first_month += relativedelta(months=1)
+    end_month = _get_month_start(to_date)
+
+    if first_month >= end_month:
+        return _count_each_listen(_get_listens(from_date, to_date, listens_df))
+
+    update_listen_counts()
+    try:
+        counts_df = read_files_from_HDFS(USER_STATS_MONTHLY_LISTEN_COUNTS)
+    except PathNotFoundException:
+        # there are no listens at all, spark can't read an empty partitioned dataframe
+        return _count_each_listen(_get_listens(from_date, to_date, listens_df))
+
+    counts_df = counts_df \
+        .where((col("month") >= lit(first_month.date())) & (col("month") < lit(end_month.date()))) \
+        .select(*LISTEN_COUNT_COLUMNS, "listen_count")
+
+    # the listens of the partial months at the start and the end of the range
+    partial_months_df = _get_listens(from_date, to_date, listens_df) \
+        .where(f"listened_at < to_timestamp('{first_month}') OR listened_at >= to_timestamp('{end_month}')")
+
+    return counts_df.unionByName(_count_each_listen(partial_months_df))
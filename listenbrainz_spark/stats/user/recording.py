@@ -9,7 +9,7 @@ def get_recordings(table: str, cache_tables: List[str], number_of_results: int):
     ordered by listen count (number of times a user has listened to the track/recording).
 
     Args:
-        table: name of the temporary table
+        table: name of the temporary table of listen counts, see get_listen_counts_for_range
         number_of_results: number of top results to keep per user.
 
     Returns:
@@ -43,7 +43,7 @@ def get_recordings(table: str, cache_tables: List[str], number_of_results: int):
                  , rec.artists
                  , rel.caa_id
                  , rel.caa_release_mbid
-                 , count(*) as listen_count
+                 , sum(l.listen_count) as listen_count
               FROM {table} l
          LEFT JOIN {rec_cache_table} rec
                 ON rec.recording_mbid = l.recording_mbid
@@ -0,0 +1,40 @@
+from listenbrainz_spark.stats.user.combined import get_all_stats
+from listenbrainz_spark.stats.user.daily_activity import get_daily_activity
+from listenbrainz_spark.stats.user.entity import get_entity_stats
+from listenbrainz_spark.stats.user.listening_activity import get_listening_activity
+from listenbrainz_spark.stats.user.tests import StatsTestCase
+
+
+class CombinedStatsTestCase(StatsTestCase):
+
+    @staticmethod
+    def _group_by_database(messages):
+        databases = {}
+        for message in messages:
+            databases.setdefault(message["database"], []).append(message)
+        return databases
+
+    def test_get_all_stats(self):
+        received = self._group_by_database(get_all_stats("all_time", "20220718"))
+
+        expected = {
+            "listening_activity_all_time_20220718":
+                get_listening_activity("all_time", database="listening_activity_all_time_20220718"),
+            "daily_activity_all_time_20220718":
+                get_daily_activity("all_time", database="daily_activity_all_time_20220718"),
+        }
+        for entity in ["artists", "releases", "recordings", "release_groups"]:
+            database = f"{entity}_all_time_20220718"
+            expected[database] = get_entity_stats(entity, "all_time", database=database)
+
+        self.assertCountEqual(expected.keys(), received.keys())
+        for database, messages in expected.items():
+            messages = list(messages)
+            self.assertEqual(len(messages), len(received[database]))
+            self.assertEqual(messages[0], received[database][0])
+            self.assertEqual(messages[-1], received[database][-1])
+            for expected_message, received_message in zip(messages[1:-1], received[database][1:-1]):
+                self.assertEqual(expected_message["type"], received_message["type"])
+                self.assertEqual(expected_message["from_ts"], received_message["from_ts"])
+                self.assertEqual(expected_message["to_ts"], received_message["to_ts"])
+                self.assertCountEqual(expected_message["data"], received_message["data"])
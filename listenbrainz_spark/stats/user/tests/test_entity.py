@@ -15,7 +15,7 @@ class UserEntityTestCase(StatsTestCase):
         entity.entity_handler_map['test'] = MagicMock(return_value="sample_test_data")
         entity.entity_cache_map['test'] = []
 
-    @patch('listenbrainz_spark.stats.user.entity.get_listens_from_dump')
+    @patch('listenbrainz_spark.stats.user.entity.get_listen_counts_for_range')
     @patch('listenbrainz_spark.stats.user.entity.create_messages')
     def test_get_entity_week(self, mock_create_messages, mock_get_listens):
         entity.get_entity_stats('test', 'week')
@@ -27,7 +27,7 @@ class UserEntityTestCase(StatsTestCase):
                                                 from_date=from_date, to_date=to_date, message_type="user_entity",
                                                 database=None)
 
-    @patch('listenbrainz_spark.stats.user.entity.get_listens_from_dump')
+    @patch('listenbrainz_spark.stats.user.entity.get_listen_counts_for_range')
     @patch('listenbrainz_spark.stats.user.entity.create_messages')
     def test_get_entity_month(self, mock_create_messages, mock_get_listens):
         entity.get_entity_stats('test', 'month')
@@ -39,7 +39,7 @@ class UserEntityTestCase(StatsTestCase):
                                                 from_date=from_date, to_date=to_date, message_type="user_entity",
                                                 database=None)
 
-    @patch('listenbrainz_spark.stats.user.entity.get_listens_from_dump')
+    @patch('listenbrainz_spark.stats.user.entity.get_listen_counts_for_range')
     @patch('listenbrainz_spark.stats.user.entity.create_messages')
     def test_get_entity_year(self, mock_create_messages, mock_get_listens):
         entity.get_entity_stats('test', 'year')
@@ -51,7 +51,7 @@ class UserEntityTestCase(StatsTestCase):
                                                 from_date=from_date, to_date=to_date, message_type="user_entity",
                                                 database=None)
 
-    @patch('listenbrainz_spark.stats.user.entity.get_listens_from_dump')
+    @patch('listenbrainz_spark.stats.user.entity.get_listen_counts_for_range')
     @patch('listenbrainz_spark.stats.user.entity.create_messages')
     def test_get_entity_all_time(self, mock_create_messages, mock_get_listens):
         entity.get_entity_stats('test', 'all_time')
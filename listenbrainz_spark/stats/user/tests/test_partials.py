@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from pyspark.sql import functions
+
+from listenbrainz_spark.constants import LAST_FM_FOUNDING_YEAR
+from listenbrainz_spark.stats.user import partials
+from listenbrainz_spark.stats.user.tests import StatsTestCase
+from listenbrainz_spark.utils import get_listens_from_dump
+
+
+class PartialsTestCase(StatsTestCase):
+
+    @staticmethod
+    def _user_listen_counts(df, column):
+        return {
+            row.user_id: row.listen_count
+            for row in df.groupBy("user_id").agg(column.alias("listen_count")).collect()
+        }
+
+    def assert_listen_counts_match(self, from_date, to_date):
+        received = partials.get_listen_counts_for_range(from_date, to_date)
+        expected = get_listens_from_dump(from_date, to_date)
+        self.assertEqual(
+            self._user_listen_counts(expected, functions.count("*")),
+            self._user_listen_counts(received, functions.sum("listen_count"))
+        )
+
+    def test_all_time(self):
+        self.assert_listen_counts_match(datetime(LAST_FM_FOUNDING_YEAR, 1, 1), datetime(2025, 1, 1))
+        self.assertEqual(partials.get_listen_sources(), partials.get_aggregated_sources())
+
+    def test_partial_months(self):
+        latest = get_listens_from_dump().agg(functions.max("listened_at")).collect()[0][0]
+        earliest = get_listens_from_dump().agg(functions.min("listened_at")).collect()[0][0]
+        # start and end in the middle of a month
+        self.assert_listen_counts_match(earliest + timedelta(days=10), latest - timedelta(days=10))
+
+    @patch("listenbrainz_spark.stats.user.partials.aggregate_listens", wraps=partials.aggregate_listens)
+    def test_update_only_new_files(self, mock_aggregate):
+        partials.update_listen_counts()
+        mock_aggregate.reset_mock()
+
+        partials.update_listen_counts()
+        mock_aggregate.assert_not_called()